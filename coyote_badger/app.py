@@ -17,14 +17,21 @@ from flask import (
 from flask_bootstrap import Bootstrap
 from packaging import version
 
+from coyote_badger.async_puller import AsyncPullerPool
 from coyote_badger.config import (
     PORT,
+    PROJECTS_FOLDER,
+    PULL_ENGINE,
     REPO,
     SEGMENT_WRITE_KEY,
     SOURCES_TEMPLATE_FILE,
     VERSION,
 )
 from coyote_badger.converter import create_sources_template
+from coyote_badger.jobs import JobManager
+from coyote_badger.metrics import METRICS_FILENAME, summarize
+from coyote_badger.pool import PullerPool
+from coyote_badger.process_pool import ProcessPullerPool
 from coyote_badger.project import Project
 from coyote_badger.puller import Puller
 from coyote_badger.source import Kind, Result, Source
@@ -32,15 +39,41 @@ from coyote_badger.source import Kind, Result, Source
 analytics.write_key = SEGMENT_WRITE_KEY
 anonymous_id = str(uuid.uuid4())
 
-init()
-
 app = Flask(__name__)
 app.config["TEMPLATES_AUTO_RELOAD"] = True
 Bootstrap(app)
 
 citations = None
-puller = Puller()
-puller.clear_user_data()
+# Created when the app starts (see the bottom of this file), and not when
+# this module is imported again by a "spawn" worker process, which runs it
+# as __mp_main__
+puller = None
+pool = None
+jobs = None
+
+
+def create_pool():
+    """Creates the pool that pull jobs are run on.
+
+    :returns: The pool for the PULL_ENGINE
+    :rtype: {PullerPool|AsyncPullerPool|ProcessPullerPool}
+    """
+    if PULL_ENGINE == "async":
+        return AsyncPullerPool()
+    elif PULL_ENGINE == "processes":
+        return ProcessPullerPool()
+    return PullerPool()
+
+
+def track_pulled(project, source):
+    analytics.track(
+        anonymous_id=anonymous_id,
+        event="Source Pulled",
+        properties={
+            "source": source.to_json(),
+        },
+    )
+
 
 ART_MESSAGE = r"""
 
@@ -199,6 +232,24 @@ def download_sources_template():
     return send_file(SOURCES_TEMPLATE_FILE, as_attachment=True)
 
 
+@app.route("/projects/<string:project_name>/sources.xlsx", methods=["GET"])
+def download_sources(project_name):
+    """A download link for a project's Sources.xlsx.
+
+    GET: writes any updates that haven't been saved to the file yet,
+         then sends it
+    """
+    project = Project.get_project(project_name)
+    if not project:
+        return redirect(url_for("index"))
+    project.flush()
+    return send_file(
+        project.sources_file,
+        as_attachment=True,
+        attachment_filename=f"{project_name}_Sources.xlsx",
+    )
+
+
 @app.route("/convert", methods=["GET", "POST"])
 def convert():
     """Create sources template page.
@@ -339,13 +390,17 @@ def login():
             )
 
         analytics.track(anonymous_id=anonymous_id, event="Login Succeeded")
+        # Start the pulls that were cut off the last time the app stopped
+        if jobs.waiting:
+            pool.share_cookies(puller.cookies)
+            jobs.resume()
         # Redirect the user back to the project or home screen
         if project_name:
             return redirect(url_for("sources", project_name=project_name))
         return redirect(url_for("index"))
 
 
-@app.route("/sources/<string:project_name>", methods=["GET", "POST"])
+@app.route("/sources/<string:project_name>", methods=["GET", "POST", "PATCH"])
 def sources(project_name):
     """Sources page.
 
@@ -355,10 +410,12 @@ def sources(project_name):
 
     GET: loads the project's sources and renders a template
     POST: saves new source data from the UI to a project
+    PATCH: saves only the rows that were edited in the UI, each with
+           the version of the row it was edited from, and sends back
+           the rows that changed in the meantime instead of saving them
     """
-    project = Project.get_project(project_name)
     if request.method == "GET":
-        if not project:
+        if not Project.exists(project_name):
             return redirect(url_for("index"))
         analytics.page(
             anonymous_id=anonymous_id,
@@ -375,12 +432,38 @@ def sources(project_name):
             Kind=Kind,
             Result=Result,
             project_name=project_name,
-            sources=[s.to_json() for s in project.get_sources()],
+            sources=[s.to_json() for s in Project.read_sources(project_name)],
         )
     elif request.method == "POST":
+        project = Project.get_project(project_name)
         sources = [Source.from_json(source) for source in request.json]
-        project.save_sources(sources)
+        with project.lock:
+            project.save_sources(sources)
         return SuccessResponse()
+    elif request.method == "PATCH":
+        project = Project.get_project(project_name)
+        if not project:
+            return ErrorResponse("Project does not exist.")
+        changes = request.json
+        if not isinstance(changes, list) or not all(
+            isinstance(change, dict) and isinstance(change.get("index"), int)
+            for change in changes
+        ):
+            return ErrorResponse("Invalid rows.")
+        versions, conflicts = project.update_sources(changes)
+        return {
+            "error": bool(conflicts),
+            "message": (
+                "Some rows were changed somewhere else, so they weren't saved."
+                if conflicts
+                else ""
+            ),
+            "versions": versions,
+            "conflicts": {
+                index: source.to_json() if source else None
+                for index, source in conflicts.items()
+            },
+        }
 
 
 @app.route("/pull", methods=["GET", "POST"])
@@ -407,9 +490,11 @@ def pull():
             return ErrorResponse("Missing required index.")
 
         project = Project.get_project(project_name)
-        source = project.get_source(index)
+        with project.lock:
+            source = project.get_source(index)
         source.result = puller.pull(source, project)
-        project.save_source(index, source)
+        with project.lock:
+            project.save_results({index: source.result})
         analytics.track(
             anonymous_id=anonymous_id,
             event="Source Pulled",
@@ -423,7 +508,127 @@ def pull():
         }
 
 
+@app.route("/projects/<string:project_name>/pull-jobs", methods=["POST"])
+def pull_jobs(project_name):
+    """Endpoint to pull a range of a project's sources in the background.
+
+    Takes the first and last rows to pull (or a list of rows) as input,
+    and queues them to be pulled by the puller pool. The pull keeps
+    going after the request returns, so use the job's id to check on it.
+
+    POST: starts a pull job (assumes user is logged in)
+    """
+    project = Project.get_project(project_name)
+    if not project:
+        return ErrorResponse("Project does not exist.")
+
+    indexes = request.json.get("indexes")
+    if not indexes:
+        start = request.json.get("start") or 1
+        end = request.json.get("end") or project.count_sources()
+        indexes = range(int(start), int(end) + 1)
+    try:
+        indexes = [int(i) for i in indexes]
+    except (TypeError, ValueError):
+        return ErrorResponse("Invalid rows.")
+    if not indexes:
+        return ErrorResponse("No rows to pull.")
+
+    # Share the logged in session with the pool's workers
+    pool.share_cookies(puller.cookies)
+    job = jobs.start(project_name, indexes)
+    return {
+        "error": False,
+        "message": "",
+        "job_id": job.id,
+    }
+
+
+@app.route("/projects/<string:project_name>/pull-jobs/<string:job_id>", methods=["GET"])
+def pull_job(project_name, job_id):
+    """Endpoint for the status of a pull job.
+
+    GET: gets the status and progress of the job
+    """
+    job = jobs.get(job_id)
+    if not job or job.project_name != project_name:
+        return ErrorResponse("Pull job does not exist.")
+    return {
+        "error": False,
+        "job": job.to_json(),
+    }
+
+
+@app.route(
+    "/projects/<string:project_name>/pull-jobs/<string:job_id>/results",
+    methods=["GET"],
+)
+def pull_job_results(project_name, job_id):
+    """Endpoint for the results of a pull job.
+
+    GET: gets the result of every row in the job that has finished, and
+         each attempt at pulling it
+    """
+    job = jobs.get(job_id)
+    if not job or job.project_name != project_name:
+        return ErrorResponse("Pull job does not exist.")
+    return {
+        "error": False,
+        "job": job.to_json(),
+        "results": job.results_to_json(),
+        "attempts": job.attempts_to_json(),
+    }
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Endpoint for how long pulls take.
+
+    GET: gets the p50 and p95 duration of each stage of pulling, and
+         the requests its pages had blocked, for each kind of source and
+         provider, across every project (or just the project given by
+         ?project=)
+    """
+    project_name = request.args.get("project")
+    if project_name and project_name not in Project.get_projects():
+        return ErrorResponse("Project does not exist.")
+    project_names = [project_name] if project_name else Project.get_projects()
+    return {
+        "error": False,
+        "metrics": summarize(
+            [
+                os.path.join(PROJECTS_FOLDER, name, METRICS_FILENAME)
+                for name in project_names
+            ]
+        ),
+    }
+
+
 if __name__ == "__main__":
+    init()
+    puller = Puller()
+    pool = create_pool()
+    jobs = JobManager(pool, on_pulled=track_pulled)
+    # Only clear the user data when the app starts (and not when this
+    # module is imported by a worker process)
+    puller.clear_user_data()
+    # Drop anything in the shared caches that's too old
+    puller.cache.evict()
+    puller.tocs.evict()
+    # Check the sessions saved from the last time the app ran, so they
+    # can be used without logging in again
+    if puller.sessions.sessions():
+        if puller.all_authenticated:
+            print("Restored the saved Hein, Westlaw, and SSRN sessions.")
+        pool.share_cookies(puller.cookies)
+    # Pick up the pulls that were cut off the last time the app stopped,
+    # and start them once Hein, Westlaw, and SSRN are logged in
+    if jobs.recover():
+        if puller.all_authenticated:
+            pool.share_cookies(puller.cookies)
+            jobs.resume()
+        else:
+            print("Log in to resume the pulls that were cut off.")
     t = Timer(3, welcome)
     t.start()
     app.run(host="0.0.0.0", port=PORT, threaded=False, use_reloader=False)
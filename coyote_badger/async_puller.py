@@ -0,0 +1,973 @@
+import asyncio
+import base64
+import os
+import shutil
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
+from queue import Queue
+from urllib.request import urlretrieve
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
+
+from coyote_badger import providers, utils
+from coyote_badger.blocking import ResourceReport
+from coyote_badger.config import (
+    PULL_LOOKAHEAD,
+    PULL_WORKERS,
+    SCREENSHOT_JPEG_QUALITY,
+    WEBSITE_CAPTURE,
+    WESTLAW_SEARCH_TIMEOUT,
+)
+from coyote_badger.downloader import CHUNK_SIZE, Downloader
+from coyote_badger.errors import NoAttemptError, NotAuthenticatedError, NotFoundError
+from coyote_badger.metrics import PullMetrics, file_size, timed
+from coyote_badger.postprocess import merge_pdfs, screenshot_to_pdf
+from coyote_badger.puller import Puller
+from coyote_badger.scraping import (
+    FEDERAL_EDITIONS,
+    FEDERAL_FOUND,
+    GLOBAL_TOC_ITEM,
+    HEIN_NOT_FOUND,
+    HEIN_PRINT_LINK,
+    HEIN_RESULTS,
+    HEIN_SECTION,
+    HEIN_SECTION_PRINT_LINK,
+    HEIN_THROTTLED,
+    HEIN_VERIFY_HUMAN,
+    ISSUE_HEADER_SCRIPT,
+    ISSUE_LIST_SCRIPT,
+    NEXT_ISSUE_LIST_SCRIPT,
+    PDF_VIEWER,
+    SCOTUS_PDF_LINK,
+    SSRN_DOWNLOAD,
+    TOC_ITEM,
+    TOC_TEXT,
+    WESTLAW_DELIVERY,
+    WESTLAW_DELIVERY_DOWNLOAD,
+    WESTLAW_DOCUMENT,
+    WESTLAW_ORIGINAL_IMAGE,
+    WESTLAW_ORIGINAL_IMAGE_SCRIPT,
+    WESTLAW_SEARCH_BUTTON,
+    WESTLAW_SEARCH_INPUT,
+    hein_search_url,
+    hein_url,
+    issue_items,
+    issue_number,
+    journal_filenames,
+    ssrn_download_url,
+    westlaw_delivers,
+)
+from coyote_badger.sessions import SessionStore
+from coyote_badger.source import Result
+
+# What the pages of the attempt running in the current task loaded and blocked
+_resources = ContextVar("resources")
+# How long each stage of the pull running in the current task took
+_metrics = ContextVar("metrics")
+# How many pulls can be downloading from each provider at once, shared by
+# the pulls of a batch (see pull_many)
+_download_stages = ContextVar("download_stages", default=None)
+
+
+class AsyncPuller(object):
+    URLS = Puller.URLS
+    LOGIN_WALLS = Puller.LOGIN_WALLS
+    BROWSER_USER_DATA_DIR = Puller.BROWSER_USER_DATA_DIR
+
+    def __init__(self, user_data_dir=None, executor=None):
+        """Creates a new Puller on Playwright's asyncio API.
+
+        Works the same as Puller, but every browser call is awaited,
+        so many pages can be pulling at once on one event loop (and
+        one browser). Blocking work like merging PDFs and converting
+        screenshots is run in an executor so it never holds up the
+        loop.
+        :param user_data_dir: The folder for the browser user data,
+            defaults to a folder for the async puller
+        :type user_data_dir: str, optional
+        :param executor: The executor for blocking work, defaults to
+            a new thread pool
+        :type executor: Executor, optional
+        """
+        self.user_data_dir = user_data_dir or os.path.join(
+            self.BROWSER_USER_DATA_DIR, "async"
+        )
+        self.chrome_user_data_dir = os.path.join(self.user_data_dir, "chrome")
+        self.firefox_user_data_dir = os.path.join(self.user_data_dir, "firefox")
+        self.executor = executor or ThreadPoolExecutor(thread_name_prefix="blocking")
+        self.sessions = SessionStore(Puller.provider_domains())
+        self._playwright = None
+        self._chrome = None
+        self._firefox = None
+        self._launch_lock = None
+        self._user_agent = None
+        self.downloader = Downloader()
+
+    @classmethod
+    def timeout(cls, sec):
+        return Puller.timeout(sec)
+
+    async def _launch(self, browser_type, user_data_dir, options):
+        if os.path.exists(user_data_dir):
+            shutil.rmtree(user_data_dir)
+        os.makedirs(user_data_dir)
+        return await browser_type.launch_persistent_context(user_data_dir, **options)
+
+    async def get_playwright(self):
+        if not self._launch_lock:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if not self._playwright:
+                self._playwright = await async_playwright().start()
+        return self._playwright
+
+    async def get_chrome(self):
+        playwright = await self.get_playwright()
+        async with self._launch_lock:
+            if not self._chrome:
+                self._chrome = await self._launch(
+                    playwright.chromium,
+                    self.chrome_user_data_dir,
+                    Puller.chrome_options(),
+                )
+        return self._chrome
+
+    async def get_firefox(self):
+        playwright = await self.get_playwright()
+        async with self._launch_lock:
+            if not self._firefox:
+                self._firefox = await self._launch(
+                    playwright.firefox,
+                    self.firefox_user_data_dir,
+                    Puller.firefox_options(),
+                )
+                # Pick up the saved sessions so there's no need to log in
+                # (see Puller.restore_sessions)
+                origins = []
+                for state in self.sessions.sessions().values():
+                    await self._firefox.add_cookies(state["cookies"])
+                    origins.extend(state["origins"])
+                if origins:
+                    await self._firefox.add_init_script(
+                        Puller.local_storage_script(origins)
+                    )
+        return self._firefox
+
+    async def close(self):
+        """Closes the browsers and stops Playwright."""
+        if self._chrome:
+            await self._chrome.close()
+            self._chrome = None
+        if self._firefox:
+            await self._firefox.close()
+            self._firefox = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def add_cookies(self, cookies):
+        """Adds cookies (e.g., from a logged in Puller) to the Firefox session.
+
+        :param cookies: The cookies to add
+        :type cookies: [dict]
+        """
+        if cookies:
+            firefox = await self.get_firefox()
+            await firefox.add_cookies(cookies)
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Runs blocking work in the executor without holding up the loop.
+
+        :param fn: The function to run
+        :type fn: function
+        :returns: What the function returns
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def postprocess(self, fn, *args):
+        """Processes the files of a pulled source in the post-processor's
+        worker processes, so the CPU work doesn't compete with the loop.
+
+        :param fn: The work to do (see PostProcessor.submit)
+        :type fn: function
+        :returns: What the function returns
+        """
+        if not Puller.postprocessor.workers:
+            return await self.run_blocking(fn, *args)
+        return await asyncio.wrap_future(Puller.postprocessor.submit(fn, *args))
+
+    @property
+    def metrics(self):
+        """The timing spans of the pull running in the current task.
+
+        :returns: The pull's metrics
+        :rtype: {PullMetrics}
+        """
+        metrics = _metrics.get(None)
+        if metrics is None:
+            metrics = PullMetrics()
+            _metrics.set(metrics)
+        return metrics
+
+    @asynccontextmanager
+    async def download_stage(self, provider):
+        """Waits for a turn to download from a provider.
+
+        Pulls in a batch can search ahead while the pulls before them
+        are downloading, but only as many as the provider's limit can
+        be downloading at once (see pull_many). Outside of a batch,
+        there's no waiting.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        stages = _download_stages.get()
+        if not stages:
+            yield
+            return
+        with self.metrics.span("wait"):
+            await stages[provider].acquire()
+        try:
+            yield
+        finally:
+            stages[provider].release()
+
+    async def _new_page(self, provider):
+        """Opens a Firefox page for pulling from a provider.
+
+        See Puller._new_page. The report for the current pull is kept
+        in a context variable, since many pulls share this AsyncPuller.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: The new page
+        :rtype: {Page}
+        """
+        firefox = await self.get_firefox()
+        page = await firefox.new_page()
+        report = _resources.get(None) or ResourceReport()
+        page.on("response", report.on_response)
+        if provider not in Puller.blocker.rules:
+            return page
+
+        async def handle(route):
+            request = route.request
+            if Puller.blocker.should_block(
+                provider, request.url, request.resource_type
+            ):
+                report.on_blocked(request)
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await page.route("**/*", handle)
+        return page
+
+    async def direct_download(self, url, path, provider):
+        """Downloads a file straight from its URL, as the Firefox session.
+
+        See Downloader. The request takes a downloads token from the
+        provider's rate limit, right before it's sent.
+        :param url: The URL of the file
+        :type url: str
+        :param path: Where to save the file
+        :type path: str
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: Whether or not the file was saved as a PDF
+        :rtype: {bool}
+        """
+        firefox = await self.get_firefox()
+        if not self._user_agent:
+            page = await firefox.new_page()
+            try:
+                self._user_agent = await page.evaluate("navigator.userAgent")
+            finally:
+                await page.close()
+        await self.throttle(provider, "downloads")
+        return await self.run_blocking(
+            self.downloader.download,
+            url,
+            path,
+            cookies=Downloader.cookie_jar(await firefox.cookies()),
+            headers={"User-Agent": self._user_agent},
+        )
+
+    async def throttle(self, provider, kind):
+        """Waits until an action against a provider is allowed.
+
+        Uses the same RateLimiter as Puller, but sleeps without
+        holding up the loop.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param kind: The kind of action (e.g., "downloads")
+        :type kind: str
+        """
+        delay = Puller.limiter.delay(provider, kind)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _at_login_wall(self, page, provider):
+        """Whether or not a page is asking to log in to a provider.
+
+        See Puller._at_login_wall.
+        :param page: The page to check
+        :type page: Page
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: Whether or not the page is a login page
+        :rtype: {bool}
+        """
+        for selector in self.LOGIN_WALLS[provider]:
+            if not await page.query_selector(selector):
+                return False
+        return True
+
+    async def _check_login_wall(self, page, provider):
+        """Stops a pull if a provider has logged us out.
+
+        See Puller._check_login_wall. The provider is marked as logged
+        out in the AuthCache shared with every Puller, and its saved
+        session is forgotten.
+        :param page: The page to check
+        :type page: Page
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        if await self._at_login_wall(page, provider):
+            Puller.auth.set(provider, False)
+            await self.run_blocking(self.sessions.invalidate, provider)
+            raise NotAuthenticatedError(
+                "Not logged in to {}.".format(provider.capitalize())
+            )
+
+    @timed("search")
+    async def _hein_search(self, page, search_term):
+        """Searches Hein for a search_term.
+
+        :param page: The page to use for search
+        :type page: Page
+        :param search_term: The search_term to search for
+        :type search_term: str
+        """
+        await self.throttle("hein", "requests")
+        await page.goto(hein_search_url(self.URLS, search_term))
+        await self._check_login_wall(page, "hein")
+        await page.wait_for_selector(HEIN_RESULTS)
+        for selector in HEIN_NOT_FOUND:
+            if await page.query_selector(selector):
+                raise NotFoundError
+
+    @timed("search")
+    async def _westlaw_search(self, page, url, search_term):
+        """Searches Westlaw for a search_term.
+
+        :param page: The page to use for search
+        :type page: Page
+        :param url: The url to input the search term
+        :type url: str
+        :param search_term: The search_term to search for
+        :type search_term: str
+        """
+        await self.throttle("westlaw", "requests")
+        await page.goto(url)
+        await self._check_login_wall(page, "westlaw")
+        await page.wait_for_selector(WESTLAW_SEARCH_INPUT, timeout=self.timeout(20))
+        await page.fill(WESTLAW_SEARCH_INPUT, search_term)
+        await page.click(WESTLAW_SEARCH_BUTTON)
+        try:
+            await page.wait_for_selector(
+                WESTLAW_DOCUMENT,
+                state="attached",
+                timeout=self.timeout(WESTLAW_SEARCH_TIMEOUT),
+            )
+        except PlaywrightTimeoutError:
+            raise NotFoundError
+
+    @timed("download")
+    async def _hein_download(self, a_tag, project, source, filename):
+        """Downloads a Hein source.
+
+        See Puller._hein_download.
+        :param a_tag: The <a> tag of the file to download
+        :type a_tag: ElementHandle
+        :param project: The project it belongs to
+        :type project: Project
+        :param source: The source we are downloading
+        :type source: Source
+        :param filename: The filename to save the result as
+        :type filename: str
+        :returns: The filepath of the download
+        :rtype: {str}
+        :raises Exception: The error the download failed with in the
+            browser (see HEIN_THROTTLED for when Hein stops the session)
+        """
+        # Fetch the file straight from its print link, and only open it
+        # in the browser if that doesn't work
+        save_filepath = project.save_pull_path(filename, "pdf")
+        try:
+            url = hein_url(self.URLS, await a_tag.get_attribute("href"))
+            if await self.direct_download(url, save_filepath, "hein"):
+                await self.run_blocking(utils.remove_first_page, save_filepath)
+                return save_filepath
+        except Exception as e:
+            print(str(e))
+        new_page = await self._new_page("hein")
+        try:
+            a_href = await a_tag.get_attribute("href")
+            await self.throttle("hein", "downloads")
+            try:
+                async with new_page.expect_download(
+                    timeout=self.timeout(15)
+                ) as download_info:
+                    await new_page.goto(hein_url(self.URLS, a_href))
+            except PlaywrightTimeoutError:
+                # A timeout might indicate that the warning about too many
+                # downloads recently on this user session is visible.
+                # Click on the "I understand, please proceed" button if so
+                if not await new_page.query_selector(HEIN_VERIFY_HUMAN):
+                    raise
+                Puller.limiter.backoff("hein")
+                try:
+                    async with new_page.expect_download(
+                        timeout=self.timeout(15)
+                    ) as download_info:
+                        await new_page.click(
+                            HEIN_VERIFY_HUMAN, timeout=self.timeout(10)
+                        )
+                except PlaywrightTimeoutError as e:
+                    raise Exception(HEIN_THROTTLED.format(e)) from e
+            download = await download_info.value
+            save_filepath = project.save_pull_path(filename, "pdf")
+            await download.save_as(save_filepath)
+            await self.run_blocking(utils.remove_first_page, save_filepath)
+            return save_filepath
+        finally:
+            await new_page.close()
+
+    async def _hein_toc(self, toc_li, project, source, issue, filename):
+        """Gets the Table of Contents of a journal issue.
+
+        It's taken from the TocCache if another article from the same
+        issue was already pulled, and otherwise downloaded and cached
+        (like the Tables of Contents in Puller._pull_journal).
+        :param toc_li: The <li> of the Table of Contents in the sidebar
+        :type toc_li: ElementHandle
+        :param project: The project it belongs to
+        :type project: Project
+        :param source: The journal article the issue is for
+        :type source: Source
+        :param issue: The issue number
+        :type issue: str
+        :param filename: The filename to save the result as
+        :type filename: str
+        :returns: The filepath of the Table of Contents (or None if it
+            couldn't be downloaded)
+        :rtype: {str}
+        """
+        save_filepath = project.save_pull_path(filename, "pdf")
+        if await self.run_blocking(Puller.tocs.get, source, issue, save_filepath):
+            return save_filepath
+        try:
+            toc_print_a = await toc_li.query_selector(HEIN_PRINT_LINK)
+            save_filepath = await self._hein_download(
+                toc_print_a, project, source, filename
+            )
+        except Exception as e:
+            print(str(e))
+            return None
+        if save_filepath:
+            await self.run_blocking(Puller.tocs.put, source, issue, save_filepath)
+        return save_filepath
+
+    @timed("download")
+    async def _westlaw_download(self, page, project, source, filename):
+        """Downloads a Westlaw source.
+
+        See Puller._westlaw_download.
+        :param page: The page to use for search
+        :type page: Page
+        :param project: The project it belongs to
+        :type project: Project
+        :param source: The source we are downloading
+        :type source: Source
+        :param filename: The filename to save the result as
+        :type filename: str
+        :returns: The downloaded filepath
+        :rtype: {str}
+        """
+        save_filepath = project.save_pull_path(filename, "pdf")
+        await self.throttle("westlaw", "downloads")
+        original_img_link = await page.query_selector(WESTLAW_ORIGINAL_IMAGE)
+        if original_img_link:
+            await page.eval_on_selector(
+                WESTLAW_ORIGINAL_IMAGE, WESTLAW_ORIGINAL_IMAGE_SCRIPT
+            )
+            async with page.expect_download(timeout=self.timeout(20)) as download_info:
+                await original_img_link.click()
+            download = await download_info.value
+            await download.save_as(save_filepath)
+            return save_filepath
+        elif westlaw_delivers(source):
+            for method, args, kwargs in WESTLAW_DELIVERY:
+                await getattr(page, method)(*args, **kwargs)
+            async with page.expect_download(timeout=self.timeout(20)) as download_info:
+                await page.click(WESTLAW_DELIVERY_DOWNLOAD)
+            download = await download_info.value
+            await download.save_as(save_filepath)
+            return save_filepath
+        else:
+            raise NoAttemptError
+
+    async def _pull_website(self, source, project):
+        chrome = await self.get_chrome()
+        page = await chrome.new_page()
+        try:
+            await page.goto(source.short_cite, wait_until="load")
+            async with self.download_stage("web"):
+                await self._save_website(page, source, project)
+        finally:
+            await page.close()
+
+    async def _save_website(self, page, source, project):
+        pdf_path = project.save_pull_path(source.filename, "pdf")
+        if await page.query_selector(PDF_VIEWER):
+            with self.metrics.span("download") as span:
+                await self.run_blocking(urlretrieve, source.short_cite, pdf_path)
+                span.bytes = file_size(pdf_path)
+        elif WEBSITE_CAPTURE != "print" or not await self._print_pdf(page, pdf_path):
+            await self._screenshot_pdf(page, project, source.filename)
+
+    async def _print_pdf(self, page, pdf_path):
+        part_path = pdf_path + ".part"
+        with self.metrics.span("print") as span:
+            try:
+                await page.emulate_media(media="screen")
+                client = await page.context.new_cdp_session(page)
+                try:
+                    stream = await client.send(
+                        "Page.printToPDF", Puller.print_options()
+                    )
+                    with open(part_path, "wb") as f:
+                        while True:
+                            chunk = await client.send(
+                                "IO.read",
+                                {"handle": stream["stream"], "size": CHUNK_SIZE},
+                            )
+                            if chunk.get("base64Encoded"):
+                                f.write(base64.b64decode(chunk["data"]))
+                            else:
+                                f.write(chunk["data"].encode())
+                            if chunk["eof"]:
+                                break
+                    await client.send("IO.close", {"handle": stream["stream"]})
+                finally:
+                    await client.detach()
+                os.replace(part_path, pdf_path)
+            except Exception as e:
+                print(str(e))
+                span.outcome = "error"
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                return False
+            span.bytes = file_size(pdf_path)
+        return True
+
+    async def _screenshot_pdf(self, page, project, filename):
+        img_path = project.save_pull_path(filename, "png")
+        with self.metrics.span("screenshot") as span:
+            await page.screenshot(full_page=True, path=img_path)
+            span.bytes = file_size(img_path)
+        with self.metrics.span("convert") as span:
+            span.bytes = file_size(
+                await self.postprocess(
+                    screenshot_to_pdf, img_path, SCREENSHOT_JPEG_QUALITY
+                )
+            )
+
+    async def _pull_ssrn(self, source, project):
+        page = await self._new_page("ssrn")
+        try:
+            await self.throttle("ssrn", "requests")
+            await page.goto(source.short_cite)
+            await self._check_login_wall(page, "ssrn")
+            download_path = project.save_pull_path(source.filename, "pdf")
+            async with self.download_stage("ssrn"):
+                await self._ssrn_download(page, download_path)
+        finally:
+            await page.close()
+
+    async def _ssrn_download(self, page, download_path):
+        with self.metrics.span("download") as span:
+            href = await page.get_attribute(SSRN_DOWNLOAD, "href")
+            if not href or not await self.direct_download(
+                ssrn_download_url(page.url, href), download_path, "ssrn"
+            ):
+                await self.throttle("ssrn", "downloads")
+                async with page.expect_download(
+                    timeout=self.timeout(10)
+                ) as download_info:
+                    await page.click(SSRN_DOWNLOAD)
+                download = await download_info.value
+                await download.save_as(download_path)
+            span.bytes = file_size(download_path)
+
+    async def _pull_journal(self, source, project):
+        """Pulls a journal article and its issue's Table of Contents from Hein.
+
+        See the JOURNAL section of Puller for how the Contents sidebar
+        can be structured.
+        """
+        page = await self._new_page("hein")
+        try:
+            await self._hein_search(page, source.short_cite)
+            toc_method = ""  # one of: (top|under|global|'')
+            toc2_li = None
+            with self.metrics.span("selector"):
+                try:
+                    await page.wait_for_selector(HEIN_SECTION, timeout=self.timeout(10))
+                except Exception:
+                    raise NotFoundError
+            issue_ul = (await page.evaluate_handle(ISSUE_LIST_SCRIPT)).as_element()
+            issue_header_li = (
+                await page.evaluate_handle(ISSUE_HEADER_SCRIPT)
+            ).as_element()
+            issue = issue_number(await issue_header_li.inner_text())
+            article_filename, toc1_filename, toc2_filename = journal_filenames(source)
+            # Find the article and the Table(s) of Contents first, so
+            # that they can all be downloaded at the same time
+            article_li = await page.query_selector(HEIN_SECTION)
+            article_print_a = await article_li.query_selector(HEIN_PRINT_LINK)
+            toc1_li = await issue_ul.query_selector(TOC_ITEM)
+            if toc1_li:
+                toc_method = "under"
+            if not toc1_li:
+                for li in await page.query_selector_all(issue_items(issue)):
+                    if TOC_TEXT in await li.inner_text():
+                        toc1_li = li
+                        toc_method = "top"
+                        break
+            if not toc1_li:
+                toc1_li = await page.query_selector(GLOBAL_TOC_ITEM)
+                if toc1_li:
+                    toc_method = "global"
+            if issue == "1":
+                if toc_method == "under":
+                    issue2_ul = (
+                        await page.evaluate_handle(NEXT_ISSUE_LIST_SCRIPT)
+                    ).as_element()
+                    toc2_li = await issue2_ul.query_selector(TOC_ITEM)
+                elif toc_method == "top":
+                    for li in await page.query_selector_all(issue_items("2")):
+                        if TOC_TEXT in await li.inner_text():
+                            toc2_li = li
+
+            downloads = [
+                self._hein_download(article_print_a, project, source, article_filename),
+                self._hein_toc(toc1_li, project, source, issue, toc1_filename),
+            ]
+            if toc2_li:
+                downloads.append(
+                    self._hein_toc(toc2_li, project, source, "2", toc2_filename)
+                )
+            async with self.download_stage("hein"):
+                paths = await asyncio.gather(*downloads)
+            article_path = paths[0]
+            if not article_path:
+                raise Exception("Error while downloading journal article")
+            # Merge in the same order as Puller: TOCs, then the article
+            pdfs = [path for path in paths[1:] if path] + [article_path]
+            with self.metrics.span("merge") as span:
+                span.bytes = file_size(
+                    await self.postprocess(
+                        merge_pdfs, pdfs, project.save_pull_path(source.filename, "pdf")
+                    )
+                )
+        finally:
+            await page.close()
+
+    async def _pull_hein_section(self, source, project, open_section):
+        page = await self._new_page("hein")
+        try:
+            await self._hein_search(page, source.short_cite)
+            await open_section(page)
+            with self.metrics.span("selector"):
+                await page.wait_for_selector(HEIN_SECTION)
+            section_print_a = await page.query_selector(HEIN_SECTION_PRINT_LINK)
+            async with self.download_stage("hein"):
+                download_path = await self._hein_download(
+                    section_print_a, project, source, source.filename
+                )
+            if not download_path:
+                raise Exception("No download path returned")
+        finally:
+            await page.close()
+
+    async def _pull_federal(self, source, project):
+        await self._pull_hein_section(source, project, self._open_federal_section)
+
+    async def _pull_scotus(self, source, project):
+        await self._pull_hein_section(source, project, self._open_scotus_section)
+
+    async def _open_federal_section(self, page):
+        with self.metrics.span("selector"):
+            try:
+                await page.wait_for_selector(FEDERAL_FOUND, timeout=self.timeout(10))
+            except Exception as e:
+                print(str(e))
+                raise NotFoundError
+        # Use the 2018 Edition, then the 2012 Edition, then the top match
+        chosen_edition = None
+        for edition in FEDERAL_EDITIONS:
+            chosen_edition = await page.query_selector(edition)
+            if chosen_edition:
+                break
+        chosen_edition_href = await chosen_edition.get_attribute("href")
+        await self.throttle("hein", "requests")
+        await page.goto(hein_url(self.URLS, chosen_edition_href))
+
+    async def _open_scotus_section(self, page):
+        with self.metrics.span("selector"):
+            try:
+                await page.wait_for_selector(SCOTUS_PDF_LINK, timeout=self.timeout(10))
+            except Exception as e:
+                print(str(e))
+                raise NotFoundError
+        await self.throttle("hein", "requests")
+        await page.click(SCOTUS_PDF_LINK)
+
+    async def _pull_westlaw(self, source, project, url):
+        page = await self._new_page("westlaw")
+        try:
+            await self._westlaw_search(page, url, source.short_cite)
+            async with self.download_stage("westlaw"):
+                download_path = await self._westlaw_download(
+                    page, project, source, source.filename
+                )
+            if not download_path:
+                raise Exception("No download path returned")
+        finally:
+            await page.close()
+
+    async def _attempt(self, provider, pull, source, timeout, project, *args):
+        """Runs one way of pulling a source, with retries.
+
+        See Puller._attempt. Each attempt is given up on after the
+        timeout.
+        """
+
+        def on_failure(attempt):
+            if attempt.failure == "throttled":
+                Puller.limiter.backoff(provider)
+
+        async def attempt():
+            self.metrics.provider = provider
+            report = ResourceReport()
+            _resources.set(report)
+            with self.metrics.span("pull") as span:
+                try:
+                    await pull(source, project, *args)
+                    span.bytes = file_size(
+                        project.save_pull_path(source.filename, "pdf")
+                    )
+                finally:
+                    span.resources = report.to_json()
+
+        return await Puller.retry.run_async(
+            attempt,
+            provider,
+            source._attempts,
+            timeout,
+            on_failure,
+        )
+
+    async def pull(self, source, project, timeout=None):
+        """Pulls a source.
+
+        The same as Puller.pull, but awaitable. Each attempt (e.g.,
+        Hein and then Westlaw for SCOTUS cases) is given up on after
+        the timeout, and cancelling the pull closes its pages.
+        :param source: The source to pull
+        :type source: Source
+        :param project: The project that the source belongs to
+        :type project: Project
+        :param timeout: The most seconds an attempt can take, defaults
+            to the timeout of the attempt's provider
+        :type timeout: int, optional
+        :returns: The result of the pull
+        :rtype: {Result}
+        """
+        source._attempts = []
+        metrics = PullMetrics(source)
+        _metrics.set(metrics)
+        with metrics.span("cache") as span:
+            hit = await self.run_blocking(Puller.cache.get, source, project)
+            span.outcome = "hit" if hit else "miss"
+        if hit:
+            await self.run_blocking(metrics.save, project.metrics_file)
+            return Result.SUCCESS
+        result = await self._pull(source, project, timeout)
+        if result == Result.SUCCESS:
+            await self.run_blocking(Puller.cache.put, source, project)
+        await self.run_blocking(metrics.save, project.metrics_file)
+        return result
+
+    async def _pull(self, source, project, timeout):
+        # See Puller.start_pull
+        result = Result.NO_ATTEMPT
+        for step in providers.chain(source):
+            pull, args = step.bind(self)
+            result = await self._attempt(
+                step.provider,
+                pull,
+                source,
+                timeout or providers.get(step.provider).timeout,
+                project,
+                *args,
+            )
+            if result == Result.SUCCESS:
+                break
+        return result
+
+    async def pull_many(
+        self, project, indexes, limits=None, lookahead=PULL_LOOKAHEAD, on_start=None
+    ):
+        """Pulls several sources from a project at the same time.
+
+        Every source gets its own pages on the same browsers, with at
+        most the limit for each provider downloading at once. Up to
+        lookahead more sources per provider can be searching for
+        their documents in the meantime, so the next download is ready
+        to start as soon as one finishes.
+        :param project: The project that the sources belong to
+        :type project: Project
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :param limits: The most downloads per provider at once,
+            defaults to the capacity of each provider (see
+            providers.limits)
+        :type limits: dict(str -> int), optional
+        :param lookahead: How many more pulls per provider can be
+            searching at once, defaults to PULL_LOOKAHEAD
+        :type lookahead: int, optional
+        :param on_start: Called (off the loop) with the row of each
+            source just before it starts being pulled, defaults to None
+        :type on_start: function, optional
+        :yields: The row and the pulled source, as each one finishes
+        :ytype: {(int, Source)}
+        """
+        semaphores = defaultdict(lambda: asyncio.Semaphore(PULL_WORKERS + lookahead))
+        stages = defaultdict(lambda: asyncio.Semaphore(PULL_WORKERS))
+        for provider, limit in (limits or providers.limits()).items():
+            semaphores[provider] = asyncio.Semaphore(limit + lookahead)
+            stages[provider] = asyncio.Semaphore(limit)
+
+        async def pull_one(index, source):
+            # Each task has its own copy of the context, so this only
+            # applies to the pulls of this batch
+            _download_stages.set(stages)
+            provider = Puller.get_provider(source)
+            if not provider:
+                source.result = Result.NO_ATTEMPT
+                return index, source
+            async with semaphores[provider]:
+                if on_start:
+                    await self.run_blocking(on_start, index)
+                source.result = await self.pull(source, project)
+            return index, source
+
+        def read_sources():
+            # Under the project's lock, since the app may be saving it at
+            # the same time (see PullerPool.pull)
+            with project.lock:
+                return [(index, project.get_source(index)) for index in indexes]
+
+        sources = await self.run_blocking(read_sources)
+        tasks = [
+            asyncio.ensure_future(pull_one(index, source)) for index, source in sources
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class AsyncPullerPool(object):
+    def __init__(self, limits=None, lookahead=PULL_LOOKAHEAD):
+        """Runs an AsyncPuller on its own event loop thread.
+
+        Has the same interface as PullerPool, so it can be used for
+        pull jobs in its place.
+        :param limits: The most downloads per provider at once,
+            defaults to the capacity of each provider (see
+            providers.limits)
+        :type limits: dict(str -> int), optional
+        :param lookahead: How many more pulls per provider can be
+            searching at once, defaults to PULL_LOOKAHEAD
+        :type lookahead: int, optional
+        """
+        self.limits = limits
+        self.lookahead = lookahead
+        self.puller = AsyncPuller()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="async-puller", daemon=True
+        )
+        self._thread.start()
+
+    def share_cookies(self, cookies):
+        """Shares an authenticated session with the AsyncPuller.
+
+        :param cookies: The cookies of the logged in session
+        :type cookies: [dict]
+        """
+        asyncio.run_coroutine_threadsafe(
+            self.puller.add_cookies(cookies), self._loop
+        ).result()
+
+    def pull(self, project, indexes, on_start=None):
+        """Pulls several sources from a project at the same time.
+
+        See PullerPool.pull.
+        :param project: The project that the sources belong to
+        :type project: Project
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :param on_start: Called with the row of each source just before
+            it starts being pulled, defaults to None
+        :type on_start: function, optional
+        :yields: The row and the pulled source, as each one finishes
+        :ytype: {(int, Source)}
+        """
+        done = Queue()
+        finished = object()
+
+        async def run():
+            try:
+                async for item in self.puller.pull_many(
+                    project, indexes, self.limits, self.lookahead, on_start
+                ):
+                    done.put(item)
+            finally:
+                done.put(finished)
+
+        future = asyncio.run_coroutine_threadsafe(run(), self._loop)
+        completed = False
+        try:
+            while True:
+                item = done.get()
+                if item is finished:
+                    completed = True
+                    break
+                yield item
+        finally:
+            # Stop any pulls that are still going if the caller stopped
+            if not completed:
+                future.cancel()
+        future.result()
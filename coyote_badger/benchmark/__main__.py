@@ -0,0 +1,344 @@
+"""Benchmarks pulling a synthetic project against local stand-ins for
+Hein, Westlaw, and SSRN (see FixtureServer), and reports the sources
+pulled per minute, the latency percentiles, and the peak memory used.
+
+Run it with `python -m coyote_badger.benchmark` (see --help).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from coyote_badger.async_puller import AsyncPuller, AsyncPullerPool
+from coyote_badger.benchmark.memory import PeakMemory
+from coyote_badger.benchmark.server import FixtureServer
+from coyote_badger.cache import SourceCache, TocCache
+from coyote_badger.config import PULL_ENGINE, PULL_LIMITS, PULL_WORKERS
+from coyote_badger.metrics import METRICS_FILENAME, percentile, summarize
+from coyote_badger.pool import PullerPool
+from coyote_badger.project import Project
+from coyote_badger.puller import Puller
+from coyote_badger.ratelimit import RateLimiter
+from coyote_badger.source import Kind, Source
+
+# How often each kind of source shows up in the synthetic project
+SOURCE_MIX = {
+    Kind.JOURNAL: 40,
+    Kind.NON_SCOTUS: 15,
+    Kind.SCOTUS: 10,
+    Kind.FEDERAL: 10,
+    Kind.STATE: 10,
+    Kind.SSRN: 10,
+    Kind.WEBSITE: 5,
+}
+JOURNALS = ["Harv. L. Rev.", "Stan. L. Rev.", "Yale L.J.", "Tex. L. Rev."]
+STATE_CODES = ["Tex. Penal Code Ann.", "Cal. Civ. Code", "N.Y. Gen. Bus. Law"]
+
+
+class BenchmarkProject(object):
+    """Stands in for a Project whose sources are made up.
+
+    Pulling only needs to know where to save files (see PullFolder),
+    so there's no Sources.xlsx.
+    """
+
+    def __init__(self, project_folder, sources):
+        self.project_folder = project_folder
+        self.pull_folder = os.path.join(project_folder, "pull")
+        self.metrics_file = os.path.join(project_folder, METRICS_FILENAME)
+        self.sources = sources
+        self.lock = threading.RLock()
+        os.makedirs(self.pull_folder, exist_ok=True)
+
+    save_pull_path = Project.save_pull_path
+
+    def get_source(self, index):
+        return self.sources[index - 1]
+
+
+def synthetic_sources(server, count, seed=0):
+    """Makes up the sources of a project, in about the mix of a real one.
+
+    Every cite is different, so nothing is pulled from the cache, but
+    journal articles share a few volumes so their issues' Tables of
+    Contents are (like they would be in a real project).
+    :param server: The server that will stand in for the providers
+    :type server: FixtureServer
+    :param count: The number of sources
+    :type count: int
+    :param seed: Makes the same project every time, defaults to 0
+    :type seed: int, optional
+    :returns: The sources
+    :rtype: {[Source]}
+    """
+    rand = random.Random(seed)
+    kinds = rand.choices(list(SOURCE_MIX), weights=list(SOURCE_MIX.values()), k=count)
+    sources = []
+    for i, kind in enumerate(kinds, 1):
+        if kind == Kind.JOURNAL:
+            cite = "{} {} {}".format(100 + i % 5, JOURNALS[i % 4], 1 + i * 37 % 3200)
+        elif kind == Kind.NON_SCOTUS:
+            # Some cases are only on Westlaw, and have no Original Image
+            if i % 5:
+                cite = "{} F.3d {}".format(500 + i % 400, i)
+            else:
+                cite = "2019 WL {}".format(100000 + i)
+        elif kind == Kind.SCOTUS:
+            cite = "{} U.S. {}".format(300 + i % 290, i)
+        elif kind == Kind.FEDERAL:
+            cite = "{} U.S.C. § {}".format(1 + i % 50, i)
+        elif kind == Kind.STATE:
+            cite = "{} § {}".format(STATE_CODES[i % 3], i)
+        elif kind == Kind.SSRN:
+            cite = server.ssrn_url(1000000 + i)
+        else:
+            cite = server.website_url(i)
+        sources.append(
+            Source(
+                fn_num=i,
+                long_cite=cite,
+                short_cite=cite,
+                filename="source-{}".format(i),
+                kind=kind,
+            )
+        )
+    return sources
+
+
+def latency(source):
+    """How long a source took to pull, from its first attempt starting
+    to its last attempt finishing (so not counting time in the queue).
+
+    :param source: The pulled source
+    :type source: Source
+    :returns: The seconds, or None if it wasn't attempted
+    :rtype: {float}
+    """
+    if not source._attempts:
+        return None
+    last = source._attempts[-1]
+    return last.started_at + last.duration - source._attempts[0].started_at
+
+
+def percentiles(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def run(args):
+    """Pulls a synthetic project from the fixture server.
+
+    Everything the benchmark saves (browser user data, caches, and
+    pulls) goes in a temporary folder, so the real ones aren't touched.
+    :param args: The parsed command line arguments
+    :type args: Namespace
+    :returns: The report
+    :rtype: {dict}
+    """
+    server = FixtureServer(latency=args.latency, jitter=args.jitter)
+    server.start()
+    folder = tempfile.mkdtemp(prefix="coyote-badger-benchmark-")
+    try:
+        # AsyncPuller shares Puller's URLS, so this points both at the server
+        Puller.URLS.update(server.urls)
+        Puller.BROWSER_USER_DATA_DIR = os.path.join(folder, "usr")
+        AsyncPuller.BROWSER_USER_DATA_DIR = Puller.BROWSER_USER_DATA_DIR
+        Puller.cache = SourceCache(folder=os.path.join(folder, ".cache"))
+        Puller.tocs = TocCache(folder=os.path.join(folder, ".cache"))
+        if not args.rate_limits:
+            Puller.limiter = RateLimiter({})
+        if args.headless:
+            for name in ("chrome_options", "firefox_options"):
+                options = getattr(Puller, name)
+                setattr(
+                    Puller,
+                    name,
+                    classmethod(
+                        lambda cls, options=options: dict(options(), headless=True)
+                    ),
+                )
+
+        project = BenchmarkProject(
+            os.path.join(folder, "project"),
+            synthetic_sources(server, args.sources, args.seed),
+        )
+        if args.engine == "async":
+            pool = AsyncPullerPool()
+        else:
+            pool = PullerPool(workers=args.workers, limits=PULL_LIMITS)
+
+        memory = PeakMemory()
+        memory.start()
+        started_at = time.time()
+        results = Counter()
+        latencies = defaultdict(list)
+        for done, (_, source) in enumerate(
+            pool.pull(project, range(1, len(project.sources) + 1)), 1
+        ):
+            results[source.result.value] += 1
+            seconds = latency(source)
+            if seconds is not None:
+                latencies[source.kind.value].append(seconds)
+            if args.verbose:
+                print(
+                    "[{}/{}] {}: {}".format(
+                        done, len(project.sources), source.short_cite, source.result
+                    )
+                )
+        elapsed = time.time() - started_at
+        peak_memory = memory.stop()
+
+        return {
+            "engine": args.engine,
+            "sources": len(project.sources),
+            "latency_setting": args.latency,
+            "elapsed": elapsed,
+            "sources_per_minute": len(project.sources) / elapsed * 60,
+            "results": dict(results),
+            "latency": percentiles(sum(latencies.values(), [])),
+            "latency_by_kind": {
+                kind: percentiles(values) for kind, values in sorted(latencies.items())
+            },
+            "peak_memory": peak_memory,
+            "server_requests": server.requests,
+            "stages": summarize([project.metrics_file]),
+        }
+    finally:
+        server.stop()
+        if args.keep:
+            print("Kept the benchmark's files in {}".format(folder))
+        else:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def print_report(report):
+    def seconds(value):
+        return "-" if value is None else "{:.2f}s".format(value)
+
+    print(
+        "Pulled {} sources in {:.1f}s with the {} engine ({:.1f} sources/min)".format(
+            report["sources"],
+            report["elapsed"],
+            report["engine"],
+            report["sources_per_minute"],
+        )
+    )
+    print(
+        "Results: {}".format(
+            ", ".join(
+                "{} {}".format(n, r) for r, n in sorted(report["results"].items())
+            )
+        )
+    )
+    if report["peak_memory"] is not None:
+        print("Peak memory: {:.0f} MiB".format(report["peak_memory"] / 2**20))
+    print("Fixture server requests: {}".format(report["server_requests"]))
+    print()
+    print("{:<16} {:>6} {:>8} {:>8} {:>8}".format("Kind", "Count", "p50", "p95", "p99"))
+    rows = list(report["latency_by_kind"].items()) + [("All", report["latency"])]
+    for kind, stats in rows:
+        print(
+            "{:<16} {:>6} {:>8} {:>8} {:>8}".format(
+                kind,
+                stats["count"],
+                seconds(stats["p50"]),
+                seconds(stats["p95"]),
+                seconds(stats["p99"]),
+            )
+        )
+    print()
+    print(
+        "{:<16} {:<8} {:<10} {:>6} {:>8} {:>8}".format(
+            "Kind", "Provider", "Stage", "Count", "p50", "p95"
+        )
+    )
+    for stage in report["stages"]:
+        print(
+            "{:<16} {:<8} {:<10} {:>6} {:>8} {:>8}".format(
+                stage["kind"],
+                stage["provider"],
+                stage["stage"],
+                stage["count"],
+                seconds(stage["p50"]),
+                seconds(stage["p95"]),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m coyote_badger.benchmark",
+        description=(
+            "Benchmarks pulling a synthetic project against local stand-ins "
+            "for Hein, Westlaw, and SSRN."
+        ),
+    )
+    parser.add_argument(
+        "--sources", type=int, default=500, help="the number of sources to pull"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.2,
+        help="the seconds the server waits before each response",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.1,
+        help="the most extra seconds (at random) the server waits",
+    )
+    # Worker processes re-read the settings when they start, so they
+    # can't be pointed at the fixture server
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default=PULL_ENGINE if PULL_ENGINE == "async" else "threads",
+        help="how pulls are run at the same time (see PULL_ENGINE)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PULL_WORKERS,
+        help="the number of worker threads for the threads engine",
+    )
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="pace the pulls with RATE_LIMITS, like against the real sites",
+    )
+    parser.add_argument(
+        "--headless", action="store_true", help="run the browsers headless"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="makes a different synthetic project"
+    )
+    parser.add_argument("--json", help="also save the report as json to this path")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the pulled files and metrics"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="print each source as it finishes"
+    )
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Benchmarks the two ways websites are saved as PDFs (see
+WEBSITE_CAPTURE): printing them with Chrome, and converting a full page
+screenshot. Reports the time, added memory, size, and pages of each
+on short and long sample pages from the fixture server.
+
+Run it with `python -m coyote_badger.benchmark.capture` (see --help).
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from PyPDF2 import PdfFileReader
+
+from coyote_badger.benchmark.memory import PeakMemory, process_tree_rss
+from coyote_badger.benchmark.server import FixtureServer
+from coyote_badger.metrics import file_size
+from coyote_badger.postprocess import PostProcessor
+from coyote_badger.puller import Puller
+
+MODES = ["print", "screenshot"]
+
+
+class CaptureProject(object):
+    """Stands in for a Project, which capturing only needs to save to."""
+
+    def __init__(self, pull_folder):
+        self.pull_folder = pull_folder
+
+    def save_pull_path(self, filename, extension):
+        return os.path.join(self.pull_folder, "{}.{}".format(filename, extension))
+
+
+def capture(puller, project, url, mode, filename):
+    """Saves a website as a PDF one way, measuring how it went.
+
+    :param puller: The puller whose Chrome loads the website
+    :type puller: Puller
+    :param project: Where to save the PDF
+    :type project: CaptureProject
+    :param url: The URL of the website
+    :type url: str
+    :param mode: How to save it, "print" or "screenshot"
+    :type mode: str
+    :param filename: The filename of the PDF
+    :type filename: str
+    :returns: The seconds, added memory (in bytes), size (in bytes), and
+        pages of the PDF
+    :rtype: {dict}
+    """
+    pdf_path = project.save_pull_path(filename, "pdf")
+    page = puller.chrome.new_page()
+    try:
+        page.goto(url, wait_until="load")
+        baseline = process_tree_rss(os.getpid())
+        memory = PeakMemory(interval=0.05)
+        memory.start()
+        started_at = time.time()
+        if mode == "print":
+            saved = puller._print_pdf(page, pdf_path)
+        else:
+            puller._screenshot_pdf(page, project, filename)
+            saved = os.path.exists(pdf_path)
+        elapsed = time.time() - started_at
+        peak = memory.stop()
+    finally:
+        page.close()
+    if not saved:
+        return None
+    with open(pdf_path, "rb") as f:
+        pages = PdfFileReader(f).getNumPages()
+    return {
+        "seconds": elapsed,
+        "memory": max(0, (peak or 0) - baseline),
+        "bytes": file_size(pdf_path),
+        "pages": pages,
+    }
+
+
+def run(args):
+    server = FixtureServer(latency=0, jitter=0)
+    server.start()
+    # Convert screenshots right away, so they're timed with the capture
+    Puller.postprocessor = PostProcessor(workers=0)
+    folder = tempfile.mkdtemp(prefix="coyote-badger-capture-")
+    puller = Puller(user_data_dir=os.path.join(folder, "usr"))
+    project = CaptureProject(folder)
+    report = []
+    try:
+        for paragraphs in args.paragraphs:
+            url = server.website_url(paragraphs, paragraphs=paragraphs)
+            for mode in MODES:
+                filename = "{}-{}".format(mode, paragraphs)
+                runs = [
+                    capture(puller, project, url, mode, filename)
+                    for _ in range(args.repeat)
+                ]
+                runs = [r for r in runs if r]
+                if not runs:
+                    print(
+                        "Couldn't {} the page with {} paragraphs".format(
+                            mode, paragraphs
+                        )
+                    )
+                    continue
+                report.append(
+                    {
+                        "mode": mode,
+                        "paragraphs": paragraphs,
+                        "seconds": min(r["seconds"] for r in runs),
+                        "memory": max(r["memory"] for r in runs),
+                        "bytes": runs[-1]["bytes"],
+                        "pages": runs[-1]["pages"],
+                    }
+                )
+    finally:
+        puller.close()
+        server.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    print(
+        "{:<12} {:>10} {:>9} {:>11} {:>10} {:>6}".format(
+            "Mode", "Paragraphs", "Seconds", "Memory", "Size", "Pages"
+        )
+    )
+    for row in report:
+        print(
+            "{:<12} {:>10} {:>8.2f}s {:>7.0f} MiB {:>6.0f} KiB {:>6}".format(
+                row["mode"],
+                row["paragraphs"],
+                row["seconds"],
+                row["memory"] / 2**20,
+                row["bytes"] / 2**10,
+                row["pages"],
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m coyote_badger.benchmark.capture",
+        description=(
+            "Benchmarks printing websites to PDFs against converting full "
+            "page screenshots."
+        ),
+    )
+    parser.add_argument(
+        "--paragraphs",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="the lengths of the sample pages, in paragraphs",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="how many times to save each page"
+    )
+    parser.add_argument("--json", help="also save the report as json to this path")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+from collections import defaultdict
+
+
+def process_tree_rss(pid):
+    """The memory used by a process and everything it started (e.g.,
+    the browsers), from /proc.
+
+    :param pid: The process id
+    :type pid: int
+    :returns: The resident set size in bytes
+    :rtype: {int}
+    """
+    children = defaultdict(list)
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(name)) as f:
+                # The ppid is the second field after the process name,
+                # which can have spaces in it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(name))
+    total = 0
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open("/proc/{}/statm".format(pid)) as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            pass
+        pids.extend(children[pid])
+    return total
+
+
+class PeakMemory(object):
+    def __init__(self, interval=0.5):
+        """Keeps track of the most memory used at once by the benchmark
+        and its browsers.
+
+        Samples /proc where it's available (Linux, including the Docker
+        container). Otherwise, falls back on the peak of this process
+        and the largest browser that has exited, which undercounts.
+        :param interval: The seconds between samples, defaults to 0.5
+        :type interval: float, optional
+        """
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, name="peak-memory", daemon=True
+        )
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, process_tree_rss(os.getpid()))
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+
+    def stop(self):
+        """Stops sampling.
+
+        :returns: The peak memory in bytes, or None if it's not known
+        :rtype: {int}
+        """
+        if self._thread.is_alive():
+            self._stopped.set()
+            self._thread.join()
+            return max(self.peak, process_tree_rss(os.getpid()))
+        try:
+            import resource
+        except ImportError:
+            return None
+        # ru_maxrss is in kilobytes, except on macOS where it's in bytes
+        scale = 1 if sys.platform == "darwin" else 1024
+        return scale * (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        )
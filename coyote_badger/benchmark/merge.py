@@ -0,0 +1,218 @@
+"""Benchmarks putting together a Hein journal article: dropping the
+cover page Hein prints on the article and each Table of Contents, then
+merging them. Compares PyPDF2's merger (what utils.merge and
+utils.remove_first_page used to do), the streaming functions in
+coyote_badger.pdf called the same way, and a single assemble pass, and
+reports the time and peak memory of each.
+
+Run it with `python -m coyote_badger.benchmark.merge` (see --help).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfFileMerger, PdfFileReader, PdfFileWriter
+
+from coyote_badger import pdf
+from coyote_badger.benchmark.server import sample_pdf
+
+# The most pages of a sample PDF that are drawn at once
+BATCH_PAGES = 50
+METHODS = ["pypdf2", "streaming", "assemble"]
+
+
+def write_sample(path, pages, seed):
+    """Saves a sample scanned PDF, drawing it a batch of pages at a time.
+
+    :param path: Where to save it
+    :type path: str
+    :param pages: The number of pages
+    :type pages: int
+    :param seed: Makes a different PDF
+    :type seed: int
+    """
+    batches = []
+    for start in range(0, pages, BATCH_PAGES):
+        batch = "{}.{}".format(path, start)
+        with open(batch, "wb") as f:
+            f.write(sample_pdf(min(BATCH_PAGES, pages - start), seed=seed + start))
+        batches.append(batch)
+    pdf.merge(batches, path)
+    for batch in batches:
+        os.remove(batch)
+
+
+def pypdf2_remove_first_page(path):
+    infile = PdfFileReader(path, "rb")
+    output = PdfFileWriter()
+    for i in range(1, infile.getNumPages()):
+        output.addPage(infile.getPage(i))
+    with open(path, "wb") as f:
+        output.write(f)
+
+
+def pypdf2_merge(paths, save_as_path):
+    merger = PdfFileMerger()
+    for path in paths:
+        merger.append(path)
+    merger.write(save_as_path)
+    merger.close()
+
+
+def put_together(method, tocs, article, save_as_path):
+    """Drops the cover pages of the Tables of Contents and the article,
+    and merges them (in a fresh process, so its peak memory is its own).
+
+    :param method: How to do it (see METHODS)
+    :type method: str
+    :param tocs: The paths of the Tables of Contents
+    :type tocs: [str]
+    :param article: The path of the article
+    :type article: str
+    :param save_as_path: Where to save the merged PDF
+    :type save_as_path: str
+    :returns: The seconds it took, and the peak memory in bytes
+    :rtype: {(float, int)}
+    """
+    started_at = time.time()
+    paths = tocs + [article]
+    if method == "assemble":
+        pdf.assemble([(path, range(1)) for path in paths], save_as_path)
+    else:
+        remove_first_page, merge = {
+            "pypdf2": (pypdf2_remove_first_page, pypdf2_merge),
+            "streaming": (lambda path: pdf.remove_pages(path, range(1)), pdf.merge),
+        }[method]
+        for path in paths:
+            remove_first_page(path)
+        merge(paths, save_as_path)
+    elapsed = time.time() - started_at
+    return elapsed, peak_rss()
+
+
+def peak_rss():
+    """The peak memory of this process.
+
+    ru_maxrss carries over the peak of the process that started this
+    one on Linux, so the high water mark in /proc is used where it's
+    available.
+    :returns: The peak resident set size in bytes
+    :rtype: {int}
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes, except on macOS where it's in bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(args):
+    folder = tempfile.mkdtemp(prefix="coyote-badger-merge-")
+    report = []
+    try:
+        samples = [os.path.join(folder, "article.pdf")] + [
+            os.path.join(folder, "toc{}.pdf".format(i)) for i in range(args.tocs)
+        ]
+        write_sample(samples[0], args.pages, seed=1)
+        for i, path in enumerate(samples[1:]):
+            write_sample(path, args.toc_pages, seed=1000 * (i + 2))
+        size = sum(os.path.getsize(path) for path in samples)
+
+        context = multiprocessing.get_context("spawn")
+        for method in METHODS:
+            runs = []
+            for i in range(args.repeat):
+                # Each run gets its own copies, since covers are dropped in place
+                copies = []
+                for path in samples:
+                    copy = "{}.{}-{}".format(path, method, i)
+                    shutil.copy(path, copy)
+                    copies.append(copy)
+                out_path = os.path.join(folder, "{}-{}.pdf".format(method, i))
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    runs.append(
+                        executor.submit(
+                            put_together, method, copies[1:], copies[0], out_path
+                        ).result()
+                    )
+                with open(out_path, "rb") as f:
+                    pages = PdfFileReader(f, strict=False).getNumPages()
+                for copy in copies + [out_path]:
+                    os.remove(copy)
+            report.append(
+                {
+                    "method": method,
+                    "input_bytes": size,
+                    "pages": pages,
+                    "seconds": min(seconds for seconds, _ in runs),
+                    "peak_memory": max(memory for _, memory in runs),
+                }
+            )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    if report:
+        print(
+            "Merged {:.0f} MiB into {} pages".format(
+                report[0]["input_bytes"] / 2**20, report[0]["pages"]
+            )
+        )
+    print("{:<12} {:>9} {:>12}".format("Method", "Seconds", "Peak memory"))
+    for row in report:
+        print(
+            "{:<12} {:>8.2f}s {:>8.0f} MiB".format(
+                row["method"], row["seconds"], row["peak_memory"] / 2**20
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m coyote_badger.benchmark.merge",
+        description=(
+            "Benchmarks dropping cover pages and merging a Hein journal "
+            "article with its Tables of Contents."
+        ),
+    )
+    parser.add_argument(
+        "--pages", type=int, default=400, help="the pages in the article"
+    )
+    parser.add_argument(
+        "--tocs", type=int, default=2, help="the number of Tables of Contents"
+    )
+    parser.add_argument(
+        "--toc-pages",
+        type=int,
+        default=20,
+        help="the pages in each Table of Contents",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="how many times to run each method"
+    )
+    parser.add_argument("--json", help="also save the report as json to this path")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
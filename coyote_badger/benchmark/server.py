@@ -0,0 +1,388 @@
+import io
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from jinja2 import Environment, FileSystemLoader
+from PIL import Image, ImageDraw
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# How many pages each kind of sample PDF has (Hein adds a cover page to
+# everything it prints, which the puller removes)
+PDF_PAGES = {
+    "article": 25,
+    "toc": 4,
+    "section": 3,
+    "case": 12,
+    "statute": 3,
+    "paper": 30,
+}
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim "
+    "veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea "
+    "commodo consequat."
+)
+
+
+def sample_pdf(pages, seed=0):
+    """Creates a PDF that looks enough like a scanned source to have a
+    realistic size.
+
+    :param pages: The number of pages
+    :type pages: int
+    :param seed: Makes every PDF with the same seed the same, defaults
+        to 0
+    :type seed: int, optional
+    :returns: The PDF
+    :rtype: {bytes}
+    """
+    rand = random.Random(seed)
+    images = []
+    for _ in range(pages):
+        img = Image.new("L", (612, 792), 255)
+        draw = ImageDraw.Draw(img)
+        # Lines of "text" of random lengths
+        for y in range(72, 720, 14):
+            x = 72
+            while x < 540:
+                word = rand.randint(12, 60)
+                draw.rectangle(
+                    [x, y, min(x + word, 540), y + 7], fill=rand.randint(0, 90)
+                )
+                x += word + 6
+        images.append(img)
+    out = io.BytesIO()
+    images[0].save(out, "PDF", save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+class FixtureServer(object):
+    def __init__(self, latency=0, jitter=0, host="127.0.0.1", port=0):
+        """Creates a local stand-in for Hein, Westlaw, and SSRN.
+
+        Serves copies of the pages that Puller navigates (the search
+        results, the Contents sidebar, Westlaw's delivery flow, and
+        SSRN's download button) and sample PDFs, so that pulls can be
+        benchmarked without live subscriptions. What a search finds is
+        decided by the cite (see the handlers), and every response is
+        delayed by the latency to stand in for the real sites.
+        :param latency: The seconds to wait before each response,
+            defaults to 0
+        :type latency: float, optional
+        :param jitter: The most extra seconds (at random) to wait before
+            each response, defaults to 0
+        :type jitter: float, optional
+        :param host: The host to serve on, defaults to "127.0.0.1"
+        :type host: str, optional
+        :param port: The port to serve on, defaults to 0 (any free port)
+        :type port: int, optional
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.templates = Environment(
+            loader=FileSystemLoader(FIXTURES_FOLDER), autoescape=True
+        )
+        self.requests = 0
+        self._pdfs = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def urls(self):
+        """The settings that point the puller at the server.
+
+        :returns: The same keys as settings.default.urls
+        :rtype: {dict(str -> str)}
+        """
+        hein = self.base_url + "/hein/HOL/"
+        westlaw = self.base_url + "/westlaw/"
+        ssrn = self.base_url + "/ssrn/"
+        return {
+            "HEIN_SIGN_IN_URL": hein + "Welcome",
+            "HEIN_AUTHED_URL": hein + "Welcome",
+            "HEIN_SEARCH_URL": hein + "OneBoxCitation?cit_string={}",
+            "HEIN_BASE_URL": hein,
+            "WESTLAW_SIGN_IN_URL": westlaw + "Search/Home.html",
+            "WESTLAW_AUTHED_URL": westlaw + "Search/Home.html",
+            "WESTLAW_SEARCH_URL": westlaw + "Search/Home.html",
+            "WESTLAW_STATUTES_URL": westlaw + "Browse/Home/StatutesCourtRules",
+            "WESTLAW_CASES_URL": westlaw + "Browse/Home/Cases",
+            "SSRN_SIGN_IN_URL": ssrn + "Library/myLibrary.cfm",
+            "SSRN_AUTHED_URL": ssrn + "Library/myLibrary.cfm",
+        }
+
+    def ssrn_url(self, abstract_id):
+        return "{}/ssrn/sol3/papers.cfm?abstract_id={}".format(
+            self.base_url, abstract_id
+        )
+
+    def website_url(self, page_id, paragraphs=None):
+        """The URL of a sample website.
+
+        :param page_id: Makes a different page
+        :type page_id: int
+        :param paragraphs: The number of paragraphs, defaults to a few
+            (at random)
+        :type paragraphs: int, optional
+        :returns: The URL
+        :rtype: {str}
+        """
+        url = "{}/web/page?id={}".format(self.base_url, page_id)
+        if paragraphs:
+            url += "&paragraphs={}".format(paragraphs)
+        return url
+
+    def start(self):
+        """Starts serving in the background."""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fixture-server", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def pdf(self, kind):
+        """A sample PDF, created the first time it's needed.
+
+        :param kind: The kind of PDF (see PDF_PAGES)
+        :type kind: str
+        :returns: The PDF
+        :rtype: {bytes}
+        """
+        with self._lock:
+            if kind not in self._pdfs:
+                self._pdfs[kind] = sample_pdf(PDF_PAGES[kind], seed=len(kind))
+            return self._pdfs[kind]
+
+    def render(self, template, **context):
+        rand = random.Random(str(sorted(context.items())))
+        context.setdefault(
+            "paragraphs",
+            [LOREM * rand.randint(1, 4) for _ in range(rand.randint(3, 12))],
+        )
+        return self.templates.get_template(template).render(**context)
+
+    # ------------------------------------------------------------------
+    # Hein
+    # ------------------------------------------------------------------
+    def hein(self, path, query):
+        cite = query.get("cit_string", query.get("cite", [""]))[0]
+        if path == "Welcome":
+            return 200, "text/html", self.render("hein_welcome.html.j2")
+        if path == "OneBoxCitation":
+            return self.hein_search(cite)
+        if path == "Page":
+            return 200, "text/html", self.hein_contents(cite, "section")
+        if path == "PrintRequest":
+            # Hein prints a cover page before everything, which is why
+            # the sample PDFs have an extra page
+            kind = query.get("kind", ["article"])[0]
+            if kind not in PDF_PAGES:
+                return 404, "text/html", "Not Found"
+            return 200, "application/pdf", self.pdf(kind)
+        return 404, "text/html", "Not Found"
+
+    def hein_search(self, cite):
+        """The results of a citation search on Hein.
+
+        Cites with "notfound" in them aren't found. U.S. Code cites are
+        federal statutes, U.S. Reports cites are SCOTUS cases, and any
+        other "volume journal page" cite is a journal article.
+        """
+        if "notfound" in cite.lower():
+            return 200, "text/html", self.render("hein_not_found.html.j2", cite=cite)
+        if re.search(r"U\.?S\.?C", cite):
+            # Most sections have a 2018 Edition, and some only have older ones
+            editions = ["2018", "2012"] if sum(map(ord, cite)) % 4 else ["2006"]
+            return (
+                200,
+                "text/html",
+                self.render("hein_federal.html.j2", cite=cite, editions=editions),
+            )
+        if re.search(r"\d+ U\.?S\.? \d+", cite):
+            return 200, "text/html", self.render("hein_scotus.html.j2", cite=cite)
+        if re.match(r"\s*\d+\s+.+?\s+\d+", cite):
+            return 200, "text/html", self.hein_contents(cite, "article")
+        return 200, "text/html", self.render("hein_not_found.html.j2", cite=cite)
+
+    def hein_contents(self, cite, kind):
+        """A page with the Contents sidebar, with the cited section
+        highlighted.
+
+        A journal article is in the issue its first page falls in, and
+        each issue has its Table of Contents right below its header.
+        """
+        match = re.match(r"\s*(\d+)\s+(.+?)\s+(\d+)", cite)
+        start_page = int(match.group(3)) if match else 1
+        issue_number = min(8, start_page // 400 + 1) if kind == "article" else 1
+        issues = []
+        for number in range(1, max(issue_number, 2) + 1):
+            sections = [
+                {
+                    "title": "Table of Contents",
+                    "handle": "toc/{}".format(number),
+                    "kind": "toc",
+                    "highlight": False,
+                }
+            ]
+            if number == issue_number:
+                sections.append(
+                    {
+                        "title": "Article at {}".format(cite),
+                        "handle": cite,
+                        "kind": kind,
+                        "highlight": True,
+                    }
+                )
+            issues.append({"number": number, "sections": sections})
+        return self.render("hein_contents.html.j2", cite=cite, issues=issues)
+
+    # ------------------------------------------------------------------
+    # Westlaw
+    # ------------------------------------------------------------------
+    def westlaw(self, path, query):
+        cite = query.get("cite", [""])[0]
+        if path in ("Search/Home.html", "Browse/Home/Cases"):
+            return 200, "text/html", self.westlaw_search("Cases", "cases")
+        if path == "Browse/Home/StatutesCourtRules":
+            return 200, "text/html", self.westlaw_search("Statutes", "statutes")
+        if path == "Document":
+            return self.westlaw_document(cite, query.get("type", ["cases"])[0])
+        if path == "OriginalImage":
+            return 200, "application/pdf", self.pdf("case")
+        if path == "Delivery":
+            return 200, "application/pdf", self.pdf("statute")
+        return 404, "text/html", "Not Found"
+
+    def westlaw_search(self, heading, kind):
+        return self.render(
+            "westlaw_search.html.j2",
+            heading=heading,
+            action="/westlaw/Document",
+            kind=kind,
+        )
+
+    def westlaw_document(self, cite, kind):
+        """The document a Westlaw search finds.
+
+        Cites with "notfound" in them aren't found. Cases have an
+        Original Image unless they're Westlaw Reporter cites ("WL"),
+        and statutes have to go through the delivery flow.
+        """
+        if "notfound" in cite.lower():
+            return (
+                200,
+                "text/html",
+                self.render("westlaw_not_found.html.j2", cite=cite),
+            )
+        original_image = kind == "cases" and " WL " not in cite
+        return (
+            200,
+            "text/html",
+            self.render(
+                "westlaw_document.html.j2", cite=cite, original_image=original_image
+            ),
+        )
+
+    # ------------------------------------------------------------------
+    # SSRN and websites
+    # ------------------------------------------------------------------
+    def ssrn(self, path, query):
+        if path == "Library/myLibrary.cfm":
+            return 200, "text/html", self.render("ssrn_library.html.j2")
+        if path == "sol3/papers.cfm":
+            abstract_id = query.get("abstract_id", [""])[0]
+            return (
+                200,
+                "text/html",
+                self.render("ssrn_paper.html.j2", abstract_id=abstract_id),
+            )
+        if path == "sol3/Delivery.cfm":
+            return 200, "application/pdf", self.pdf("paper")
+        return 404, "text/html", "Not Found"
+
+    def web(self, path, query):
+        if path == "page":
+            page_id = query.get("id", [""])[0]
+            context = {}
+            if query.get("paragraphs", [""])[0].isdigit():
+                count = int(query["paragraphs"][0])
+                context["paragraphs"] = [LOREM * (1 + i % 4) for i in range(count)]
+            return (
+                200,
+                "text/html",
+                self.render("website.html.j2", page_id=page_id, **context),
+            )
+        return 404, "text/html", "Not Found"
+
+    def respond(self, url):
+        """Routes a request to the site it's for.
+
+        :param url: The path and query of the request
+        :type url: str
+        :returns: The status, content type, and body of the response
+        :rtype: {(int, str, str|bytes)}
+        """
+        with self._lock:
+            self.requests += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        site, _, path = parsed.path.lstrip("/").partition("/")
+        if site == "hein" and path.startswith("HOL/"):
+            return self.hein(path[len("HOL/") :], query)
+        if site == "westlaw":
+            return self.westlaw(path, query)
+        if site == "ssrn":
+            return self.ssrn(path, query)
+        if site == "web":
+            return self.web(path, query)
+        return 404, "text/html", "Not Found"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    status, content_type, body = server.respond(self.path)
+                except Exception as e:
+                    print(str(e))
+                    status, content_type, body = 500, "text/html", str(e)
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                    content_type += "; charset=utf-8"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if content_type == "application/pdf":
+                    filename = quote(urlparse(self.path).path.rsplit("/", 1)[-1])
+                    self.send_header(
+                        "Content-Disposition",
+                        'attachment; filename="{}.pdf"'.format(filename),
+                    )
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,169 @@
+"""Benchmarks loading a project's sources to show them: loading the
+project for editing and building each source from its row (what the
+sources page used to do), against streaming the rows in one read-only
+pass (Project.read_sources). Reports the time and peak memory of each
+on a made up project.
+
+Run it with `python -m coyote_badger.benchmark.sources` (see --help).
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import NamedTemporaryFile
+
+from openpyxl import load_workbook
+
+from coyote_badger.benchmark.merge import peak_rss
+from coyote_badger.config import (
+    CONVERTER_FOLDER_PREFIX,
+    PROJECTS_FOLDER,
+    SOURCES_TEMPLATE_FILE,
+)
+from coyote_badger.project import Project
+from coyote_badger.source import Kind, Result, Source
+
+METHODS = ["editable", "read-only"]
+
+
+def sample_sources(count, seed=0):
+    """Makes up sources of every kind.
+
+    :param count: The number of sources
+    :type count: int
+    :param seed: Makes different sources, defaults to 0
+    :type seed: int, optional
+    :returns: The sources
+    :rtype: {[Source]}
+    """
+    rng = random.Random(seed)
+    sources = []
+    for i in range(count):
+        kind = rng.choice(list(Kind))
+        sources.append(
+            Source(
+                fn_num=i + 1,
+                long_cite="Author {}, A Title About Things, {} L. Rev. {} ({})".format(
+                    i,
+                    rng.randint(1, 150),
+                    rng.randint(1, 2000),
+                    rng.randint(1950, 2021),
+                ),
+                short_cite="{} L. Rev. {}".format(
+                    rng.randint(1, 150), rng.randint(1, 2000)
+                ),
+                filename="Source {}".format(i + 1),
+                kind=kind,
+                result=rng.choice(list(Result)),
+            )
+        )
+    return sources
+
+
+def load(method, name):
+    """Loads the sources of a project one way (in a fresh process, so
+    its peak memory is its own).
+
+    :param method: How to load them (see METHODS)
+    :type method: str
+    :param name: The name of the project
+    :type name: str
+    :returns: The seconds it took, the peak memory in bytes, and the
+        sources as json
+    :rtype: {(float, int, [dict])}
+    """
+    started_at = time.time()
+    if method == "editable":
+        Project.get_projects()
+        sources = Project(name).get_sources()
+    else:
+        sources = Project.read_sources(name)
+    elapsed = time.time() - started_at
+    return elapsed, peak_rss(), [source.to_json() for source in sources]
+
+
+def run(args):
+    # Named like a converter project, so the app doesn't list it
+    with NamedTemporaryFile(
+        dir=PROJECTS_FOLDER, prefix=CONVERTER_FOLDER_PREFIX
+    ) as temp_file:
+        name = temp_file.name
+    project = Project(name, load_workbook(SOURCES_TEMPLATE_FILE))
+    report = []
+    try:
+        project.save_sources(sample_sources(args.rows))
+        project.flush()
+        # Leave some updates in the journal, like a batch that's pulling
+        if args.updates:
+            project.save_results(
+                {i: Result.IN_PROGRESS for i in range(1, args.updates + 1)}
+            )
+        context = multiprocessing.get_context("spawn")
+        loaded = {}
+        for method in METHODS:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    runs.append(executor.submit(load, method, name).result())
+            loaded[method] = runs[-1][2]
+            report.append(
+                {
+                    "method": method,
+                    "rows": len(runs[-1][2]),
+                    "seconds": min(seconds for seconds, _, _ in runs),
+                    "peak_memory": max(memory for _, memory, _ in runs),
+                }
+            )
+        if loaded["editable"] != loaded["read-only"]:
+            print("The sources loaded each way don't match")
+    finally:
+        project.delete()
+    return report
+
+
+def print_report(report):
+    print(
+        "{:<12} {:>6} {:>9} {:>12}".format("Method", "Rows", "Seconds", "Peak memory")
+    )
+    for row in report:
+        print(
+            "{:<12} {:>6} {:>8.3f}s {:>8.0f} MiB".format(
+                row["method"], row["rows"], row["seconds"], row["peak_memory"] / 2**20
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m coyote_badger.benchmark.sources",
+        description=(
+            "Benchmarks loading a project for editing against streaming its "
+            "sources read-only."
+        ),
+    )
+    parser.add_argument(
+        "--rows", type=int, default=2000, help="the sources in the project"
+    )
+    parser.add_argument(
+        "--updates",
+        type=int,
+        default=100,
+        help="the updates left in the project's journal",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="how many times to load each way"
+    )
+    parser.add_argument("--json", help="also save the report as json to this path")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
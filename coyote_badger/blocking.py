@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from coyote_badger.config import RESOURCE_BLOCKING
+
+
+class ResourceReport(object):
+    def __init__(self):
+        """Keeps track of what the pages of a pull loaded and blocked.
+
+        Bytes are counted from each response's Content-Length, so
+        responses without one (e.g., chunked responses) are counted as
+        requests but not as bytes. Blocked requests are aborted before
+        anything is sent, so they're only counted by resource type.
+        """
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = defaultdict(int)
+
+    def on_response(self, response):
+        self.requests += 1
+        try:
+            self.bytes += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def on_blocked(self, request):
+        self.blocked[request.resource_type] += 1
+
+    def to_json(self):
+        """Creates the json representation of the report.
+
+        :returns: The loaded requests and bytes, and the blocked
+            requests of each resource type
+        :rtype: {dict}
+        """
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "blocked": dict(self.blocked),
+            "blocked_requests": sum(self.blocked.values()),
+        }
+
+
+class ResourceBlocker(object):
+    def __init__(self, rules=RESOURCE_BLOCKING):
+        """Decides which requests a provider's pages don't need.
+
+        Scraping only needs a page's DOM, so images, fonts, analytics,
+        and ads can be aborted before they're loaded. Each provider has
+        the resource types to block, a deny list of URLs that are always
+        blocked (e.g., trackers), and an allow list of URLs that are
+        never blocked. URLs match if they contain an entry.
+        :param rules: The rules for each provider, defaults to
+            RESOURCE_BLOCKING
+        :type rules: dict(str -> dict)
+        """
+        self.rules = rules
+
+    def should_block(self, provider, url, resource_type):
+        """Whether or not a request should be blocked.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param url: The URL of the request
+        :type url: str
+        :param resource_type: The Playwright resource type (e.g., "image")
+        :type resource_type: str
+        :returns: Whether or not to block the request
+        :rtype: {bool}
+        """
+        rules = self.rules.get(provider)
+        if not rules:
+            return False
+        if any(entry in url for entry in rules.get("allow", [])):
+            return False
+        if any(entry in url for entry in rules.get("deny", [])):
+            return True
+        return resource_type in rules.get("types", [])
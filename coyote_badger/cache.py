@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from coyote_badger.config import (
+    CACHE_EVICT_INTERVAL,
+    CACHE_FOLDER,
+    CACHE_MAX_AGE,
+    CACHE_MAX_SIZE,
+)
+from coyote_badger.source import Kind
+
+# The kinds of sources that are the same no matter which project cites
+# them (websites can change, and books are never pulled)
+CACHEABLE_KINDS = set(
+    [
+        Kind.SSRN,
+        Kind.JOURNAL,
+        Kind.STATE,
+        Kind.FEDERAL,
+        Kind.SCOTUS,
+        Kind.NON_SCOTUS,
+    ]
+)
+
+
+def normalize_cite(cite):
+    """Normalizes a short cite so that the same source cited slightly
+    differently (e.g., "410 U.S. 113" and "410 US 113") has the same
+    cache key.
+
+    :param cite: The short cite
+    :type cite: str
+    :returns: The normalized short cite
+    :rtype: {str}
+    """
+    return re.sub(r"[\s.,§]+", "", (cite or "").lower())
+
+
+class FileCache(object):
+    def __init__(
+        self,
+        namespace,
+        folder=CACHE_FOLDER,
+        max_age=CACHE_MAX_AGE,
+        max_size=CACHE_MAX_SIZE,
+        evict_interval=CACHE_EVICT_INTERVAL,
+    ):
+        """Creates a cache of PDFs that's shared by every project.
+
+        Each PDF is stored once under its key, next to a json file with
+        its metadata. A hit is copied to where it's needed instead of
+        being downloaded again (not linked, since the copy is often
+        written over in place, e.g. by a later pull of the same row).
+        Entries older than max_age are evicted, and the least recently
+        used entries are evicted when the cache grows past max_size.
+        :param namespace: The subfolder for this kind of file
+        :type namespace: str
+        :param folder: The folder to store the cache in, defaults to
+            CACHE_FOLDER
+        :type folder: str, optional
+        :param max_age: The most seconds an entry is kept, defaults to
+            CACHE_MAX_AGE
+        :type max_age: int, optional
+        :param max_size: The most bytes the cache can hold, defaults to
+            CACHE_MAX_SIZE
+        :type max_size: int, optional
+        :param evict_interval: The most seconds between evictions while
+            files are being stored, defaults to CACHE_EVICT_INTERVAL
+        :type evict_interval: int, optional
+        """
+        self.folder = os.path.join(folder, namespace)
+        self.max_age = max_age
+        self.max_size = max_size
+        self.evict_interval = evict_interval
+        self._lock = threading.Lock()
+        # The size of the cache as of the last eviction, plus what's been
+        # stored since (None until it's been scanned), and when that was
+        self._size = None
+        self._evicted_at = 0
+
+    def _paths(self, key):
+        return (
+            os.path.join(self.folder, "{}.pdf".format(key)),
+            os.path.join(self.folder, "{}.json".format(key)),
+        )
+
+    def _expired(self, meta_path):
+        try:
+            with open(meta_path) as f:
+                cached_at = json.load(f)["cached_at"]
+        except (OSError, ValueError, KeyError):
+            return True
+        return time.time() - cached_at > self.max_age
+
+    def copy(self, key, path):
+        """Puts a copy of a cached file at a path.
+
+        :param key: The cache key
+        :type key: str
+        :param path: Where to put the file
+        :type path: str
+        :returns: Whether or not the file was in the cache
+        :rtype: {bool}
+        """
+        pdf_path, meta_path = self._paths(key)
+        if not os.path.isfile(pdf_path) or self._expired(meta_path):
+            return False
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        try:
+            shutil.copyfile(pdf_path, temp_path)
+            os.replace(temp_path, path)
+            # Keep track of when the entry was last used, for eviction
+            os.utime(meta_path)
+        except OSError as e:
+            print(str(e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def store(self, key, path, **metadata):
+        """Adds a file to the cache.
+
+        :param key: The cache key
+        :type key: str
+        :param path: The file to add
+        :type path: str
+        :param metadata: Anything else to remember about the file
+        """
+        pdf_path, meta_path = self._paths(key)
+        os.makedirs(self.folder, exist_ok=True)
+        suffix = ".{}.tmp".format(threading.get_ident())
+        try:
+            size = os.path.getsize(path)
+            shutil.copyfile(path, pdf_path + suffix)
+            os.replace(pdf_path + suffix, pdf_path)
+            # The metadata is written last, so an entry is only ever
+            # used once its PDF is all there
+            with open(meta_path + suffix, "w") as f:
+                json.dump(dict(metadata, cached_at=time.time()), f)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            print(str(e))
+            return
+        # Only scan the folder every so often, or once it might be too big
+        with self._lock:
+            due = (
+                self._size is None
+                or self._size + size > self.max_size
+                or time.time() - self._evicted_at > self.evict_interval
+            )
+            if not due:
+                self._size += size
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Removes expired entries, then the least recently used entries
+        until the cache fits in max_size.
+        """
+        with self._lock:
+            try:
+                names = os.listdir(self.folder)
+            except OSError:
+                return
+            entries = []
+            total_size = 0
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                key = name[: -len(".json")]
+                pdf_path, meta_path = self._paths(key)
+                try:
+                    size = os.path.getsize(pdf_path)
+                    last_used = os.path.getmtime(meta_path)
+                except OSError:
+                    size, last_used = 0, 0
+                if self._expired(meta_path) or not size:
+                    self._remove(key)
+                    continue
+                entries.append((last_used, size, key))
+                total_size += size
+            for _, size, key in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                self._remove(key)
+                total_size -= size
+            self._size = total_size
+            self._evicted_at = time.time()
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SourceCache(FileCache):
+    def __init__(self, **kwargs):
+        """Creates a cache of pulled sources that's shared by every project.
+
+        Sources are keyed by a hash of their kind and normalized short
+        cite, and a hit is put in the project's pull folder.
+        """
+        super().__init__("sources", **kwargs)
+
+    @staticmethod
+    def key(source):
+        """The cache key of a source, or None if it can't be cached.
+
+        :param source: The source
+        :type source: Source
+        :returns: The cache key
+        :rtype: {str}
+        """
+        cite = normalize_cite(source.short_cite)
+        if source.kind not in CACHEABLE_KINDS or not cite:
+            return None
+        return hashlib.sha256(
+            "{}|{}".format(source.kind.value, cite).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, source, project):
+        """Puts a cached source in a project's pull folder.
+
+        :param source: The source to get
+        :type source: Source
+        :param project: The project to put it in
+        :type project: Project
+        :returns: Whether or not the source was in the cache
+        :rtype: {bool}
+        """
+        key = self.key(source)
+        if not key:
+            return False
+        return self.copy(key, project.save_pull_path(source.filename, "pdf"))
+
+    def put(self, source, project):
+        """Adds a source that was just pulled to the cache.
+
+        :param source: The source that was pulled
+        :type source: Source
+        :param project: The project it was pulled for
+        :type project: Project
+        """
+        key = self.key(source)
+        path = project.save_pull_path(source.filename, "pdf")
+        if not key or not os.path.isfile(path):
+            return
+        self.store(
+            key,
+            path,
+            kind=source.kind.value,
+            short_cite=source.short_cite,
+            size=os.path.getsize(path),
+        )
+
+
+class TocCache(FileCache):
+    def __init__(self, **kwargs):
+        """Creates a cache of journal issues' Tables of Contents that's
+        shared by every project.
+
+        Every article cited from the same issue uses the same Table of
+        Contents, so it only has to be downloaded from Hein once.
+        """
+        super().__init__("tocs", **kwargs)
+
+    @staticmethod
+    def key(source, issue):
+        """The cache key of the Table of Contents of an issue of the
+        journal a source is in, or None if it can't be cached.
+
+        :param source: A journal article in the journal
+        :type source: Source
+        :param issue: The issue number
+        :type issue: str
+        :returns: The cache key
+        :rtype: {str}
+        """
+        # Journal short cites look like "119 Harv. L. Rev. 32"
+        match = re.match(r"\s*(\d+)\s+(.+?)\s+\d+", source.short_cite or "")
+        if source.kind != Kind.JOURNAL or not match:
+            return None
+        volume, journal = match.groups()
+        return hashlib.sha256(
+            "{}|{}|{}".format(normalize_cite(journal), volume, issue).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, source, issue, path):
+        """Puts a cached Table of Contents at a path.
+
+        :param source: A journal article in the journal
+        :type source: Source
+        :param issue: The issue number
+        :type issue: str
+        :param path: Where to put the Table of Contents
+        :type path: str
+        :returns: Whether or not the Table of Contents was in the cache
+        :rtype: {bool}
+        """
+        key = self.key(source, issue)
+        if not key:
+            return False
+        return self.copy(key, path)
+
+    def put(self, source, issue, path):
+        """Adds a Table of Contents that was just downloaded to the cache.
+
+        :param source: A journal article in the journal
+        :type source: Source
+        :param issue: The issue number
+        :type issue: str
+        :param path: The downloaded Table of Contents
+        :type path: str
+        """
+        key = self.key(source, issue)
+        if not key or not os.path.isfile(path):
+            return
+        self.store(key, path, short_cite=source.short_cite, issue=issue)
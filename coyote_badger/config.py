@@ -2,11 +2,124 @@ import os
 
 CONVERTER_FOLDER_PREFIX = "COYOTE_BADGER_CONVERTER-"
 PROJECTS_FOLDER = os.path.abspath(os.path.join("_projects"))
+SESSIONS_FOLDER = os.path.join(PROJECTS_FOLDER, ".sessions")
+CACHE_FOLDER = os.path.join(PROJECTS_FOLDER, ".cache")
 PACKAGE_FOLDER = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 SOURCES_TEMPLATE_FILE = os.path.join(PACKAGE_FOLDER, "static", "Sources.xlsx")
 
 PORT = 3000
 
+# The number of sources that can be pulled at the same time, and the
+# most pulls that can be running against any single provider at once
+PULL_WORKERS = 4
+PULL_LIMITS = {
+    "hein": 2,
+    "westlaw": 2,
+    "ssrn": 1,
+    "web": 2,
+}
+# How many more sources per provider the async puller can be searching for
+# while the ones before them are downloading (0 waits for each download to
+# finish before searching for the next source). Only used when PULL_ENGINE is
+# "async": with "threads" and "processes", each worker searches for its next
+# source once it's done with the last one
+PULL_LOOKAHEAD = 1
+# How long (in seconds) to trust a check that Hein, Westlaw, and SSRN are
+# logged in before checking again
+AUTH_CHECK_TTL = 5 * 60
+# How pulls are run at the same time: "threads" gives each worker its own
+# browsers (see PullerPool), "async" runs every pull on one set of browsers
+# with Playwright's asyncio API (see AsyncPullerPool), and "processes" gives
+# each worker its own process and browsers (see ProcessPullerPool)
+PULL_ENGINE = "threads"
+# The number of worker processes when PULL_ENGINE is "processes"
+PULL_PROCESSES = os.cpu_count() or 1
+# The number of processes that merge, convert, and clean up the files of pulled
+# sources, so the browsers can move on to the next source right away (0 does
+# that work in the puller instead)
+POSTPROCESS_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+# How many times a pull is tried when it fails for a reason that might go away
+# (e.g., a timeout), and how long (in seconds) to wait before the first retry
+# and at most, doubling each time
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+# The longest a single pull can take (in seconds) before it's given up on. Only
+# the async engine (PULL_ENGINE = "async") can stop a pull in the middle, so
+# with the other engines, pulls are only limited by their page timeouts
+PULL_TIMEOUT = 5 * 60
+# How long (in seconds) to wait for a Westlaw search to find its document
+# before the source is counted as not found
+WESTLAW_SEARCH_TIMEOUT = 30
+# How many times a queued row can be started (e.g., because the app was stopped
+# in the middle of pulling it) before it's given up on as a Failure, so that a
+# source that crashes the app can't keep the rest of the queue from finishing
+QUEUE_MAX_STARTS = 3
+# How fast pulls can hit each provider, as (per minute, burst) for page loads
+# ("requests") and downloads. Actions only wait once the burst is used up, and
+# a provider's rates are halved when it warns about too many downloads, then
+# doubled back up every RATE_RECOVERY seconds without another warning. These
+# are per process, so they're shared by every thread and async pull but not
+# across the workers when PULL_ENGINE is "processes"
+RATE_LIMITS = {
+    "hein": {"requests": (30, 5), "downloads": (10, 3)},
+    "westlaw": {"requests": (30, 5), "downloads": (10, 2)},
+    "ssrn": {"requests": (20, 3), "downloads": (10, 2)},
+}
+RATE_RECOVERY = 5 * 60
+# The most PDFs that are downloaded straight from Hein and SSRN (without the
+# browser) at the same time, and how long (in seconds) to wait on a download
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 60
+# How websites are saved as PDFs: "screenshot" converts a full page screenshot
+# to a PDF, and "print" has Chrome print them to paginated PDFs with selectable
+# text (taking a screenshot instead if printing fails). Chrome only prints when
+# it's headless, and it's run with headless=False for its extensions (see the
+# README), so "print" only works with a Chrome that allows printing anyway
+WEBSITE_CAPTURE = "screenshot"
+# The JPEG quality (1-95) that website screenshots are compressed with when
+# they're converted to PDFs, or None to keep them lossless (which is usually
+# smaller for pages that are mostly text, and always sharper)
+SCREENSHOT_JPEG_QUALITY = None
+# The requests that Hein, Westlaw, and SSRN pages don't need when pulling:
+# "types" are the Playwright resource types to block, "deny" are URLs that
+# are always blocked, and "allow" are URLs that are never blocked (URLs match
+# if they contain an entry). Set to {} to load everything
+TRACKERS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hotjar.com",
+    "newrelic.com",
+    "nr-data.net",
+    "quantserve.com",
+    "scorecardresearch.com",
+    "facebook.net",
+    "adobedtm.com",
+    "omtrdc.net",
+    "demdex.net",
+]
+RESOURCE_BLOCKING = {
+    "hein": {"types": ["image", "media", "font"], "allow": [], "deny": TRACKERS},
+    "westlaw": {"types": ["image", "media", "font"], "allow": [], "deny": TRACKERS},
+    "ssrn": {"types": ["image", "media", "font"], "allow": [], "deny": TRACKERS},
+}
+# How long (in seconds) updates to a project's rows are kept in its journal
+# before they're written to its Sources.xlsx, so that a batch of pulls doesn't
+# save the whole workbook after every row
+SOURCES_FLUSH_INTERVAL = 5
+# How many projects are kept loaded in memory between requests (the one used
+# the longest ago is dropped first)
+PROJECT_CACHE_SIZE = 8
+# How long (in seconds) a pulled source is kept in the cache that's shared
+# between projects, and how big (in bytes) the cache can get
+CACHE_MAX_AGE = 90 * 24 * 60 * 60
+CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+# How often (in seconds) the cache is scanned for entries to evict while
+# sources are being added to it. It's also scanned when the app starts, and
+# as soon as it might have grown past CACHE_MAX_SIZE
+CACHE_EVICT_INTERVAL = 60 * 60
+
 SEGMENT_WRITE_KEY = "JaFBSHlhMcRfjCovHfFVHIuN5TAj2WkL"
 
 REPO = "alexsands/coyote-badger"
@@ -0,0 +1,127 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+from coyote_badger.config import DOWNLOAD_TIMEOUT, DOWNLOAD_WORKERS
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Downloader(object):
+    def __init__(self, workers=DOWNLOAD_WORKERS, timeout=DOWNLOAD_TIMEOUT):
+        """Creates a downloader that fetches PDFs without a browser.
+
+        Once the URL of a PDF is known, opening it in a browser page
+        only adds time and memory. The downloader instead uses the
+        browser's cookies (so it's logged in the same way) and streams
+        the PDF to disk over a pool of kept-alive connections. It only
+        saves actual PDFs, so anything else (e.g., Hein's "too many
+        downloads" page) can be left for the browser to handle.
+        :param workers: The most downloads at the same time, defaults to
+            DOWNLOAD_WORKERS
+        :type workers: int, optional
+        :param timeout: The most seconds to wait on the server, defaults
+            to DOWNLOAD_TIMEOUT
+        :type timeout: int, optional
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="download"
+        )
+
+    @staticmethod
+    def cookie_jar(cookies):
+        """Converts Playwright cookies for use with requests.
+
+        :param cookies: The cookies from a browser context's cookies()
+        :type cookies: [dict]
+        :returns: The cookie jar
+        :rtype: {RequestsCookieJar}
+        """
+        jar = RequestsCookieJar()
+        for cookie in cookies or []:
+            jar.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False),
+            )
+        return jar
+
+    def download(self, url, path, cookies=None, headers=None):
+        """Downloads a PDF.
+
+        :param url: The URL of the PDF
+        :type url: str
+        :param path: Where to save the PDF
+        :type path: str
+        :param cookies: The cookies to send (see cookie_jar), defaults
+            to None
+        :type cookies: RequestsCookieJar, optional
+        :param headers: Any headers to send, defaults to None
+        :type headers: dict, optional
+        :returns: Whether or not a PDF was saved
+        :rtype: {bool}
+        """
+        temp_path = path + ".part"
+        try:
+            with self.session.get(
+                url,
+                cookies=cookies,
+                headers=headers,
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                response.raise_for_status()
+                if "html" in response.headers.get("Content-Type", ""):
+                    return False
+                chunks = response.iter_content(CHUNK_SIZE)
+                first_chunk = next(chunks, b"")
+                if not first_chunk.lstrip().startswith(b"%PDF"):
+                    return False
+                with open(temp_path, "wb") as f:
+                    f.write(first_chunk)
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(temp_path, path)
+        except (requests.RequestException, OSError) as e:
+            print(str(e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def download_all(self, downloads, cookies=None, headers=None, before=None):
+        """Downloads several PDFs at the same time.
+
+        :param downloads: The URL of each PDF and where to save it
+        :type downloads: [(str, str)]
+        :param cookies: The cookies to send (see cookie_jar), defaults
+            to None
+        :type cookies: RequestsCookieJar, optional
+        :param headers: Any headers to send, defaults to None
+        :type headers: dict, optional
+        :param before: Called right before each request is sent (e.g.,
+            to wait on a RateLimiter), defaults to None
+        :type before: callable, optional
+        :returns: Whether or not each PDF was saved, in order
+        :rtype: {[bool]}
+        """
+
+        def download(url, path):
+            if before:
+                before()
+            return self.download(url, path, cookies, headers)
+
+        futures = [
+            self._executor.submit(download, url, path) for url, path in downloads
+        ]
+        return [future.result() for future in futures]
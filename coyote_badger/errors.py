@@ -0,0 +1,10 @@
+class NotFoundError(Exception):
+    pass
+
+
+class NoAttemptError(Exception):
+    pass
+
+
+class NotAuthenticatedError(Exception):
+    pass
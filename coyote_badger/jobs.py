@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+import uuid
+from enum import Enum
+
+from coyote_badger.config import PROJECTS_FOLDER
+from coyote_badger.project import Project
+from coyote_badger.pull_queue import PullQueue
+from coyote_badger.source import Result
+
+
+class Status(Enum):
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    DONE = "Done"
+    FAILED = "Failed"
+
+
+class PullJob(object):
+    def __init__(self, project_name, indexes, job_id=None):
+        """Creates a batch of sources to be pulled in the background.
+
+        :param project_name: The name of the project to pull from
+        :type project_name: str
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :param job_id: The id of the job, defaults to a new one (jobs
+            picked up from a PullQueue keep their id)
+        :type job_id: str, optional
+        """
+        self.id = job_id or uuid.uuid4().hex
+        self.project_name = project_name
+        self.indexes = list(indexes)
+        self.status = Status.QUEUED
+        self.message = ""
+        self.results = {}
+        self.attempts = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_json(self):
+        """Creates the json response for a job's status.
+
+        :returns: A json-serializable representation of the job
+        :rtype: {dict}
+        """
+        counts = {}
+        for result in self.results.values():
+            counts[result.value] = counts.get(result.value, 0) + 1
+        return {
+            "id": self.id,
+            "project_name": self.project_name,
+            "status": self.status.value,
+            "message": self.message,
+            "total": len(self.indexes),
+            "completed": len(self.results),
+            "counts": counts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def results_to_json(self):
+        """Creates the json response for a job's per-row results.
+
+        :returns: A mapping of each row to its result, where rows that
+            haven't finished yet are left out
+        :rtype: {dict(int -> str)}
+        """
+        return {index: result.value for index, result in self.results.items()}
+
+    def attempts_to_json(self):
+        """Creates the json response for each row's pull attempts.
+
+        :returns: A mapping of each row to its attempts (see Attempt),
+            where rows that haven't finished yet are left out
+        :rtype: {dict(int -> [dict])}
+        """
+        return {
+            index: [attempt.to_json() for attempt in attempts]
+            for index, attempts in self.attempts.items()
+        }
+
+
+class JobManager(object):
+    def __init__(self, pool, on_pulled=None):
+        """Creates a manager that runs pull jobs in the background.
+
+        Each job gets its own thread that hands the job's sources to
+        the pool and saves each result as it comes back, so the batch
+        keeps going even if the browser tab that started it is closed.
+        Jobs on the same project share one loaded Project (and its
+        lock with the app, see ProjectRegistry), so the workbook is
+        only loaded once and saves don't overwrite each other. Each
+        project's queued rows are also kept on disk (see PullQueue),
+        so jobs that were cut off by the app stopping can be picked up
+        again with recover and resume.
+        :param pool: The pool used to pull the sources
+        :type pool: PullerPool
+        :param on_pulled: Called with the project and source after each
+            source is pulled and saved, defaults to None
+        :type on_pulled: function, optional
+        """
+        self.pool = pool
+        self.on_pulled = on_pulled
+        self._jobs = {}
+        self._projects = {}
+        self._project_locks = {}
+        self._project_users = {}
+        self._queues = {}
+        self._waiting = []
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        """Gets a job by its id.
+
+        :param job_id: The id of the job
+        :type job_id: str
+        :returns: The job, or None if there isn't one
+        :rtype: {PullJob}
+        """
+        return self._jobs.get(job_id)
+
+    def start(self, project_name, indexes):
+        """Queues sources to be pulled and starts pulling them.
+
+        :param project_name: The name of the project to pull from
+        :type project_name: str
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :returns: The job that was started
+        :rtype: {PullJob}
+        """
+        job = PullJob(project_name, indexes)
+        # Record the rows before anything else, so they aren't lost if
+        # the app stops before they're pulled
+        self._queue(project_name).enqueue(job.id, job.indexes)
+        self._submit(job)
+        return job
+
+    def _submit(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+        thread = threading.Thread(
+            target=self._run, args=(job,), name="job-{}".format(job.id), daemon=True
+        )
+        thread.start()
+
+    def _queue(self, project_name):
+        with self._lock:
+            if project_name not in self._queues:
+                self._queues[project_name] = PullQueue(
+                    os.path.join(PROJECTS_FOLDER, project_name)
+                )
+            return self._queues[project_name]
+
+    @property
+    def waiting(self):
+        """The jobs picked up by recover that haven't been resumed.
+
+        :returns: The waiting jobs
+        :rtype: {[PullJob]}
+        """
+        return list(self._waiting)
+
+    def recover(self):
+        """Picks up the pulls that were cut off when the app last stopped.
+
+        The rows that were queued or running in each project's
+        PullQueue are queued again as the jobs they belonged to, which
+        wait for resume (e.g., until Hein, Westlaw, and SSRN are logged
+        in). Rows that were left "In Progress" in the Sources.xlsx but
+        aren't queued anymore get the result they finished with, or
+        "Not Started" if they never did.
+        :returns: The jobs that are waiting to be resumed
+        :rtype: {[PullJob]}
+        """
+        for project_name in Project.get_projects():
+            queue = self._queue(project_name)
+            if not queue.exists:
+                continue
+            requeued = set()
+            for job_id, indexes in queue.recover().items():
+                job = PullJob(project_name, indexes, job_id)
+                job.message = "Waiting to be resumed."
+                requeued.update(indexes)
+                with self._lock:
+                    self._jobs[job.id] = job
+                    self._waiting.append(job)
+            self._reconcile(project_name, queue, requeued)
+        return self.waiting
+
+    def _reconcile(self, project_name, queue, requeued):
+        project, project_lock = self._checkout_project(project_name)
+        if not project:
+            return
+        try:
+            finished = queue.results()
+            with project_lock:
+                stale = {}
+                for index, source in enumerate(project.get_sources(), 1):
+                    if source.result == Result.IN_PROGRESS and index not in requeued:
+                        stale[index] = finished.get(index, Result.NOT_STARTED)
+                project.save_results(stale)
+        except Exception as e:
+            print(str(e))
+        finally:
+            self._checkin_project(project_name)
+
+    def resume(self):
+        """Starts the jobs that were picked up by recover."""
+        with self._lock:
+            waiting, self._waiting = self._waiting, []
+        for job in waiting:
+            job.message = ""
+            self._submit(job)
+
+    def _checkout_project(self, project_name):
+        with self._lock:
+            if project_name not in self._projects:
+                project = Project.get_project(project_name)
+                if not project:
+                    return None, None
+                self._projects[project_name] = project
+                self._project_locks[project_name] = project.lock
+                self._project_users[project_name] = 0
+            self._project_users[project_name] += 1
+            return self._projects[project_name], self._project_locks[project_name]
+
+    def _checkin_project(self, project_name):
+        with self._lock:
+            self._project_users[project_name] -= 1
+            if not self._project_users[project_name]:
+                del self._projects[project_name]
+                del self._project_locks[project_name]
+                del self._project_users[project_name]
+
+    def _run(self, job):
+        project, project_lock = self._checkout_project(job.project_name)
+        if not project:
+            job.status = Status.FAILED
+            job.message = "Project does not exist."
+            job.finished_at = time.time()
+            return
+        job.status = Status.RUNNING
+        job.started_at = time.time()
+        queue = self._queue(job.project_name)
+        indexes = []
+        try:
+            with project_lock:
+                indexes = [i for i in job.indexes if project.has_source(i)]
+                # So the rows show as being pulled if the page is reloaded
+                project.save_results({i: Result.IN_PROGRESS for i in indexes})
+            for index in set(job.indexes) - set(indexes):
+                job.results[index] = Result.FAILURE
+                queue.finish(index, Result.FAILURE)
+            # Each row is only counted as started once a worker picks it
+            # up, so recover doesn't give up on rows that never ran
+            pulled = self.pool.pull(
+                project, indexes, on_start=lambda index: queue.start([index])
+            )
+            for index, source in pulled:
+                # Only the result, so edits made to the row while it was
+                # being pulled aren't overwritten
+                with project_lock:
+                    project.save_results({index: source.result})
+                queue.finish(index, source.result)
+                job.attempts[index] = source._attempts
+                job.results[index] = source.result
+                if self.on_pulled:
+                    self.on_pulled(project, source)
+        except Exception as e:
+            print(str(e))
+            job.status = Status.FAILED
+            job.message = str(e)
+            self._fail_remaining(job, indexes, project, project_lock, queue)
+        else:
+            job.status = Status.DONE
+        finally:
+            job.finished_at = time.time()
+            self._checkin_project(job.project_name)
+
+    def _fail_remaining(self, job, indexes, project, project_lock, queue):
+        # Rows that a failed job never got to shouldn't be left "In
+        # Progress" (or be picked up again by recover)
+        remaining = [i for i in indexes if i not in job.results]
+        try:
+            for index in remaining:
+                job.results[index] = Result.FAILURE
+                queue.finish(index, Result.FAILURE)
+            with project_lock:
+                project.save_results({i: Result.FAILURE for i in remaining})
+        except Exception as e:
+            print(str(e))
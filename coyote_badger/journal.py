@@ -0,0 +1,163 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from coyote_badger.config import SOURCES_FLUSH_INTERVAL
+
+JOURNAL_FILENAME = "journal.jsonl"
+
+# One lock per journal, shared by every Project that has it open, so a flush
+# never drops a row that's being written at the same time, and how many times
+# each journal has been flushed
+_locks = defaultdict(threading.RLock)
+_generations = defaultdict(int)
+_locks_lock = threading.Lock()
+
+
+class SourceJournal(object):
+    def __init__(self, project_folder):
+        """Creates the journal of a project's row updates.
+
+        Each update to a row of the Sources.xlsx is appended here as a
+        line of json instead of saving the whole workbook, and the
+        journal is replayed on top of the workbook whenever the
+        project is loaded, until the Flusher writes it to the
+        workbook and clears it.
+        :param project_folder: The folder of the project
+        :type project_folder: str
+        """
+        self.path = os.path.join(project_folder, JOURNAL_FILENAME)
+        with _locks_lock:
+            self.lock = _locks[self.path]
+
+    def append(self, entries):
+        """Adds row updates to the end of the journal.
+
+        :param entries: The updates, each with the "row" it's for
+            (1-indexed) and either the "source" or just the "result"
+        :type entries: [dict]
+        """
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(lines)
+
+    def read(self):
+        """Gets every row update that hasn't been flushed yet.
+
+        A line that was cut off (e.g., by the app stopping in the middle
+        of writing it) is skipped.
+        :returns: The updates, in the order they were made
+        :rtype: {[dict]}
+        """
+        if not os.path.isfile(self.path):
+            return []
+        entries = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    @property
+    def generation(self):
+        """How many times the journal has been flushed, so a Project can
+        tell if the workbook it loaded has been saved since.
+
+        :rtype: {int}
+        """
+        return _generations[self.path]
+
+    def clear(self):
+        with self.lock:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            _generations[self.path] += 1
+
+
+class Flusher(object):
+    def __init__(self, interval=SOURCES_FLUSH_INTERVAL):
+        """Writes journals to their workbooks in the background.
+
+        A project is flushed interval seconds after its first update
+        since the last flush, so a batch of pulls saves its workbook
+        every few seconds rather than after every row.
+        :param interval: The seconds to wait before flushing, defaults
+            to SOURCES_FLUSH_INTERVAL
+        :type interval: float, optional
+        """
+        self.interval = interval
+        self._due = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, key, flush):
+        """Flushes a project once the interval is up, unless it's
+        already waiting to be.
+
+        :param key: What the project is known by (e.g., its folder)
+        :type key: str
+        :param flush: Writes the project's journal to its workbook
+        :type flush: function
+        """
+        with self._condition:
+            if key in self._due:
+                return
+            self._due[key] = (time.monotonic() + self.interval, flush)
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="sources-flusher", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, key):
+        """Stops waiting to flush a project (e.g., because it was just
+        flushed on demand).
+
+        :param key: What the project is known by
+        :type key: str
+        """
+        with self._condition:
+            self._due.pop(key, None)
+
+    def flush_all(self):
+        """Flushes every project that's waiting to be, right away."""
+        with self._condition:
+            due, self._due = self._due, {}
+        for _, flush in due.values():
+            self._flush(flush)
+
+    def _flush(self, flush):
+        try:
+            flush()
+        except Exception as e:
+            print(str(e))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due:
+                    self._condition.wait()
+                key = min(self._due, key=lambda key: self._due[key][0])
+                due_at, flush = self._due[key]
+                delay = due_at - time.monotonic()
+                if delay > 0:
+                    # Check again when it's due, or when something is
+                    # scheduled or flushed in the meantime
+                    self._condition.wait(delay)
+                    continue
+                del self._due[key]
+            self._flush(flush)
+
+
+flusher = Flusher()
+# So updates that are still waiting aren't lost when the app stops
+atexit.register(flusher.flush_all)
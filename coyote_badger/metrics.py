@@ -0,0 +1,240 @@
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from coyote_badger.errors import NoAttemptError, NotFoundError
+
+METRICS_FILENAME = "metrics.jsonl"
+
+_write_lock = threading.Lock()
+
+
+class Span(object):
+    def __init__(self, stage, kind, provider):
+        """Times one stage of a pull (e.g., "search" or "download").
+
+        :param stage: The name of the stage
+        :type stage: str
+        :param kind: The kind of the source being pulled
+        :type kind: str
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        self.stage = stage
+        self.kind = kind
+        self.provider = provider
+        self.outcome = "ok"
+        self.bytes = 0
+        # What the pages loaded and blocked, for spans of a whole
+        # attempt (see ResourceReport.to_json)
+        self.resources = None
+        self.started_at = time.time()
+        self.duration = None
+
+    def to_json(self):
+        """Creates the json representation of the span.
+
+        :returns: A json-serializable representation of the span
+        :rtype: {dict}
+        """
+        return {
+            "stage": self.stage,
+            "kind": self.kind,
+            "provider": self.provider,
+            "outcome": self.outcome,
+            "bytes": self.bytes,
+            "resources": self.resources,
+            "started_at": self.started_at,
+            "duration": self.duration,
+        }
+
+
+class PullMetrics(object):
+    def __init__(self, source=None):
+        """Collects the timing spans of one pull.
+
+        :param source: The source being pulled, defaults to None (for
+            spans outside of a pull, which are never saved)
+        :type source: Source, optional
+        """
+        self.kind = source.kind.value if source else None
+        self.short_cite = source.short_cite if source else None
+        self.provider = None
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage, provider=None):
+        """Times a stage of the pull.
+
+        The span's outcome is "ok" unless the stage raises, and its
+        bytes can be set while it's running.
+        :param stage: The name of the stage (e.g., "search")
+        :type stage: str
+        :param provider: The name of the provider, defaults to the
+            provider currently being pulled from
+        :type provider: str, optional
+        :yields: The span
+        :ytype: {Span}
+        """
+        span = Span(stage, self.kind, provider or self.provider)
+        try:
+            yield span
+        except NotFoundError:
+            span.outcome = "not_found"
+            raise
+        except NoAttemptError:
+            span.outcome = "no_attempt"
+            raise
+        except BaseException:
+            span.outcome = "error"
+            raise
+        finally:
+            span.duration = time.time() - span.started_at
+            self.spans.append(span)
+
+    def save(self, metrics_file):
+        """Adds the spans to a project's metrics log.
+
+        :param metrics_file: The path of the metrics log
+        :type metrics_file: str
+        """
+        if not self.spans or not self.kind:
+            return
+        lines = "".join(
+            json.dumps(dict(span.to_json(), short_cite=self.short_cite)) + "\n"
+            for span in self.spans
+        )
+        try:
+            with _write_lock, open(metrics_file, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            print(str(e))
+
+
+def file_size(path):
+    """The size of a file, or 0 if it doesn't exist.
+
+    :param path: The path of the file
+    :type path: str
+    :returns: The size in bytes
+    :rtype: {int}
+    """
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _total_size(paths):
+    if isinstance(paths, str):
+        return file_size(paths)
+    if isinstance(paths, (list, tuple)):
+        return sum(file_size(path) for path in paths if isinstance(path, str))
+    return 0
+
+
+def timed(stage):
+    """Decorates a puller method so that it's timed as a stage of the
+    pull. If the method returns the path (or paths) of what it saved,
+    their size is recorded too.
+
+    :param stage: The name of the stage (e.g., "search")
+    :type stage: str
+    :returns: The decorator
+    :rtype: {function}
+    """
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                with self.metrics.span(stage) as span:
+                    result = await method(self, *args, **kwargs)
+                    span.bytes = _total_size(result)
+                return result
+
+        else:
+
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with self.metrics.span(stage) as span:
+                    result = method(self, *args, **kwargs)
+                    span.bytes = _total_size(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(values, p):
+    """The nearest-rank percentile of some values.
+
+    :param values: The values, sorted
+    :type values: [float]
+    :param p: The percentile (e.g., 95)
+    :type p: int
+    :returns: The percentile
+    :rtype: {float}
+    """
+    if not values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(metrics_files):
+    """Summarizes the spans in metrics logs.
+
+    :param metrics_files: The paths of the metrics logs
+    :type metrics_files: [str]
+    :returns: For each kind, provider, and stage, how many spans there
+        were, the p50 and p95 durations (in seconds), the outcomes, the
+        total bytes, and the requests of each resource type that its
+        pages had blocked
+    :rtype: {[dict]}
+    """
+    groups = defaultdict(list)
+    for metrics_file in metrics_files:
+        try:
+            with open(metrics_file) as f:
+                for line in f:
+                    try:
+                        span = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = (span["kind"], span["provider"] or "", span["stage"])
+                    groups[key].append(span)
+        except OSError:
+            continue
+    summary = []
+    for (kind, provider, stage), spans in sorted(groups.items()):
+        durations = sorted(span["duration"] for span in spans)
+        outcomes = defaultdict(int)
+        blocked = defaultdict(int)
+        for span in spans:
+            outcomes[span["outcome"]] += 1
+            resources = span.get("resources") or {}
+            for resource_type, count in resources.get("blocked", {}).items():
+                blocked[resource_type] += count
+        summary.append(
+            {
+                "kind": kind,
+                "provider": provider,
+                "stage": stage,
+                "count": len(spans),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "outcomes": dict(outcomes),
+                "bytes": sum(span["bytes"] for span in spans),
+                "blocked": dict(blocked),
+            }
+        )
+    return summary
@@ -0,0 +1,220 @@
+import os
+
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    StreamObject,
+)
+
+
+class PdfOutput(object):
+    def __init__(self, f):
+        """Writes a PDF one object at a time.
+
+        Objects are written as soon as they're added, so only the offset
+        of each one is kept in memory. The catalog and page tree are
+        objects 1 and 2, and are written by finish once every page has
+        been added.
+        :param f: The file to write the PDF to
+        :type f: file
+        """
+        self.f = f
+        self.offsets = {}
+        self.pages = []
+        self._next = 3
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def reserve(self):
+        """Reserves the number of an object to be written later.
+
+        :returns: The object number
+        :rtype: {int}
+        """
+        number = self._next
+        self._next += 1
+        return number
+
+    def write(self, number, body, stream=None):
+        """Writes an object.
+
+        :param number: The object number
+        :type number: int
+        :param body: The object, either serialized or as a PyPDF2 object
+        :type body: bytes|PdfObject
+        :param stream: The (encoded) data of a stream, if body is the
+            serialized dictionary of one, defaults to None
+        :type stream: bytes, optional
+        """
+        self.offsets[number] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % number)
+        if isinstance(body, bytes):
+            self.f.write(body)
+        else:
+            body.writeToStream(self.f, None)
+        self.f.write(b"\n")
+        if stream is not None:
+            self.f.write(b"stream\n" + stream + b"\nendstream\n")
+        self.f.write(b"endobj\n")
+
+    def finish(self):
+        """Writes the page tree, catalog, and cross-reference table."""
+        self.write(
+            2,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>"
+            % (b" ".join(b"%d 0 R" % page for page in self.pages), len(self.pages)),
+        )
+        self.write(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.f.tell()
+        self.f.write(b"xref\n0 %d\n" % self._next)
+        for number in range(self._next):
+            if number in self.offsets:
+                self.f.write(b"%010d 00000 n \n" % self.offsets[number])
+            else:
+                self.f.write(b"0000000000 65535 f \n")
+        self.f.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self._next, xref)
+        )
+
+
+class _PageCopier(object):
+    def __init__(self, output, reader, pages):
+        """Copies pages from a PDF to a PdfOutput.
+
+        Every object a page uses (its contents, fonts, images, etc.) is
+        copied once and written right away, then forgotten by the reader,
+        so memory doesn't grow with the length of the PDF.
+        :param output: Where to copy the pages to
+        :type output: PdfOutput
+        :param reader: The PDF to copy from
+        :type reader: PdfFileReader
+        :param pages: The pages to copy (0-indexed)
+        :type pages: [int]
+        """
+        self.output = output
+        self.reader = reader
+        self.pages = pages
+        # The output object number of each input object that's been
+        # copied, by (idnum, generation)
+        self.numbers = {}
+        self._queue = []
+        # Pages that aren't copied become null wherever they're
+        # referenced (e.g., from links)
+        self.dropped = set()
+        kept = set(pages)
+        for index in range(reader.getNumPages()):
+            ref = reader.getPage(index).indirectRef
+            if index in kept:
+                self.numbers[(ref.idnum, ref.generation)] = output.reserve()
+            else:
+                self.dropped.add((ref.idnum, ref.generation))
+
+    def copy_pages(self):
+        for index in self.pages:
+            page = self.reader.getPage(index)
+            ref = page.indirectRef
+            number = self.numbers[(ref.idnum, ref.generation)]
+            # The page goes in the output's page tree instead of its own
+            copied = self._copy(
+                DictionaryObject(
+                    (key, value) for key, value in page.items() if key != "/Parent"
+                )
+            )
+            copied[NameObject("/Parent")] = IndirectObject(2, 0, None)
+            self.output.write(number, copied)
+            self.output.pages.append(number)
+            while self._queue:
+                number, ref = self._queue.pop()
+                obj = ref.getObject()
+                if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Pages":
+                    # Only the output's page tree is kept
+                    self.output.write(number, NullObject())
+                else:
+                    self.output.write(number, self._copy(obj))
+            self.reader.resolvedObjects.clear()
+
+    def _copy(self, obj):
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key in self.dropped:
+                return NullObject()
+            if key not in self.numbers:
+                self.numbers[key] = self.output.reserve()
+                self._queue.append((self.numbers[key], obj))
+            return IndirectObject(self.numbers[key], 0, None)
+        if isinstance(obj, StreamObject):
+            copied = obj.__class__()
+            copied._data = obj._data
+        elif isinstance(obj, DictionaryObject):
+            copied = DictionaryObject()
+        elif isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value) for value in obj)
+        else:
+            return obj
+        for key, value in obj.items():
+            copied[key] = self._copy(value)
+        return copied
+
+
+def assemble(parts, save_as_path):
+    """Puts together pages from several PDFs in one pass.
+
+    Each PDF is read lazily, its pages are copied straight to the output
+    as they're read, and it's closed before the next one is opened, so
+    only one page's objects are in memory at a time. The output is
+    written next to save_as_path and moved into place when it's done,
+    so save_as_path can also be one of the parts. Bookmarks and form
+    fields aren't copied.
+    :param parts: The PDFs to put together, in order, each with the
+        pages (0-indexed) to leave out of it (e.g., range(1) for a
+        cover page)
+    :type parts: [(str, container(int))]
+    :param save_as_path: The filename to save the result as
+    :type save_as_path: str
+    """
+    part_path = save_as_path + ".part"
+    try:
+        with open(part_path, "wb") as f:
+            output = PdfOutput(f)
+            for path, drop in parts:
+                with open(path, "rb") as pdf:
+                    reader = PdfFileReader(pdf, strict=False)
+                    if reader.isEncrypted:
+                        reader.decrypt("")
+                    pages = [
+                        index
+                        for index in range(reader.getNumPages())
+                        if index not in drop
+                    ]
+                    _PageCopier(output, reader, pages).copy_pages()
+            output.finish()
+        os.replace(part_path, save_as_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def merge(paths, save_as_path):
+    """Merges multiple PDFs (see assemble).
+
+    :param paths: The filepaths to merge
+    :type paths: [str]
+    :param save_as_path: The filename to save the result as
+    :type save_as_path: str
+    """
+    assemble([(path, ()) for path in paths], save_as_path)
+
+
+def remove_pages(path, pages):
+    """Removes pages from a PDF (see assemble).
+
+    :param path: The filepath of the PDF
+    :type path: str
+    :param pages: The pages to remove (0-indexed)
+    :type pages: container(int)
+    """
+    assemble([(path, pages)], path)
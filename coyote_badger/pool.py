@@ -0,0 +1,175 @@
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from queue import Empty, Queue
+
+from coyote_badger import providers
+from coyote_badger.config import PULL_WORKERS
+from coyote_badger.puller import Puller
+from coyote_badger.source import Result
+
+
+class PullerPool(object):
+    def __init__(self, workers=PULL_WORKERS, limits=None):
+        """Creates a pool of workers that pull sources at the same time.
+
+        Each worker is a thread with its own Puller (and so its own
+        Playwright, browsers, and pages), since Playwright's sync API
+        can't be shared between threads. Workers are started lazily
+        and are kept around between batches so their browsers stay
+        open. The pool also limits how many pulls can be running
+        against each provider at once (e.g., so that Hein doesn't
+        flag the session for downloading too much).
+        :param workers: The number of worker threads, defaults to
+            PULL_WORKERS
+        :type workers: int, optional
+        :param limits: The most pulls per provider at once, defaults
+            to the capacity of each provider (see providers.limits)
+        :type limits: dict(str -> int), optional
+        """
+        self.workers = workers
+        self.limits = limits or providers.limits()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="puller"
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._worker_count = 0
+        self._cookies = None
+        self._cookies_version = 0
+        self._active = defaultdict(int)
+
+    @property
+    def puller(self):
+        """The Puller that belongs to the current worker thread.
+
+        :returns: The worker's Puller
+        :rtype: {Puller}
+        """
+        if not getattr(self._local, "puller", None):
+            with self._lock:
+                self._worker_count += 1
+                worker_id = self._worker_count
+            user_data_dir = os.path.join(
+                Puller.BROWSER_USER_DATA_DIR, "worker-{}".format(worker_id)
+            )
+            self._local.puller = Puller(user_data_dir)
+            self._local.cookies_version = 0
+        # Bring the worker's session up to date with the main Puller's
+        if self._local.cookies_version != self._cookies_version:
+            self._local.puller.add_cookies(self._cookies)
+            self._local.cookies_version = self._cookies_version
+        return self._local.puller
+
+    def share_cookies(self, cookies):
+        """Shares an authenticated session with all of the workers.
+
+        Should be given the cookies of the Puller that was logged in
+        (see Puller.cookies). Each worker picks them up before its next
+        pull.
+        :param cookies: The cookies of the logged in session
+        :type cookies: [dict]
+        """
+        with self._lock:
+            self._cookies = cookies
+            self._cookies_version += 1
+
+    def _has_capacity(self, provider):
+        return self._active[provider] < self.limits.get(provider, self.workers)
+
+    def _pull(self, index, source, project, provider, done, on_start):
+        try:
+            if on_start:
+                on_start(index)
+            pulled = self.puller.start_pull(source, project)
+        except Exception as e:
+            print(str(e))
+            pulled = Future()
+            pulled.set_result(Result.FAILURE)
+        finally:
+            # The worker is free as soon as its browser is, even if the
+            # source's files are still being processed
+            with self._lock:
+                self._active[provider] -= 1
+            done.put(None)
+        pulled.add_done_callback(partial(self._finish, index, source, done))
+
+    def _finish(self, index, source, done, pulled):
+        source.result = pulled.result()
+        done.put((index, source))
+
+    def pull(self, project, indexes, on_start=None):
+        """Pulls several sources from a project at the same time.
+
+        The sources are read from the project (under its lock, since
+        the app may be saving it at the same time) before any are
+        pulled. They're handed out to the workers as soon as their
+        provider has room, starting with the providers that have the
+        most work (see providers.prioritize). Results are yielded as
+        they finish (not necessarily in order) so that the caller,
+        which owns the project, can save them with
+        Project.save_results.
+        :param project: The project that the sources belong to
+        :type project: Project
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :param on_start: Called with the row of each source just before
+            a worker starts pulling it, defaults to None
+        :type on_start: function, optional
+        :yields: The row and the pulled source, as each one finishes
+        :ytype: {(int, Source)}
+        """
+        with project.lock:
+            sources = [(index, project.get_source(index)) for index in indexes]
+        pending = deque()
+        for index, source in sources:
+            provider = Puller.get_provider(source)
+            if provider:
+                pending.append((index, source, provider))
+            else:
+                source.result = Result.NO_ATTEMPT
+                yield index, source
+
+        pending = deque(providers.prioritize(pending, lambda item: item[2]))
+        done = Queue()
+        # The sources being pulled by a worker, and the ones that haven't
+        # finished yet (including those whose files are being processed)
+        running = 0
+        unfinished = 0
+        while pending or unfinished:
+            # Start everything whose provider has room, keeping the
+            # order of anything that has to wait
+            waiting = deque()
+            with self._lock:
+                while pending:
+                    index, source, provider = pending.popleft()
+                    if running < self.workers and self._has_capacity(provider):
+                        self._active[provider] += 1
+                        running += 1
+                        unfinished += 1
+                        self._executor.submit(
+                            self._pull,
+                            index,
+                            source,
+                            project,
+                            provider,
+                            done,
+                            on_start,
+                        )
+                    else:
+                        waiting.append((index, source, provider))
+            pending = waiting
+
+            # If another batch is using up the providers this batch
+            # needs, check back in a moment instead of blocking
+            try:
+                finished = done.get(timeout=None if running else 1)
+            except Empty:
+                continue
+            if finished is None:
+                running -= 1
+                continue
+            unfinished -= 1
+            yield finished
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from coyote_badger import utils
+from coyote_badger.config import POSTPROCESS_WORKERS
+
+
+def merge_pdfs(paths, save_as_path):
+    """Merges downloaded PDFs (e.g., a journal article's Tables of
+    Contents and the article itself) and deletes them.
+
+    :param paths: The filepaths to merge
+    :type paths: [str]
+    :param save_as_path: The filename to save the result as
+    :type save_as_path: str
+    :returns: The filename of the result
+    :rtype: {str}
+    """
+    utils.merge(paths, save_as_path)
+    for path in paths:
+        os.remove(path)
+    return save_as_path
+
+
+def screenshot_to_pdf(img_path, quality=None):
+    """Converts a screenshot to a PDF next to it and deletes it.
+
+    :param img_path: The filepath of the screenshot
+    :type img_path: str
+    :param quality: The JPEG quality to compress it with, defaults to
+        None (lossless)
+    :type quality: int, optional
+    :returns: The filename of the PDF
+    :rtype: {str}
+    """
+    pdf_path = utils.img2pdf(img_path, quality=quality)
+    os.remove(img_path)
+    return pdf_path
+
+
+class PostProcessor(object):
+    def __init__(self, workers=POSTPROCESS_WORKERS):
+        """Runs the CPU work on downloaded sources (merging, converting,
+        and cleaning up) in worker processes.
+
+        This way the browser that downloaded a source can move on to
+        the next one while its files are processed, and the work isn't
+        held up by (or holding up) the pullers' threads. The processes
+        are started the first time they're needed, with "spawn" so
+        they don't inherit the pullers' threads. Spawned processes
+        import the app's module again, which only builds its pullers
+        when it's run (see app.py), so the workers start none of their
+        own.
+        :param workers: The number of worker processes, defaults to
+            POSTPROCESS_WORKERS (0 does the work right away in the
+            calling thread instead)
+        :type workers: int, optional
+        """
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if not self._executor:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Processes a downloaded source.
+
+        :param fn: The work to do, which has to be a module-level
+            function so it can be sent to a worker process
+        :type fn: function
+        :returns: The result of the work, once it's done
+        :rtype: {Future}
+        """
+        if self.workers:
+            try:
+                return self.executor.submit(fn, *args)
+            except BrokenProcessPool as e:
+                # A worker died (e.g., it ran out of memory), so start over
+                # with new ones
+                print(str(e))
+                with self._lock:
+                    self._executor = None
+                return self.executor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def gather(futures):
+    """Waits on several futures without blocking.
+
+    :param futures: The futures to wait on
+    :type futures: [Future]
+    :returns: Their results, in order, or the first of their exceptions,
+        once they're all done
+    :rtype: {Future}
+    """
+    gathered = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for future in futures:
+            if future.exception():
+                gathered.set_exception(future.exception())
+                return
+        gathered.set_result([future.result() for future in futures])
+
+    if not futures:
+        gathered.set_result([])
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
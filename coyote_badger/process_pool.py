@@ -0,0 +1,328 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from multiprocessing.connection import wait
+from queue import Empty, Queue
+
+from coyote_badger import providers
+from coyote_badger.config import PULL_PROCESSES
+from coyote_badger.metrics import METRICS_FILENAME
+from coyote_badger.postprocess import PostProcessor
+from coyote_badger.project import Project
+from coyote_badger.puller import Puller
+from coyote_badger.source import Result
+
+
+class PullFolder(object):
+    """Stands in for a Project in the worker processes.
+
+    Pulling only needs to know where to save files, and loading the
+    whole Project in every worker would load its workbook too.
+    """
+
+    def __init__(self, pull_folder):
+        self.pull_folder = pull_folder
+        self.metrics_file = os.path.join(os.path.dirname(pull_folder), METRICS_FILENAME)
+
+    save_pull_path = Project.save_pull_path
+
+
+def _work(worker_id, conn):
+    """The main loop of a worker process.
+
+    Owns its own Puller (and so its own Playwright and browsers) with
+    a user data folder for the worker, and pulls the tasks it is sent
+    one at a time until it's sent None. Each worker talks to the pool
+    over its own pipe, so a worker dying can't leave a lock held that
+    the other workers need.
+    """
+    # The worker is a process of its own, so it processes its files itself
+    Puller.postprocessor = PostProcessor(workers=0)
+    puller = Puller(
+        os.path.join(Puller.BROWSER_USER_DATA_DIR, "process-{}".format(worker_id))
+    )
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        if task[0] == "cookies":
+            puller.add_cookies(task[1])
+            continue
+        _, task_id, source, pull_folder = task
+        try:
+            result = puller.pull(source, PullFolder(pull_folder))
+        except Exception as e:
+            print(str(e))
+            result = Result.FAILURE
+        conn.send((task_id, result, source._attempts))
+
+
+class _Task(object):
+    def __init__(self, task_id, index, source, project, provider, done, on_start):
+        self.id = task_id
+        self.index = index
+        self.source = source
+        self.project = project
+        self.provider = provider
+        self.done = done
+        self.on_start = on_start
+        self.crashes = 0
+
+
+class _Worker(object):
+    def __init__(self, worker_id, process, conn):
+        self.id = worker_id
+        self.process = process
+        self.conn = conn
+        self.task = None
+        self.cookies_version = 0
+        self.crashed = False
+
+
+class ProcessPullerPool(object):
+    # How many times a source can crash its worker before it fails
+    MAX_CRASHES = 2
+
+    def __init__(self, processes=PULL_PROCESSES, limits=None):
+        """Creates a pool of worker processes that pull sources at once.
+
+        Each worker process owns its own Playwright and browsers, so
+        throughput scales with the number of cores and a browser crash
+        only takes down the one source that worker was pulling. Pending
+        sources are sharded across the workers (a worker with nothing
+        left in its shard takes from the biggest one), and each result
+        is sent back to this process so the project is only ever saved
+        from here. A worker that dies is restarted and its source is
+        tried again. Has the same interface as PullerPool.
+        :param processes: The number of worker processes, defaults to
+            PULL_PROCESSES
+        :type processes: int, optional
+        :param limits: The most pulls per provider at once, defaults
+            to the capacity of each provider (see providers.limits)
+        :type limits: dict(str -> int), optional
+        """
+        self.processes = processes
+        self.limits = limits or providers.limits()
+        # Spawn (rather than fork) so workers don't inherit the state of
+        # this process's threads and browsers
+        self._context = multiprocessing.get_context("spawn")
+        self._submissions = Queue()
+        self._workers = {}
+        self._shards = {worker_id: deque() for worker_id in range(1, processes + 1)}
+        self._tasks = {}
+        self._active = defaultdict(int)
+        self._task_ids = itertools.count(1)
+        self._cookies = None
+        self._cookies_version = 0
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._closing = False
+
+    def _start(self):
+        with self._lock:
+            if self._dispatcher:
+                return
+            for worker_id in self._shards:
+                self._start_worker(worker_id)
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name="process-pool", daemon=True
+            )
+            self._dispatcher.start()
+            atexit.register(self.close)
+
+    def close(self):
+        """Stops the workers."""
+        self._closing = True
+        if self._dispatcher:
+            self._dispatcher.join()
+        for worker in self._workers.values():
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+
+    def _start_worker(self, worker_id):
+        conn, worker_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_work,
+            args=(worker_id, worker_conn),
+            name="puller-{}".format(worker_id),
+            daemon=True,
+        )
+        process.start()
+        worker_conn.close()
+        self._workers[worker_id] = _Worker(worker_id, process, conn)
+
+    def share_cookies(self, cookies):
+        """Shares an authenticated session with all of the workers.
+
+        Each worker picks them up before its next pull.
+        :param cookies: The cookies of the logged in session
+        :type cookies: [dict]
+        """
+        with self._lock:
+            self._cookies = cookies
+            self._cookies_version += 1
+
+    def _has_capacity(self, provider):
+        return self._active[provider] < self.limits.get(provider, self.processes)
+
+    def _next_task(self, worker_id):
+        # Take from the worker's own shard first, then from the biggest
+        # shard, skipping sources whose provider is already at its limit
+        shards = [self._shards[worker_id]] + sorted(
+            self._shards.values(), key=len, reverse=True
+        )
+        for shard in shards:
+            for task in shard:
+                if self._has_capacity(task.provider):
+                    shard.remove(task)
+                    return task
+        return None
+
+    def _finish(self, task, result):
+        task.source.result = result
+        self._active[task.provider] -= 1
+        del self._tasks[task.id]
+        task.done.put((task.index, task.source))
+
+    def _dispatch(self):
+        shard_ids = itertools.cycle(self._shards)
+        while not self._closing:
+            try:
+                self._dispatch_once(shard_ids)
+            except Exception as e:
+                # The dispatcher can't stop, or pull would wait forever on
+                # sources it was never going to hand out
+                print(str(e))
+                time.sleep(0.5)
+
+    def _dispatch_once(self, shard_ids):
+        # Shard any newly submitted sources across the workers
+        while True:
+            try:
+                task = self._submissions.get_nowait()
+            except Empty:
+                break
+            self._tasks[task.id] = task
+            self._shards[next(shard_ids)].append(task)
+
+        # Give each idle worker its next source
+        for worker in self._workers.values():
+            if worker.task:
+                continue
+            task = self._next_task(worker.id)
+            if not task:
+                continue
+            worker.task = task
+            self._active[task.provider] += 1
+            if task.on_start:
+                try:
+                    task.on_start(task.index)
+                except Exception as e:
+                    print(str(e))
+            try:
+                if worker.cookies_version != self._cookies_version:
+                    worker.conn.send(("cookies", self._cookies))
+                    worker.cookies_version = self._cookies_version
+                worker.conn.send(
+                    ("pull", task.id, task.source, task.project.pull_folder)
+                )
+            except OSError:
+                worker.crashed = True
+            except Exception as e:
+                # E.g., the source couldn't be pickled, which would happen
+                # again on any worker
+                print(str(e))
+                worker.task = None
+                self._finish(task, Result.FAILURE)
+
+        # Collect results as they come back
+        workers = {worker.conn: worker for worker in self._workers.values()}
+        for conn in wait(list(workers), timeout=0.5):
+            worker = workers[conn]
+            try:
+                task_id, result, attempts = conn.recv()
+            except (EOFError, OSError):
+                worker.crashed = True
+                continue
+            except Exception as e:
+                # The result couldn't be read, so the source it was for
+                # is lost
+                print(str(e))
+                if worker.task:
+                    task, worker.task = worker.task, None
+                    self._finish(task, Result.FAILURE)
+                continue
+            if worker.task and worker.task.id == task_id:
+                worker.task = None
+            if task_id in self._tasks:
+                self._tasks[task_id].source._attempts = attempts
+                self._finish(self._tasks[task_id], result)
+
+        # Restart any workers that crashed, and try their source again
+        for worker in list(self._workers.values()):
+            if self._closing:
+                break
+            if not worker.crashed and worker.process.is_alive():
+                continue
+            print("Restarting crashed puller worker {}".format(worker.id))
+            worker.conn.close()
+            worker.process.join(timeout=1)
+            self._start_worker(worker.id)
+            task = worker.task
+            if not task:
+                continue
+            task.crashes += 1
+            if task.crashes >= self.MAX_CRASHES:
+                self._finish(task, Result.FAILURE)
+            else:
+                self._active[task.provider] -= 1
+                self._shards[worker.id].appendleft(task)
+
+    def pull(self, project, indexes, on_start=None):
+        """Pulls several sources from a project at the same time.
+
+        See PullerPool.pull.
+        :param project: The project that the sources belong to
+        :type project: Project
+        :param indexes: The rows of the sources to pull (1-indexed)
+        :type indexes: [int]
+        :param on_start: Called with the row of each source just before
+            it's sent to a worker, defaults to None
+        :type on_start: function, optional
+        :yields: The row and the pulled source, as each one finishes
+        :ytype: {(int, Source)}
+        """
+        self._start()
+        done = Queue()
+        # Read the sources under the project's lock, since the app may be
+        # saving it at the same time (see PullerPool.pull)
+        with project.lock:
+            sources = [(index, project.get_source(index)) for index in indexes]
+        tasks = []
+        for index, source in sources:
+            provider = Puller.get_provider(source)
+            if not provider:
+                source.result = Result.NO_ATTEMPT
+                yield index, source
+                continue
+            tasks.append(
+                _Task(
+                    next(self._task_ids),
+                    index,
+                    source,
+                    project,
+                    provider,
+                    done,
+                    on_start,
+                )
+            )
+        for task in providers.prioritize(tasks, lambda task: task.provider):
+            self._submissions.put(task)
+        for _ in range(len(tasks)):
+            yield done.get()
@@ -1,10 +1,18 @@
 import os
 import shutil
+import threading
+from collections import OrderedDict
 
 from openpyxl import load_workbook
 from openpyxl.styles import Alignment
 
-from coyote_badger.config import CONVERTER_FOLDER_PREFIX, PROJECTS_FOLDER
+from coyote_badger.config import (
+    CONVERTER_FOLDER_PREFIX,
+    PROJECT_CACHE_SIZE,
+    PROJECTS_FOLDER,
+)
+from coyote_badger.journal import SourceJournal, flusher
+from coyote_badger.metrics import METRICS_FILENAME
 from coyote_badger.source import Header, Kind, Source
 from coyote_badger.utils import clean_string
 
@@ -22,6 +30,8 @@ class Project(object):
         self.pull_folder_exists = os.path.isdir(self.pull_folder)
         self.sources_file = os.path.join(self.project_folder, "Sources.xlsx")
         self.sources_file_exists = os.path.isfile(self.sources_file)
+        self.metrics_file = os.path.join(self.project_folder, METRICS_FILENAME)
+        self.journal = SourceJournal(self.project_folder)
 
         # Create the data folders if the project doesn't exist
         if not self.pull_folder_exists:
@@ -31,15 +41,60 @@ class Project(object):
         if not self.sources_file_exists:
             xls_file.save(self.sources_file)
 
-        self.wb = load_workbook(self.sources_file)
-        self.ws = self.wb[SOURCE_SHEET]
-        self.headers = self.ws[HEADER_ROW]
         self._header_index = None
+        with self.journal.lock:
+            self._load()
 
         # If we are creating this project for the first time, clean it
         if xls_file:
             self.clean_wb()
 
+    def _load(self):
+        # The rows as of the last flush, with the updates since then
+        self.wb = load_workbook(self.sources_file)
+        self.ws = self.wb[SOURCE_SHEET]
+        self.headers = self.ws[HEADER_ROW]
+        self.apply(self.journal.read())
+        self._generation = self.journal.generation
+        self._signature = self.signature()
+
+    @property
+    def lock(self):
+        """The lock to hold while using the project from more than one
+        thread (shared by every Project with the same folder).
+
+        :rtype: {RLock}
+        """
+        return self.journal.lock
+
+    def signature(self):
+        """When the project's files were last changed, and how big they
+        are.
+
+        :returns: The modified time and size of the Sources.xlsx and the
+            journal (None for a file that doesn't exist)
+        :rtype: {tuple}
+        """
+        signature = []
+        for path in (self.sources_file, self.journal.path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    @property
+    def up_to_date(self):
+        """Whether or not the project's files are the same as when this
+        Project last loaded or saved them.
+
+        :rtype: {bool}
+        """
+        with self.lock:
+            return self._signature == self.signature()
+
     @property
     def header_index(self):
         """A property containing a mapping of our known
@@ -66,6 +121,8 @@ class Project(object):
         pdfs and it's Sources.xlsx file.
         """
         shutil.rmtree(self.project_folder, ignore_errors=True)
+        flusher.cancel(self.project_folder)
+        projects.forget(self.name)
 
     @staticmethod
     def get_projects():
@@ -76,25 +133,105 @@ class Project(object):
         """
         projects = []
         for item in os.listdir(PROJECTS_FOLDER):
-            if os.path.isdir(
-                os.path.join(PROJECTS_FOLDER, item)
-            ) and not item.startswith(CONVERTER_FOLDER_PREFIX):
+            # Skip temporary converter projects and hidden app folders
+            if (
+                os.path.isdir(os.path.join(PROJECTS_FOLDER, item))
+                and not item.startswith(CONVERTER_FOLDER_PREFIX)
+                and not item.startswith(".")
+            ):
                 projects.append(item)
         return projects
 
+    @staticmethod
+    def exists(name):
+        """Whether or not there is a project with a name.
+
+        The same as checking get_projects, without listing the rest.
+        :param name: The name of the project
+        :type name: str
+        :returns: Whether or not the project exists
+        :rtype: {bool}
+        """
+        return (
+            bool(name)
+            and os.sep not in name
+            and not name.startswith(CONVERTER_FOLDER_PREFIX)
+            and not name.startswith(".")
+            and os.path.isdir(os.path.join(PROJECTS_FOLDER, name))
+        )
+
     @staticmethod
     def get_project(name):
         """Gets a project by name.
 
-        An alternative way of getting a project by its name.
+        An alternative way of getting a project by its name. The
+        project is shared with anything else that gets it (see
+        ProjectRegistry), so hold its lock while using it.
         :param name: The name of the project to get
         :type name: str
         :returns: The project
         :rtype: {Project}
         """
-        if name in Project.get_projects():
-            return Project(name)
-        return None
+        return projects.get(name)
+
+    @staticmethod
+    def read_sources(name):
+        """Gets all the sources of a project without loading it.
+
+        Useful when the sources are only shown. Rows are streamed from
+        the Sources.xlsx in one pass without loading it for editing, and
+        the updates in the journal are applied on top (see get_sources).
+        :param name: The name of the project
+        :type name: str
+        :returns: The sources
+        :rtype: {[Source]}
+        """
+        project_folder = os.path.join(PROJECTS_FOLDER, name)
+        journal = SourceJournal(project_folder)
+        with journal.lock:
+            wb = load_workbook(
+                os.path.join(project_folder, "Sources.xlsx"), read_only=True
+            )
+            try:
+                ws = wb[SOURCE_SHEET]
+                rows = ws.iter_rows(min_row=HEADER_ROW, values_only=True)
+                headers = next(rows, ())
+                # The 0-indexed column of each of our known Headers
+                columns = {}
+                for column, value in enumerate(headers):
+                    if value in set(item.value for item in Header):
+                        columns[value] = column
+                values = [list(row) for row in rows]
+            finally:
+                wb.close()
+            entries = journal.read()
+        # A sheet without any of our Headers has no sources to read
+        if not columns:
+            return []
+        width = max(columns.values()) + 1
+        for row in values:
+            row.extend([None] * (width - len(row)))
+        for entry in entries:
+            while len(values) < entry["row"]:
+                values.append([None] * width)
+            row = values[entry["row"] - 1]
+            if "source" in entry:
+                # The same as build_row_from_source
+                for key, value in entry["source"].items():
+                    column = columns[Header[key].value]
+                    row[column] = value or row[column]
+            else:
+                row[columns[Header.result.value]] = entry["result"]
+        return [
+            Source(
+                **{
+                    header.name: row[columns[header.value]]
+                    for header in Header
+                    if header.value in columns
+                }
+            )
+            for row in values
+        ]
 
     def get_sources(self):
         """Gets all the sources in the Sources.xlsx.
@@ -121,15 +258,36 @@ class Project(object):
         source = self.build_source_from_row(row)
         return source
 
+    def count_sources(self):
+        """Counts the sources in the Sources.xlsx.
+
+        :returns: The number of source rows
+        :rtype: {int}
+        """
+        return self.ws.max_row - HEADER_ROW
+
+    def has_source(self, index):
+        """Whether or not there is a source at a row.
+
+        :param index: The row of the source (1-indexed)
+        :type index: int
+        :returns: Whether or not the source exists
+        :rtype: {bool}
+        """
+        return 1 <= index <= self.count_sources()
+
     def save_sources(self, sources):
         """Saves all the provided sources back to the Sources.xlsx file.
 
         :param sources: The sources to save
         :type sources: [Sources]
         """
-        for i, source in enumerate(sources):
-            self.save_source(i + 1, source)
-        self.wb.save(self.sources_file)
+        self.save(
+            [
+                {"row": i + 1, "source": self.journal_source(source)}
+                for i, source in enumerate(sources)
+            ]
+        )
 
     def save_source(self, index, source):
         """Saves a single source back to the Sources.xslx file.
@@ -139,9 +297,146 @@ class Project(object):
         :param source: The source to save
         :type source: Source
         """
-        row = self.ws[HEADER_ROW + index]
-        self.build_row_from_source(row, source)
-        self.wb.save(self.sources_file)
+        self.save([{"row": index, "source": self.journal_source(source)}])
+
+    def update_sources(self, changes):
+        """Saves edits to some of the sources, unless they were made
+        from an old copy of them.
+
+        Only the edited rows are read and saved, and an edit is
+        rejected if its row has changed since the version it was made
+        from (see Source.version).
+        :param changes: The edits, each with the "index" of the row
+            (1-indexed), the "version" it was made from, and any of the
+            long_cite, short_cite, filename, and kind to change
+        :type changes: [dict]
+        :returns: The new version of each row that was saved, and the
+            current source of each row that was rejected (None if it
+            doesn't exist)
+        :rtype: {(dict(int -> int), dict(int -> Source))}
+        """
+        versions = {}
+        conflicts = {}
+        editable = (Header.long_cite, Header.short_cite, Header.filename, Header.kind)
+        with self.lock:
+            for change in changes:
+                index = change.get("index")
+                if not self.has_source(index):
+                    conflicts[index] = None
+                    continue
+                source = self.get_source(index)
+                if change.get("version") != source.version:
+                    conflicts[index] = source
+                    continue
+                values = {
+                    Header.fn_num.name: source.fn_num,
+                    Header.result.name: source.result,
+                }
+                for header in editable:
+                    if header.name in change:
+                        values[header.name] = change[header.name]
+                    elif header == Header.kind:
+                        values[header.name] = source.kind
+                    else:
+                        values[header.name] = getattr(source, header.name)
+                self.save_source(index, Source(**values))
+                versions[index] = self.get_source(index).version
+        return versions, conflicts
+
+    def save_results(self, results):
+        """Saves the results of several sources back to the Sources.xlsx
+        file at once.
+
+        :param results: The result of each row to save (1-indexed)
+        :type results: dict(int -> Result)
+        """
+        self.save(
+            [
+                {"row": index, "result": result.value}
+                for index, result in results.items()
+            ]
+        )
+
+    def save(self, entries):
+        """Saves updates to rows.
+
+        They're applied to the loaded workbook and appended to the
+        project's journal right away, and written to the Sources.xlsx
+        file by the flusher a few seconds later (see
+        SOURCES_FLUSH_INTERVAL), or when flush is called.
+        :param entries: The updates (see SourceJournal.append)
+        :type entries: [dict]
+        """
+        if not entries:
+            return
+        with self.lock:
+            # Changes made by anything else since this Project loaded the
+            # files would be written over by the next flush
+            if not self.up_to_date:
+                self._load()
+            self.apply(entries)
+            self.journal.append(entries)
+            self._signature = self.signature()
+        flusher.schedule(self.project_folder, self.flush)
+
+    def apply(self, entries):
+        """Applies row updates to the loaded workbook.
+
+        :param entries: The updates (see SourceJournal.append)
+        :type entries: [dict]
+        """
+        column = self.header_index[Header.result.value]
+        for entry in entries:
+            if "source" in entry:
+                row = self.ws[HEADER_ROW + entry["row"]]
+                self.build_row_from_source(row, Source(**entry["source"]))
+            else:
+                self.ws.cell(
+                    row=HEADER_ROW + entry["row"], column=column
+                ).value = entry["result"]
+
+    def flush(self):
+        """Writes the updates in the journal to the Sources.xlsx file.
+
+        Updates from any other Project that has it open are kept too,
+        and the workbook is loaded again first if another Project has
+        saved it (or anything else has changed it) since this one
+        loaded it.
+        """
+        flusher.cancel(self.project_folder)
+        with self.journal.lock:
+            # Nothing to write, or the project was deleted
+            if not os.path.isfile(self.journal.path) or not os.path.isfile(
+                self.sources_file
+            ):
+                return
+            if self._generation != self.journal.generation or not self.up_to_date:
+                self._load()
+            else:
+                self.apply(self.journal.read())
+            part_path = self.sources_file + ".part"
+            self.wb.save(part_path)
+            os.replace(part_path, self.sources_file)
+            self.journal.clear()
+            self._signature = self.signature()
+
+    @staticmethod
+    def journal_source(source):
+        """The values of a source that are saved to its row.
+
+        :param source: The source
+        :type source: Source
+        :returns: A json-serializable representation of the source
+        :rtype: {dict}
+        """
+        return {
+            Header.fn_num.name: source.fn_num,
+            Header.long_cite.name: source.long_cite,
+            Header.short_cite.name: source.short_cite,
+            Header.filename.name: source.filename,
+            Header.kind.name: source.kind.value,
+            Header.result.name: source.result.value,
+        }
 
     def save_pull_path(self, filename, extension=None):
         """The path to save a pulled resource at for this project.
@@ -230,3 +525,58 @@ class Project(object):
         for index in reversed(delete_rows):
             self.ws.delete_rows(index)
         self.wb.save(self.sources_file)
+
+
+class ProjectRegistry(object):
+    def __init__(self, size=PROJECT_CACHE_SIZE):
+        """Keeps loaded projects in memory, so their workbooks aren't
+        loaded again for every request.
+
+        A project is loaded again if its files were changed by anything
+        other than the Project itself (see Project.up_to_date), and the
+        project used the longest ago is dropped when there are more
+        than size of them.
+        :param size: The most projects to keep, defaults to
+            PROJECT_CACHE_SIZE
+        :type size: int, optional
+        """
+        self.size = size
+        self._projects = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Gets a project by name.
+
+        :param name: The name of the project to get
+        :type name: str
+        :returns: The project, or None if it doesn't exist
+        :rtype: {Project}
+        """
+        if not Project.exists(name):
+            self.forget(name)
+            return None
+        with self._lock:
+            project = self._projects.get(name)
+            if project:
+                self._projects.move_to_end(name)
+        if project and project.up_to_date:
+            return project
+        project = Project(name)
+        with self._lock:
+            self._projects[name] = project
+            self._projects.move_to_end(name)
+            while len(self._projects) > self.size:
+                self._projects.popitem(last=False)
+        return project
+
+    def forget(self, name):
+        """Drops a project (e.g., because it was deleted).
+
+        :param name: The name of the project
+        :type name: str
+        """
+        with self._lock:
+            self._projects.pop(name, None)
+
+
+projects = ProjectRegistry()
@@ -0,0 +1,216 @@
+from collections import Counter
+
+from coyote_badger.config import PULL_LIMITS, PULL_TIMEOUT, PULL_WORKERS, RATE_LIMITS
+from coyote_badger.source import Kind
+
+
+class Provider(object):
+    def __init__(self, name, capacity=None, cost=1, timeout=PULL_TIMEOUT, rates=None):
+        """A site that sources are pulled from.
+
+        :param name: The name of the provider (e.g., "hein"), which is
+            what its limits, rates, sessions, and metrics are kept under
+        :type name: str
+        :param capacity: The most pulls that can run against it at once,
+            defaults to its PULL_LIMITS (or PULL_WORKERS)
+        :type capacity: int, optional
+        :param cost: Roughly how many seconds a pull from it takes, so
+            the pools can start on the providers with the most work
+            first, defaults to 1
+        :type cost: float, optional
+        :param timeout: The most seconds an attempt can take with the
+            AsyncPuller (see PULL_TIMEOUT), defaults to PULL_TIMEOUT
+        :type timeout: int, optional
+        :param rates: How fast it can be hit (see RATE_LIMITS), defaults
+            to its RATE_LIMITS (or no limit)
+        :type rates: dict(str -> (float, int)), optional
+        """
+        self.name = name
+        self.capacity = capacity or PULL_LIMITS.get(name, PULL_WORKERS)
+        self.cost = cost
+        self.timeout = timeout
+        self.rates = rates if rates is not None else RATE_LIMITS.get(name, {})
+
+
+class Step(object):
+    def __init__(self, provider, method, urls=(), when=None):
+        """One way of pulling a kind of source.
+
+        :param provider: The name of the provider it pulls from
+        :type provider: str
+        :param method: The name of the method on Puller (and
+            AsyncPuller) that pulls it, which raises if it couldn't, or
+            a function that's given the puller first
+        :type method: str|function
+        :param urls: The names of the puller's URLS to give the method
+            (e.g., which Westlaw search to use), defaults to ()
+        :type urls: (str), optional
+        :param when: Whether the step applies to a source, defaults to
+            None (always)
+        :type when: function, optional
+        """
+        self.provider = provider
+        self.method = method
+        self.urls = urls
+        self.when = when
+
+    def bind(self, puller):
+        """Gets what runs the step on a puller.
+
+        :param puller: The Puller or AsyncPuller to run it on
+        :type puller: Puller|AsyncPuller
+        :returns: The pull method, and the arguments after the source
+            and project to call it with
+        :rtype: {(function, list)}
+        """
+        urls = [puller.URLS[name] for name in self.urls]
+        if callable(self.method):
+            return (
+                lambda source, project, *args: self.method(
+                    puller, source, project, *args
+                ),
+                urls,
+            )
+        return getattr(puller, self.method), urls
+
+
+# The providers sources can be pulled from, by name
+PROVIDERS = {}
+# The steps that are tried in order for each kind of source, until one of
+# them succeeds (kinds without any aren't attempted)
+CHAINS = {}
+
+
+def register(provider):
+    """Adds a provider, or replaces the one with the same name.
+
+    Its rates only apply to rate limiters created after this.
+    :param provider: The provider
+    :type provider: Provider
+    """
+    PROVIDERS[provider.name] = provider
+
+
+def register_chain(kind, steps):
+    """Sets how a kind of source is pulled.
+
+    :param kind: The kind of source
+    :type kind: Kind
+    :param steps: The ways to try pulling it, in order
+    :type steps: [Step]
+    """
+    CHAINS[kind] = list(steps)
+
+
+def get(name):
+    return PROVIDERS[name]
+
+
+def chain(source):
+    """Gets the steps to try for a source.
+
+    :param source: The source to be pulled
+    :type source: Source
+    :returns: The steps that apply to it, in order
+    :rtype: {[Step]}
+    """
+    return [
+        step
+        for step in CHAINS.get(source.kind, [])
+        if not step.when or step.when(source)
+    ]
+
+
+def provider_for(source):
+    """Gets the name of the provider a source is counted against.
+
+    That's the provider of the first step of its chain, even if it may
+    fall back to another one.
+    :param source: The source to be pulled
+    :type source: Source
+    :returns: The provider name, or None if it won't be pulled
+    :rtype: {str}
+    """
+    steps = chain(source)
+    return steps[0].provider if steps else None
+
+
+def limits():
+    """The most pulls that can run against each provider at once.
+
+    :rtype: {dict(str -> int)}
+    """
+    return {name: provider.capacity for name, provider in PROVIDERS.items()}
+
+
+def rate_limits():
+    """How fast each provider can be hit (see RateLimiter).
+
+    :rtype: {dict(str -> dict(str -> (float, int)))}
+    """
+    return {
+        name: provider.rates for name, provider in PROVIDERS.items() if provider.rates
+    }
+
+
+def prioritize(items, provider_of):
+    """Orders pending pulls so that the providers with the most work
+    for their capacity get started on first.
+
+    The pools start every pull whose provider has room, so this only
+    decides which providers get the workers when there aren't enough
+    to go around, and the slowest provider isn't left to finish alone
+    at the end. Pulls from the same provider keep their order.
+    :param items: The pending pulls
+    :type items: [object]
+    :param provider_of: Gets the provider name of a pending pull
+    :type provider_of: function
+    :returns: The pending pulls, in the order to start them
+    :rtype: {[object]}
+    """
+    counts = Counter(provider_of(item) for item in items)
+
+    def backlog(name):
+        provider = PROVIDERS.get(name) or Provider(name)
+        return counts[name] * provider.cost / provider.capacity
+
+    return sorted(items, key=lambda item: -backlog(provider_of(item)))
+
+
+def in_supreme_court_reporter(source):
+    """Whether a SCOTUS case is cited to the Supreme Court Reporter
+    (e.g., "76 S. Ct. 212"), which Hein doesn't have.
+    """
+    return "s.ct" in source.short_cite.replace(" ", "").lower()
+
+
+# The providers that come with Coyote Badger. Costs are rough seconds per
+# pull: journals download an article and up to two Tables of Contents
+register(Provider("hein", cost=60))
+register(Provider("westlaw", cost=30))
+register(Provider("ssrn", cost=20))
+register(Provider("web", cost=10))
+
+register_chain(Kind.WEBSITE, [Step("web", "_pull_website")])
+register_chain(Kind.SSRN, [Step("ssrn", "_pull_ssrn")])
+register_chain(Kind.JOURNAL, [Step("hein", "_pull_journal")])
+register_chain(
+    Kind.STATE, [Step("westlaw", "_pull_westlaw", urls=("WESTLAW_STATUTES_URL",))]
+)
+register_chain(Kind.FEDERAL, [Step("hein", "_pull_federal")])
+# SCOTUS cases should get downloaded from Hein, but if they aren't found on
+# Hein (i.e. it's not yet available) then Westlaw is tried
+register_chain(
+    Kind.SCOTUS,
+    [
+        Step(
+            "hein",
+            "_pull_scotus",
+            when=lambda source: not in_supreme_court_reporter(source),
+        ),
+        Step("westlaw", "_pull_westlaw", urls=("WESTLAW_CASES_URL",)),
+    ],
+)
+register_chain(
+    Kind.NON_SCOTUS, [Step("westlaw", "_pull_westlaw", urls=("WESTLAW_CASES_URL",))]
+)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing, contextmanager
+
+from coyote_badger.config import QUEUE_MAX_STARTS
+from coyote_badger.source import Result
+
+QUEUE_FILENAME = "queue.sqlite3"
+
+# Where each queued row is at
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class PullQueue(object):
+    def __init__(self, project_folder, max_starts=QUEUE_MAX_STARTS):
+        """Creates the queue of a project's pulls, kept on disk.
+
+        Every row that's queued to be pulled is recorded as pending,
+        then running once it's handed to the pool, then finished with
+        its result, so that pulls that were cut off (e.g., by the app
+        stopping or the machine restarting) can be picked up again
+        without redoing the rows that already finished. The queue is a
+        SQLite database in the project's folder, and each change is
+        committed right away.
+        :param project_folder: The folder of the project
+        :type project_folder: str
+        :param max_starts: The most times a row is started before it's
+            given up on, defaults to QUEUE_MAX_STARTS
+        :type max_starts: int, optional
+        """
+        self.path = os.path.join(project_folder, QUEUE_FILENAME)
+        self.max_starts = max_starts
+        self._created = False
+
+    @contextmanager
+    def _connect(self):
+        # A connection per use, so the queue can be used from any thread
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            if not self._created:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS pulls (
+                        row INTEGER PRIMARY KEY,
+                        job_id TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        starts INTEGER NOT NULL DEFAULT 0,
+                        result TEXT,
+                        queued_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL
+                    )
+                    """
+                )
+                self._created = True
+            with conn:
+                yield conn
+
+    @property
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def enqueue(self, job_id, indexes):
+        """Adds rows to the queue, replacing anything it had for them.
+
+        :param job_id: The id of the job pulling the rows
+        :type job_id: str
+        :param indexes: The rows to pull (1-indexed)
+        :type indexes: [int]
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO pulls (row, job_id, status, queued_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(index, job_id, PENDING, now) for index in indexes],
+            )
+
+    def start(self, indexes):
+        """Marks rows as running.
+
+        :param indexes: The rows being pulled (1-indexed)
+        :type indexes: [int]
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                UPDATE pulls SET status = ?, starts = starts + 1, started_at = ?
+                WHERE row = ?
+                """,
+                [(RUNNING, now, index) for index in indexes],
+            )
+
+    def finish(self, index, result):
+        """Marks a row as finished.
+
+        :param index: The row that was pulled (1-indexed)
+        :type index: int
+        :param result: The result of the pull
+        :type result: Result
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE pulls SET status = ?, result = ?, finished_at = ?
+                WHERE row = ?
+                """,
+                (FINISHED, result.value, time.time(), index),
+            )
+
+    def results(self):
+        """The results of the rows that have finished.
+
+        :returns: A mapping of each finished row to its result
+        :rtype: {dict(int -> Result)}
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT row, result FROM pulls WHERE status = ?", (FINISHED,)
+            ).fetchall()
+        return {index: Result(result) for index, result in rows}
+
+    def recover(self):
+        """Re-queues the rows that were pending or running when the app
+        stopped.
+
+        A row that has already been started max_starts times is finished
+        as a Failure instead, so a source that keeps crashing the app
+        can't keep it from starting.
+        :returns: The rows to pull again, for each job they belong to
+        :rtype: {dict(str -> [int])}
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE pulls SET status = ?, result = ?, finished_at = ?
+                WHERE status = ? AND starts >= ?
+                """,
+                (FINISHED, Result.FAILURE.value, time.time(), RUNNING, self.max_starts),
+            )
+            conn.execute(
+                "UPDATE pulls SET status = ? WHERE status = ?", (PENDING, RUNNING)
+            )
+            rows = conn.execute(
+                "SELECT job_id, row FROM pulls WHERE status = ? ORDER BY row",
+                (PENDING,),
+            ).fetchall()
+        jobs = defaultdict(list)
+        for job_id, index in rows:
+            jobs[job_id].append(index)
+        return dict(jobs)
@@ -1,16 +1,72 @@
+import base64
+import json
 import os
-import re
 import shutil
-from urllib.parse import quote
+import time
+from concurrent.futures import Future
+from urllib.parse import urlparse
 from urllib.request import urlretrieve
 
 from dotenv import dotenv_values
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 
-from coyote_badger import utils
-from coyote_badger.config import PACKAGE_FOLDER
-from coyote_badger.source import Kind, Result
+from coyote_badger import providers, utils
+from coyote_badger.blocking import ResourceBlocker, ResourceReport
+from coyote_badger.cache import SourceCache, TocCache
+from coyote_badger.config import (
+    PACKAGE_FOLDER,
+    SCREENSHOT_JPEG_QUALITY,
+    WEBSITE_CAPTURE,
+    WESTLAW_SEARCH_TIMEOUT,
+)
+from coyote_badger.downloader import CHUNK_SIZE, Downloader
+from coyote_badger.errors import NoAttemptError, NotAuthenticatedError, NotFoundError
+from coyote_badger.metrics import PullMetrics, Span, file_size, timed
+from coyote_badger.postprocess import (
+    PostProcessor,
+    gather,
+    merge_pdfs,
+    screenshot_to_pdf,
+)
+from coyote_badger.ratelimit import RateLimiter
+from coyote_badger.retry import RetryPolicy
+from coyote_badger.scraping import (
+    FEDERAL_EDITIONS,
+    FEDERAL_FOUND,
+    GLOBAL_TOC_ITEM,
+    HEIN_NOT_FOUND,
+    HEIN_PRINT_LINK,
+    HEIN_RESULTS,
+    HEIN_SECTION,
+    HEIN_SECTION_PRINT_LINK,
+    HEIN_THROTTLED,
+    HEIN_VERIFY_HUMAN,
+    ISSUE_HEADER_SCRIPT,
+    ISSUE_LIST_SCRIPT,
+    NEXT_ISSUE_LIST_SCRIPT,
+    PDF_VIEWER,
+    SCOTUS_PDF_LINK,
+    SSRN_DOWNLOAD,
+    TOC_ITEM,
+    TOC_TEXT,
+    WESTLAW_DELIVERY,
+    WESTLAW_DELIVERY_DOWNLOAD,
+    WESTLAW_DOCUMENT,
+    WESTLAW_ORIGINAL_IMAGE,
+    WESTLAW_ORIGINAL_IMAGE_SCRIPT,
+    WESTLAW_SEARCH_BUTTON,
+    WESTLAW_SEARCH_INPUT,
+    hein_search_url,
+    hein_url,
+    issue_items,
+    issue_number,
+    journal_filenames,
+    ssrn_download_url,
+    westlaw_delivers,
+)
+from coyote_badger.sessions import AuthCache, SessionStore
+from coyote_badger.source import Result
 
 
 class Puller(object):
@@ -19,8 +75,6 @@ class Puller(object):
         **dotenv_values("settings.custom.urls"),
     }
     BROWSER_USER_DATA_DIR = os.path.join(PACKAGE_FOLDER, "usr")
-    CHROME_USER_DATA_DIR = os.path.join(BROWSER_USER_DATA_DIR, "chrome")
-    FIREFOX_USER_DATA_DIR = os.path.join(BROWSER_USER_DATA_DIR, "firefox")
     EXTENSIONS_FOLDER = os.path.join(PACKAGE_FOLDER, "extensions")
     EXTENSIONS = ",".join(
         [
@@ -29,11 +83,43 @@ class Puller(object):
         ]
     )
 
+    # The page to check each provider's login on, from URLS
+    AUTHED_URLS = {
+        "hein": "HEIN_AUTHED_URL",
+        "westlaw": "WESTLAW_AUTHED_URL",
+        "ssrn": "SSRN_AUTHED_URL",
+    }
+    # The elements that are all on a provider's page when it wants us
+    # to log in
+    LOGIN_WALLS = {
+        "hein": ["#username", "#password"],
+        "westlaw": ["#Username", "#Password"],
+        "ssrn": ['a:has-text("Forgot password")'],
+    }
+    # Whether or not each provider is logged in, shared by every Puller
+    auth = AuthCache()
+    # Sources that have already been pulled for any project
+    cache = SourceCache()
+    # Journal issues' Tables of Contents that have already been downloaded
+    tocs = TocCache()
+    # Decides which requests aren't needed when pulling from a provider
+    blocker = ResourceBlocker()
+    # Paces the page loads and downloads against each provider, shared by
+    # every Puller
+    limiter = RateLimiter(providers.rate_limits())
+    # Decides when a failed pull is tried again
+    retry = RetryPolicy()
+    # Merges and converts the files of pulled sources in other processes,
+    # shared by every Puller
+    postprocessor = PostProcessor()
+
     SCREEN_WIDTH = 1200
     SCREEN_HEIGHT = 860
-    SLOW_MO = 0.5 * 1000  # 0.5 sec, increase to slow down for debugging
+    # Pacing against Hein, Westlaw, and SSRN is done by the limiter, so
+    # browser actions run at full speed
+    SLOW_MO = 0  # increase (in ms) to slow down every action for debugging
 
-    def __init__(self):
+    def __init__(self, user_data_dir=None):
         """Creates a new Puller with Playwright.
 
         Puller stores the browsers that will be used to pull sources,
@@ -50,10 +136,31 @@ class Puller(object):
         (https://github.com/microsoft/playwright/issues/2644), so now
         we have to use a mix of Chrome (to load extensions for clean
         website screenshots) and Firefox (to pull Hein, Westlaw, SSRN).
+
+        Playwright's sync API can only be used from the thread that
+        started it, so every thread that pulls sources needs its own
+        Puller (see PullerPool). Each Puller needs its own user data
+        folder for its browsers, which defaults to the shared one.
+        :param user_data_dir: The folder for the browser user data,
+            defaults to None
+        :type user_data_dir: str, optional
         """
+        self.user_data_dir = user_data_dir or self.BROWSER_USER_DATA_DIR
+        self.chrome_user_data_dir = os.path.join(self.user_data_dir, "chrome")
+        self.firefox_user_data_dir = os.path.join(self.user_data_dir, "firefox")
+        self.sessions = SessionStore(self.provider_domains())
         self._playwright = None
         self._chrome = None
         self._firefox = None
+        self._user_agent = None
+        self.downloader = Downloader()
+        # What the pages of the last attempt loaded and blocked, and how
+        # long each stage of the last pull took
+        self.resources = ResourceReport()
+        self.metrics = PullMetrics()
+        # The post-processing of the last pull, as (stage, started at,
+        # future) (see defer)
+        self._processing = []
 
     @property
     def playwright(self):
@@ -61,75 +168,203 @@ class Puller(object):
             self._playwright = sync_playwright().start()
         return self._playwright
 
+    @classmethod
+    def chrome_options(cls):
+        """The options used to launch Chrome.
+
+        :returns: The keyword arguments for launch_persistent_context
+        :rtype: {dict}
+        """
+        return dict(
+            headless=False,
+            slow_mo=cls.SLOW_MO,
+            accept_downloads=True,
+            user_agent=(
+                "Mozilla/5.0 (Macintosh; Intel Mac OS X 12_2_1) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/98.0.4758.102 Safari/537.36"
+            ),
+            chromium_sandbox=False,
+            ignore_https_errors=True,
+            ignore_default_args=[
+                "--enable-automation",
+            ],
+            args=[
+                "--disable-dev-shm-usage",
+                "--no-default-browser-check",
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+                "--disable-extensions-except={}".format(cls.EXTENSIONS),
+                "--load-extension={}".format(cls.EXTENSIONS),
+            ],
+            viewport={
+                "width": cls.SCREEN_WIDTH,
+                "height": cls.SCREEN_HEIGHT,
+            },
+        )
+
+    @classmethod
+    def firefox_options(cls):
+        """The options used to launch Firefox.
+
+        :returns: The keyword arguments for launch_persistent_context
+        :rtype: {dict}
+        """
+        return dict(
+            headless=False,
+            slow_mo=cls.SLOW_MO,
+            accept_downloads=True,
+            user_agent=(
+                "Mozilla/5.0 (Macintosh; Intel Mac OS X 12.2; rv:97.0) "
+                "Gecko/20100101 Firefox/97.0"
+            ),
+            chromium_sandbox=False,
+            ignore_https_errors=True,
+            ignore_default_args=[
+                "--enable-automation",
+            ],
+            args=[
+                "--disable-dev-shm-usage",
+                "--no-default-browser-check",
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+            ],
+            viewport={
+                "width": cls.SCREEN_WIDTH,
+                "height": cls.SCREEN_HEIGHT,
+            },
+        )
+
+    @classmethod
+    def print_options(cls):
+        """The options used to print websites to PDFs (see Page.printToPDF
+        in the Chrome DevTools Protocol).
+
+        The paper is as wide as the screen (at 96 pixels per inch), so
+        pages are laid out like they are in the browser, and is in the
+        proportions of Letter paper.
+        :returns: The parameters for Page.printToPDF
+        :rtype: {dict}
+        """
+        width = cls.SCREEN_WIDTH / 96
+        return dict(
+            printBackground=True,
+            paperWidth=width,
+            paperHeight=width * 11 / 8.5,
+            marginTop=0.25,
+            marginBottom=0.25,
+            marginLeft=0.25,
+            marginRight=0.25,
+            transferMode="ReturnAsStream",
+        )
+
     @property
     def chrome(self):
         if not self._chrome:
-            if os.path.exists(self.CHROME_USER_DATA_DIR):
-                shutil.rmtree(self.CHROME_USER_DATA_DIR)
-            os.mkdir(self.CHROME_USER_DATA_DIR)
+            if os.path.exists(self.chrome_user_data_dir):
+                shutil.rmtree(self.chrome_user_data_dir)
+            os.makedirs(self.chrome_user_data_dir)
             self._chrome = self.playwright.chromium.launch_persistent_context(
-                self.CHROME_USER_DATA_DIR,
-                headless=False,
-                slow_mo=self.SLOW_MO,
-                accept_downloads=True,
-                user_agent=(
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 12_2_1) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/98.0.4758.102 Safari/537.36"
-                ),
-                chromium_sandbox=False,
-                ignore_https_errors=True,
-                ignore_default_args=[
-                    "--enable-automation",
-                ],
-                args=[
-                    "--disable-dev-shm-usage",
-                    "--no-default-browser-check",
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-extensions-except={}".format(self.EXTENSIONS),
-                    "--load-extension={}".format(self.EXTENSIONS),
-                ],
-                viewport={
-                    "width": self.SCREEN_WIDTH,
-                    "height": self.SCREEN_HEIGHT,
-                },
+                self.chrome_user_data_dir, **self.chrome_options()
             )
         return self._chrome
 
     @property
     def firefox(self):
         if not self._firefox:
-            if os.path.exists(self.FIREFOX_USER_DATA_DIR):
-                shutil.rmtree(self.FIREFOX_USER_DATA_DIR)
-            os.mkdir(self.FIREFOX_USER_DATA_DIR)
+            if os.path.exists(self.firefox_user_data_dir):
+                shutil.rmtree(self.firefox_user_data_dir)
+            os.makedirs(self.firefox_user_data_dir)
             self._firefox = self.playwright.firefox.launch_persistent_context(
-                self.FIREFOX_USER_DATA_DIR,
-                headless=False,
-                slow_mo=self.SLOW_MO,
-                accept_downloads=True,
-                user_agent=(
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 12.2; rv:97.0) "
-                    "Gecko/20100101 Firefox/97.0"
-                ),
-                chromium_sandbox=False,
-                ignore_https_errors=True,
-                ignore_default_args=[
-                    "--enable-automation",
-                ],
-                args=[
-                    "--disable-dev-shm-usage",
-                    "--no-default-browser-check",
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                ],
-                viewport={
-                    "width": self.SCREEN_WIDTH,
-                    "height": self.SCREEN_HEIGHT,
-                },
+                self.firefox_user_data_dir, **self.firefox_options()
             )
+            self.restore_sessions()
         return self._firefox
 
+    def close(self):
+        """Closes the browsers and stops Playwright."""
+        if self._chrome:
+            self._chrome.close()
+            self._chrome = None
+        if self._firefox:
+            self._firefox.close()
+            self._firefox = None
+        if self._playwright:
+            self._playwright.stop()
+            self._playwright = None
+
+    @classmethod
+    def provider_domains(cls):
+        """The domains that belong to Hein, Westlaw, and SSRN.
+
+        Based on the URLs in the settings, e.g. "heinonline.org" for
+        "https://heinonline.org/HOL/Welcome".
+        :returns: A mapping of provider name to its domains
+        :rtype: {dict(str -> [str])}
+        """
+        domains = {}
+        for provider in ("hein", "westlaw", "ssrn"):
+            prefix = "{}_".format(provider.upper())
+            for key, url in cls.URLS.items():
+                host = urlparse(url).hostname
+                if not key.startswith(prefix) or not host:
+                    continue
+                domain = ".".join(host.split(".")[-2:])
+                domains.setdefault(provider, [])
+                if domain not in domains[provider]:
+                    domains[provider].append(domain)
+        return domains
+
+    def restore_sessions(self):
+        """Adds the saved sessions of each provider to the Firefox session.
+
+        This lets a new browser (after a restart, or in a new worker)
+        pull without logging in again, as long as the sessions haven't
+        expired.
+        """
+        origins = []
+        for provider, state in self.sessions.sessions().items():
+            self._firefox.add_cookies(state["cookies"])
+            origins.extend(state["origins"])
+        if origins:
+            self._firefox.add_init_script(self.local_storage_script(origins))
+
+    @staticmethod
+    def local_storage_script(origins):
+        """Creates a script that fills in the local storage of saved
+        sessions as each origin's pages load, since persistent contexts
+        can't be given a storage_state.
+
+        :param origins: The origins of the sessions' storage_state
+        :type origins: [dict]
+        :returns: The script, for add_init_script
+        :rtype: {str}
+        """
+        script = """
+            (origins => {
+                const origin = origins.find(o => o.origin === location.origin);
+                for (const item of (origin ? origin.localStorage : [])) {
+                    if (localStorage.getItem(item.name) === null) {
+                        localStorage.setItem(item.name, item.value);
+                    }
+                }
+            })(%s)
+            """
+        return script % json.dumps(origins)
+
+    def save_session(self, provider, **metadata):
+        """Saves the logged in session of a provider.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param metadata: Anything else to remember about the session
+        """
+        self.auth.set(provider, True)
+        try:
+            self.sessions.save(provider, self.firefox.storage_state(), **metadata)
+        except Exception as e:
+            print(str(e))
+
     @classmethod
     def clear_user_data(cls):
         if os.path.exists(cls.BROWSER_USER_DATA_DIR):
@@ -140,63 +375,128 @@ class Puller(object):
     def timeout(cls, sec):
         return cls.SLOW_MO + sec * 1000
 
+    @staticmethod
+    def get_provider(source):
+        """Gets the name of the provider a source is pulled from.
+
+        Used to limit how many pulls run against a provider at once.
+        SCOTUS cases are counted against Hein even though they may
+        fall back to Westlaw, unless they can only be found on Westlaw
+        (see providers.provider_for).
+        :param source: The source to be pulled
+        :type source: Source
+        :returns: The provider name, or None if it won't be pulled
+        :rtype: {str}
+        """
+        return providers.provider_for(source)
+
+    @property
+    def cookies(self):
+        """The cookies of the Firefox session used for Hein, Westlaw,
+        and SSRN, which can be shared with other Pullers.
+
+        :returns: The cookies in the Firefox context
+        :rtype: {[dict]}
+        """
+        return self.firefox.cookies()
+
+    def add_cookies(self, cookies):
+        """Adds cookies (e.g., from another Puller) to the Firefox session.
+
+        :param cookies: The cookies to add
+        :type cookies: [dict]
+        """
+        if cookies:
+            self.firefox.add_cookies(cookies)
+
+    def _at_login_wall(self, page, provider):
+        """Whether or not a page is asking to log in to a provider.
+
+        :param page: The page to check
+        :type page: Page
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: Whether or not the page is a login page
+        :rtype: {bool}
+        """
+        return all(page.query_selector(s) for s in self.LOGIN_WALLS[provider])
+
+    def _check_login_wall(self, page, provider):
+        """Stops a pull if a provider has logged us out.
+
+        Forgets that the provider was logged in so that the next check
+        asks the user to log in again.
+        :param page: The page to check
+        :type page: Page
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        if self._at_login_wall(page, provider):
+            self.auth.set(provider, False)
+            self.sessions.invalidate(provider)
+            raise NotAuthenticatedError(
+                "Not logged in to {}.".format(provider.capitalize())
+            )
+
+    def _check_authenticated(self, providers):
+        """Checks whether or not providers are logged in, all at once.
+
+        Starts loading every provider's landing page before waiting on
+        any of them, so the pages load at the same time.
+        :param providers: The names of the providers to check
+        :type providers: [str]
+        """
+        pages = {}
+        for provider in providers:
+            page = self.firefox.new_page()
+            pages[provider] = page
+            try:
+                page.goto(self.URLS[self.AUTHED_URLS[provider]], wait_until="commit")
+            except Exception as e:
+                print(str(e))
+        for provider, page in pages.items():
+            try:
+                page.wait_for_load_state("networkidle")
+                authenticated = not self._at_login_wall(page, provider)
+                if not authenticated:
+                    self.sessions.invalidate(provider)
+            except Exception as e:
+                print(str(e))
+                authenticated = False
+            finally:
+                page.close()
+            self.auth.set(provider, authenticated)
+
+    def authenticated(self, *providers):
+        """Whether or not providers are logged in.
+
+        Uses the last check if it was recent enough (see
+        AUTH_CHECK_TTL), and checks the rest at the same time.
+        :param providers: The names of the providers to check
+        :type providers: str
+        :returns: Whether or not every provider is logged in
+        :rtype: {bool}
+        """
+        stale = [p for p in providers if self.auth.get(p) is None]
+        if stale:
+            self._check_authenticated(stale)
+        return all(self.auth.get(p) for p in providers)
+
     @property
     def hein_authenticated(self):
-        result = False
-        page = self.firefox.new_page()
-        try:
-            page.goto(self.URLS["HEIN_AUTHED_URL"], wait_until="networkidle")
-            username = page.query_selector("#username")
-            password = page.query_selector("#password")
-            if not username or not password:
-                result = True
-        except Exception as e:
-            print(str(e))
-            result = False
-        finally:
-            page.close()
-        return result
+        return self.authenticated("hein")
 
     @property
     def westlaw_authenticated(self):
-        result = False
-        page = self.firefox.new_page()
-        try:
-            page.goto(self.URLS["WESTLAW_AUTHED_URL"], wait_until="networkidle")
-            username = page.query_selector("#Username")
-            password = page.query_selector("#Password")
-            if not username or not password:
-                result = True
-        except Exception as e:
-            print(str(e))
-            result = False
-        finally:
-            page.close()
-        return result
+        return self.authenticated("westlaw")
 
     @property
     def ssrn_authenticated(self):
-        result = False
-        page = self.firefox.new_page()
-        try:
-            page.goto(self.URLS["SSRN_AUTHED_URL"], wait_until="networkidle")
-            forgot = page.query_selector('a:has-text("Forgot password")')
-            if not forgot:
-                result = True
-        except Exception as e:
-            print(str(e))
-            result = False
-        finally:
-            page.close()
-        return result
+        return self.authenticated("ssrn")
 
     @property
     def all_authenticated(self):
-        return (
-            self.hein_authenticated
-            and self.westlaw_authenticated
-            and self.ssrn_authenticated
-        )
+        return self.authenticated("hein", "westlaw", "ssrn")
 
     def login_hein(self, hein_username, hein_password):
         page = self.firefox.new_page()
@@ -217,6 +517,7 @@ class Puller(object):
             raise Exception("Failed to log in to Hein.")
         finally:
             page.close()
+        self.save_session("hein")
 
     def login_westlaw(self, westlaw_username, westlaw_password):
         page = self.firefox.new_page()
@@ -249,6 +550,7 @@ class Puller(object):
         finally:
             page.close()
         self._configure_westlaw()
+        self.save_session("westlaw", configured=True)
 
     def login_ssrn(self, ssrn_username, ssrn_password):
         page = self.firefox.new_page()
@@ -271,6 +573,7 @@ class Puller(object):
             raise Exception("Failed to log in to SSRN.")
         finally:
             page.close()
+        self.save_session("ssrn")
 
     def login(
         self,
@@ -331,6 +634,7 @@ class Puller(object):
         finally:
             page.close()
 
+    @timed("search")
     def _hein_search(self, page, search_term):
         """Searches Hein for a search_term.
 
@@ -339,15 +643,14 @@ class Puller(object):
         :param search_term: The search_term to search for
         :type search_term: str
         """
-        page.goto(self.URLS["HEIN_SEARCH_URL"].format(quote(search_term, safe="")))
-        page.wait_for_selector("#page_content")
-        if (
-            page.query_selector('#page_content:has-text("No matching results")')
-            or page.query_selector('#page_content:has-text("Citation Not Found")')
-            or page.query_selector('#page_content:has-text("could not be found.")')
-        ):
+        self.limiter.wait("hein", "requests")
+        page.goto(hein_search_url(self.URLS, search_term))
+        self._check_login_wall(page, "hein")
+        page.wait_for_selector(HEIN_RESULTS)
+        if any(page.query_selector(selector) for selector in HEIN_NOT_FOUND):
             raise NotFoundError
 
+    @timed("search")
     def _westlaw_search(self, page, url, search_term):
         """Searches Westlaw for a search_term.
 
@@ -361,19 +664,155 @@ class Puller(object):
         :param search_term: The search_term to search for
         :type search_term: str
         """
+        self.limiter.wait("westlaw", "requests")
         page.goto(url)
-        page.wait_for_selector("#searchInputId", timeout=self.timeout(20))
-        page.fill("#searchInputId", search_term)
-        page.click("#searchButton")
-        for i in range(20):
-            page.wait_for_timeout(self.timeout(1))
-            if page.query_selector("#co_docHeader #title"):
-                return
-        raise NotFoundError
+        self._check_login_wall(page, "westlaw")
+        page.wait_for_selector(WESTLAW_SEARCH_INPUT, timeout=self.timeout(20))
+        page.fill(WESTLAW_SEARCH_INPUT, search_term)
+        page.click(WESTLAW_SEARCH_BUTTON)
+        try:
+            page.wait_for_selector(
+                WESTLAW_DOCUMENT,
+                state="attached",
+                timeout=self.timeout(WESTLAW_SEARCH_TIMEOUT),
+            )
+        except PlaywrightTimeoutError:
+            raise NotFoundError
+
+    def _new_page(self, provider):
+        """Opens a Firefox page for pulling from a provider.
+
+        Requests that the provider's pages don't need are aborted (see
+        ResourceBlocker), and what the page loads and blocks is added
+        to the report for the current pull. Note that Playwright turns
+        off the HTTP cache for pages with routes.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: The new page
+        :rtype: {Page}
+        """
+        page = self.firefox.new_page()
+        report = self.resources
+        page.on("response", report.on_response)
+        if provider not in self.blocker.rules:
+            return page
+
+        def handle(route):
+            request = route.request
+            if self.blocker.should_block(provider, request.url, request.resource_type):
+                report.on_blocked(request)
+                route.abort()
+            else:
+                route.continue_()
+
+        page.route("**/*", handle)
+        return page
+
+    @property
+    def user_agent(self):
+        if not self._user_agent:
+            page = self.firefox.new_page()
+            try:
+                self._user_agent = page.evaluate("navigator.userAgent")
+            finally:
+                page.close()
+        return self._user_agent
+
+    def _direct_download_all(self, downloads, provider):
+        """Downloads files straight from their URLs, as the Firefox session.
+
+        Each request takes its own downloads token from the provider's
+        rate limit, right before it's sent.
+        :param downloads: The URL of each file and where to save it
+        :type downloads: [(str, str)]
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: Whether or not each file was saved as a PDF, in order
+        :rtype: {[bool]}
+        """
+        if not downloads:
+            return []
+        return self.downloader.download_all(
+            downloads,
+            cookies=Downloader.cookie_jar(self.firefox.cookies()),
+            headers={"User-Agent": self.user_agent},
+            before=lambda: self.limiter.wait(provider, "downloads"),
+        )
 
     def _hein_download(self, a_tag, project, source, filename):
         """Downloads a Hein source.
 
+        See _hein_download_all.
+        :param a_tag: The <a> tag of the file to download
+        :type a_tag: ElementHandle
+        :param project: The project it belongs to
+        :type project: Project
+        :param source: The source we are downloading
+        :type source: Source
+        :param filename: The filename to save the result as
+        :type filename: str
+        :returns: The filepath of the download
+        :rtype: {str}
+        """
+        return self._hein_download_all([(a_tag, filename)], project, source)[0]
+
+    @timed("download")
+    def _hein_download_all(self, downloads, project, source):
+        """Downloads several Hein sources at the same time.
+
+        Each file is fetched straight from its print link with the
+        browser's cookies (see Downloader). Anything that doesn't come
+        back as a PDF (e.g., the warning about too many downloads) is
+        downloaded through the browser instead.
+        :param downloads: The <a> tag of each file to download, and the
+            filename to save it as. The first one is the file that's
+            needed (e.g., the article), so if it fails in the browser,
+            its error is raised
+        :type downloads: [(ElementHandle, str)]
+        :param project: The project it belongs to
+        :type project: Project
+        :param source: The source we are downloading
+        :type source: Source
+        :returns: The filepath of each download (or None if it failed),
+            in order
+        :rtype: {[str]}
+        """
+        urls = []
+        for a_tag, _ in downloads:
+            try:
+                urls.append(hein_url(self.URLS, a_tag.get_attribute("href")))
+            except Exception as e:
+                print(str(e))
+                urls.append(None)
+        paths = [project.save_pull_path(filename, "pdf") for _, filename in downloads]
+        fetched = self._direct_download_all(
+            [(url, path) for url, path in zip(urls, paths) if url], "hein"
+        )
+        filepaths = []
+        for (a_tag, filename), url, path in zip(downloads, urls, paths):
+            if url and fetched.pop(0):
+                try:
+                    utils.remove_first_page(path)
+                except Exception as e:
+                    print(str(e))
+                    path = None
+                filepaths.append(path)
+            else:
+                try:
+                    path = self._hein_browser_download(a_tag, project, source, filename)
+                except Exception as e:
+                    # Keep why the file that's needed failed (e.g., Hein
+                    # throttling), so the pull can be retried for it
+                    if not filepaths:
+                        raise
+                    print(str(e))
+                    path = None
+                filepaths.append(path)
+        return filepaths
+
+    def _hein_browser_download(self, a_tag, project, source, filename):
+        """Downloads a Hein source through the browser.
+
         Hein's download functionality is a bit strange with Playwright.
         It doesn't operate like the page.expect_download() normally
         does, so this function takes the href attribute on the download
@@ -389,37 +828,42 @@ class Puller(object):
         :type filename: str
         :returns: The filepath of the download
         :rtype: {str}
+        :raises Exception: The error the download failed with (see
+            HEIN_THROTTLED for when Hein stops the session)
         """
-        new_page = self.firefox.new_page()
+        new_page = self._new_page("hein")
         try:
             a_href = a_tag.get_attribute("href")
+            self.limiter.wait("hein", "downloads")
             try:
                 with new_page.expect_download(
                     timeout=self.timeout(15)
                 ) as download_info:
-                    new_page.goto(self.URLS["HEIN_BASE_URL"] + a_href)
+                    new_page.goto(hein_url(self.URLS, a_href))
             except PlaywrightTimeoutError:
                 # A timeout might indicate that the warning about too many
                 # downloads recently on this user session is visible.
                 # Click on the "I understand, please proceed" button if so
-                btn_selector = "#verify_human"
-                if new_page.query_selector(btn_selector):
+                if not new_page.query_selector(HEIN_VERIFY_HUMAN):
+                    raise
+                # Slow down so Hein doesn't flag the session
+                self.limiter.backoff("hein")
+                try:
                     with new_page.expect_download(
                         timeout=self.timeout(15)
                     ) as download_info:
-                        new_page.click(btn_selector, timeout=self.timeout(10))
+                        new_page.click(HEIN_VERIFY_HUMAN, timeout=self.timeout(10))
+                except PlaywrightTimeoutError as e:
+                    raise Exception(HEIN_THROTTLED.format(e)) from e
             download = download_info.value
             save_filepath = project.save_pull_path(filename, "pdf")
             download.save_as(save_filepath)
             utils.remove_first_page(save_filepath)
-        except Exception as e:
-            print(str(e))
-            return None
-        else:
             return save_filepath
         finally:
             new_page.close()
 
+    @timed("download")
     def _westlaw_download(self, page, project, source, filename):
         """Downloads a Westlaw source.
 
@@ -439,34 +883,26 @@ class Puller(object):
         :rtype: {str}
         """
         save_filepath = project.save_pull_path(filename, "pdf")
+        self.limiter.wait("westlaw", "downloads")
         # Check to see if the source has an Original Image...
-        original_img_link = page.query_selector('a:has-text("original image")')
+        original_img_link = page.query_selector(WESTLAW_ORIGINAL_IMAGE)
         # ...if it does, download the original image
         if original_img_link:
-            a_tag = page.query_selector('a:has-text("original image")')
-            page.eval_on_selector(
-                'a:has-text("original image")',
-                'link => link.setAttribute("download", "download")',
-            )
+            page.eval_on_selector(WESTLAW_ORIGINAL_IMAGE, WESTLAW_ORIGINAL_IMAGE_SCRIPT)
             with page.expect_download(timeout=self.timeout(20)) as download_info:
-                a_tag.click()
+                original_img_link.click()
             download = download_info.value
             download.save_as(save_filepath)
             return save_filepath
         # ...if it does not, and it is a state statute or Westlaw
         # Reporter (WL), use the download button
-        elif source.kind == Kind.STATE or source._is_westlaw_reporter:
-            page.click("#deliveryDropButton1")
-            page.click("#deliveryRow1Download")
-            # Set the download preferences
-            page.click("#co_deliveryOptionsTab1")
-            page.select_option("#co_delivery_format_fulltext", value="Pdf")
-            page.click("#co_deliveryOptionsTab2")
-            page.uncheck("#coid_chkDdcLayoutCoverPage")
-            # Click the final download buttons
-            page.click("#co_deliveryDownloadButton")
+        elif westlaw_delivers(source):
+            # Set the download preferences and click the final download
+            # buttons
+            for method, args, kwargs in WESTLAW_DELIVERY:
+                getattr(page, method)(*args, **kwargs)
             with page.expect_download(timeout=self.timeout(20)) as download_info:
-                page.click("#coid_deliveryWaitMessage_downloadButton")
+                page.click(WESTLAW_DELIVERY_DOWNLOAD)
             download = download_info.value
             download.save_as(save_filepath)
             return save_filepath
@@ -474,12 +910,68 @@ class Puller(object):
         else:
             raise NoAttemptError
 
+    def _attempt(self, provider, pull, source, project, *args):
+        """Runs one way of pulling a source, with retries.
+
+        See RetryPolicy. Each attempt is added to the source's
+        attempts, and a browser that was closed (e.g., because it
+        crashed) is relaunched before trying again.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param pull: The method that pulls the source, which raises if
+            it couldn't
+        :type pull: function
+        :param source: The source to pull
+        :type source: Source
+        :param project: The project that the source belongs to
+        :type project: Project
+        :returns: The result of the last attempt
+        :rtype: {Result}
+        """
+
+        def on_failure(attempt):
+            if attempt.failure == "throttled":
+                self.limiter.backoff(provider)
+            elif attempt.failure == "closed":
+                self._relaunch_closed_browsers()
+
+        def attempt():
+            self.metrics.provider = provider
+            # Anything a failed attempt handed off is left to finish on its own
+            self._processing = []
+            self.resources = ResourceReport()
+            with self.metrics.span("pull") as span:
+                try:
+                    pull(source, project, *args)
+                    span.bytes = file_size(
+                        project.save_pull_path(source.filename, "pdf")
+                    )
+                finally:
+                    span.resources = self.resources.to_json()
+
+        return self.retry.run(attempt, provider, source._attempts, on_failure)
+
+    def _relaunch_closed_browsers(self):
+        """Forgets any browser that has been closed, so that it's
+        launched again the next time it's used.
+        """
+        for attr in ("_chrome", "_firefox"):
+            browser = getattr(self, attr)
+            if not browser:
+                continue
+            try:
+                browser.cookies()
+            except Exception as e:
+                print(str(e))
+                setattr(self, attr, None)
+
     def pull(self, source, project):
         """Pulls a source.
 
         Runs the playwright browser to attempt to find the source.
         If found, downloads the source. Returns the result of the
-        pulling.
+        pulling, once its files have been processed (see start_pull).
+        Each try is kept in the source's attempts.
         :param source: The source to pull
         :type source: Source
         :param source: The project that the source belows to
@@ -487,430 +979,440 @@ class Puller(object):
         :returns: The result of the pull
         :rtype: {Result}
         """
+        return self.start_pull(source, project).result()
+
+    def start_pull(self, source, project):
+        """Pulls a source, leaving the merging and converting of what was
+        downloaded to the post-processor.
+
+        Returns as soon as the browser is done with the source, so the
+        Puller can start on the next one while the files are processed.
+        A source that downloaded fine but couldn't be processed is a
+        Failure.
+        :param source: The source to pull
+        :type source: Source
+        :param source: The project that the source belows to
+        :type source: Project
+        :returns: The result of the pull, once its files have been
+            processed
+        :rtype: {Future}
+        """
+        source._attempts = []
+        self._processing = []
+        self.metrics = PullMetrics(source)
+        # Sources that were already pulled for another project (or an
+        # earlier row) don't need to be pulled again
+        with self.metrics.span("cache") as span:
+            hit = self.cache.get(source, project)
+            span.outcome = "hit" if hit else "miss"
+        if hit:
+            self.metrics.save(project.metrics_file)
+            pulled = Future()
+            pulled.set_result(Result.SUCCESS)
+            return pulled
+
+        # Try each way of pulling the source (see providers.CHAINS), e.g.
+        # Hein and then Westlaw for SCOTUS cases. Books aren't attempted
         result = Result.NO_ATTEMPT
+        for step in providers.chain(source):
+            pull, args = step.bind(self)
+            result = self._attempt(step.provider, pull, source, project, *args)
+            if result == Result.SUCCESS:
+                break
+
+        return self._finish_pull(source, project, result)
+
+    def defer(self, stage, fn, *args):
+        """Hands work on the files of the source being pulled to the
+        post-processor (see PostProcessor.submit).
+
+        :param stage: The name of the stage, for the metrics
+        :type stage: str
+        :param fn: The work to do
+        :type fn: function
+        """
+        future = self.postprocessor.submit(fn, *args)
+        self._processing.append((stage, time.time(), future))
+
+    def _finish_pull(self, source, project, result):
+        """Waits (without blocking) on the post-processing of a pull, then
+        caches the source and saves its metrics.
 
-        # ==============================================================
-        # BOOK
-        # ==============================================================
-        # Books pulling shouldn't be attempted.
-        # ==============================================================
-        if source.kind == Kind.BOOK:
-            result = Result.NO_ATTEMPT
-
-        # ==============================================================
-        # WEBSITE
-        # ==============================================================
-        # Websites should get downloaded directly from their URL.
-        # ==============================================================
-        if source.kind == Kind.WEBSITE:
-            page = self.chrome.new_page()
+        :returns: The result of the pull
+        :rtype: {Future}
+        """
+        # Anything handed off by a pull that failed anyway is ignored
+        processing = self._processing if result == Result.SUCCESS else []
+        self._processing = []
+        metrics = self.metrics
+        pulled = Future()
+
+        def finish(processed):
+            final = result
+            for stage, started_at, future in processing:
+                span = Span(stage, metrics.kind, metrics.provider)
+                span.started_at = started_at
+                span.duration = time.time() - started_at
+                if future.exception():
+                    span.outcome = "error"
+                else:
+                    span.bytes = file_size(future.result())
+                metrics.spans.append(span)
+            if processed.exception():
+                print(str(processed.exception()))
+                final = Result.FAILURE
             try:
-                page.goto(source.short_cite, wait_until="load")
-                # Check if the browser's PDF viewer is open and download
-                # the file directly if so
-                if page.query_selector('embed[type="application/pdf"]'):
-                    pdf_path = project.save_pull_path(source.filename, "pdf")
+                if final == Result.SUCCESS:
+                    self.cache.put(source, project)
+                metrics.save(project.metrics_file)
+            finally:
+                pulled.set_result(final)
+
+        gather([future for _, _, future in processing]).add_done_callback(finish)
+        return pulled
+
+    # ==================================================================
+    # WEBSITE
+    # ==================================================================
+    # Websites should get downloaded directly from their URL.
+    # ==================================================================
+    def _pull_website(self, source, project):
+        page = self.chrome.new_page()
+        try:
+            page.goto(source.short_cite, wait_until="load")
+            # Check if the browser's PDF viewer is open and download
+            # the file directly if so
+            if page.query_selector(PDF_VIEWER):
+                pdf_path = project.save_pull_path(source.filename, "pdf")
+                with self.metrics.span("download") as span:
                     urlretrieve(source.short_cite, pdf_path)
-                # Otherwise, take a full page screenshot of the page
-                else:
-                    img_path = project.save_pull_path(source.filename, "png")
-                    page.screenshot(full_page=True, path=img_path)
-                    utils.img2pdf(img_path)
-                    os.remove(img_path)
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
+                    span.bytes = file_size(pdf_path)
+            # Otherwise, take a full page screenshot of it (or print the
+            # page to a PDF, see WEBSITE_CAPTURE)
             else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
+                pdf_path = project.save_pull_path(source.filename, "pdf")
+                if WEBSITE_CAPTURE != "print" or not self._print_pdf(page, pdf_path):
+                    self._screenshot_pdf(page, project, source.filename)
+        finally:
+            page.close()
 
-        # ==============================================================
-        # SSRN
-        # ==============================================================
-        # SSRN articles should get downloaded from their URL, but using
-        # the Download This Paper button on the paper.
-        # ==============================================================
-        if source.kind == Kind.SSRN:
-            page = self.firefox.new_page()
+    def _print_pdf(self, page, pdf_path):
+        """Prints a website to a PDF with Chrome.
+
+        Printing keeps the page's text as text and splits it into pages,
+        and takes much less time and memory than a full page screenshot
+        of a long page. It goes through the Chrome DevTools Protocol
+        because Playwright's page.pdf only works in headless Chrome, which
+        can't load the extensions. Chrome rejects Page.printToPDF when
+        it's not headless too, though, so this only works with a Chrome
+        that allows it (see WEBSITE_CAPTURE). The PDF is streamed to
+        disk, so it's never all in memory.
+        :param page: The page of the website
+        :type page: Page
+        :param pdf_path: Where to save the PDF
+        :type pdf_path: str
+        :returns: Whether the PDF was saved
+        :rtype: {bool}
+        """
+        part_path = pdf_path + ".part"
+        with self.metrics.span("print") as span:
             try:
-                page.goto(source.short_cite)
-                with page.expect_download(timeout=self.timeout(10)) as download_info:
-                    page.click("text=Download This Paper")
-                download = download_info.value
-                download_path = project.save_pull_path(source.filename, "pdf")
-                download.save_as(download_path)
-                download.path()
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
+                # Print the page the way it looks on screen
+                page.emulate_media(media="screen")
+                client = page.context.new_cdp_session(page)
+                try:
+                    stream = client.send("Page.printToPDF", self.print_options())
+                    with open(part_path, "wb") as f:
+                        while True:
+                            chunk = client.send(
+                                "IO.read",
+                                {"handle": stream["stream"], "size": CHUNK_SIZE},
+                            )
+                            if chunk.get("base64Encoded"):
+                                f.write(base64.b64decode(chunk["data"]))
+                            else:
+                                f.write(chunk["data"].encode())
+                            if chunk["eof"]:
+                                break
+                    client.send("IO.close", {"handle": stream["stream"]})
+                finally:
+                    client.detach()
+                os.replace(part_path, pdf_path)
             except Exception as e:
                 print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
+                span.outcome = "error"
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                return False
+            span.bytes = file_size(pdf_path)
+        return True
 
-        # ==============================================================
-        # JOURNAL
-        # ==============================================================
-        # Journals should get pulled from Hein. This should pull both
-        # the full article and the table of contents for its issue. If
-        # the article is in the first issue, also download the table
-        # of contents for the second issue so pagination can be checked.
-        #
-        # The Contents sidebar on Hein can be structured a few ways:
-        # 1. All of the Table of Contents sections appear at the top,
-        #    with the Issues later on (see "119 Harv. L. Rev. 32")
-        #    sometimes labeled as "Table of Contents - Issue X" or
-        #    "Table of Contents--Issue X" (no set format)
-        # 2. The Table of Contents section for the Issue is directly
-        #    below its header (see "71 Stan. L. Rev. 1") sometimes
-        #    labeled as "Table of Contents" or "Table of Contents -
-        #    Issue 1" (no set format)
-        # 3. Maybe other ways I haven't seen, but those won't be handled
-        # ==============================================================
-        if source.kind == Kind.JOURNAL:
-            page = self.firefox.new_page()
-            try:
-                self._hein_search(page, source.short_cite)
-                # Create variables that will eventually keep track of
-                # the download paths, as well as the issue's Table of
-                # Contents format and where it was found
-                toc_method = ""  # one of: (top|under|global|'')
-                article_path = ""
-                toc1_path = ""
-                toc2_path = ""
-                toc1_li = None
-                toc2_li = None
-                # ------------------------------------------------------
-                # Get the issue information
-                # ------------------------------------------------------
+    def _screenshot_pdf(self, page, project, filename):
+        """Takes a full page screenshot of a website and converts it to a
+        PDF.
+
+        :param page: The page of the website
+        :type page: Page
+        :param project: The project the website is being pulled for
+        :type project: Project
+        :param filename: The filename of the source
+        :type filename: str
+        """
+        img_path = project.save_pull_path(filename, "png")
+        with self.metrics.span("screenshot") as span:
+            page.screenshot(full_page=True, path=img_path)
+            span.bytes = file_size(img_path)
+        self.defer("convert", screenshot_to_pdf, img_path, SCREENSHOT_JPEG_QUALITY)
+
+    # ==================================================================
+    # SSRN
+    # ==================================================================
+    # SSRN articles should get downloaded from their URL, but using
+    # the Download This Paper button on the paper.
+    # ==================================================================
+    def _pull_ssrn(self, source, project):
+        page = self._new_page("ssrn")
+        try:
+            self.limiter.wait("ssrn", "requests")
+            page.goto(source.short_cite)
+            self._check_login_wall(page, "ssrn")
+            download_path = project.save_pull_path(source.filename, "pdf")
+            # Fetch the paper straight from its download link, and
+            # only click through the page if that doesn't work
+            with self.metrics.span("download") as span:
+                href = page.get_attribute(SSRN_DOWNLOAD, "href")
+                if (
+                    not href
+                    or not self._direct_download_all(
+                        [(ssrn_download_url(page.url, href), download_path)], "ssrn"
+                    )[0]
+                ):
+                    self.limiter.wait("ssrn", "downloads")
+                    with page.expect_download(
+                        timeout=self.timeout(10)
+                    ) as download_info:
+                        page.click(SSRN_DOWNLOAD)
+                    download = download_info.value
+                    download.save_as(download_path)
+                    download.path()
+                span.bytes = file_size(download_path)
+        finally:
+            page.close()
+
+    # ==================================================================
+    # JOURNAL
+    # ==================================================================
+    # Journals should get pulled from Hein. This should pull both
+    # the full article and the table of contents for its issue. If
+    # the article is in the first issue, also download the table
+    # of contents for the second issue so pagination can be checked.
+    #
+    # The Contents sidebar on Hein can be structured a few ways:
+    # 1. All of the Table of Contents sections appear at the top,
+    #    with the Issues later on (see "119 Harv. L. Rev. 32")
+    #    sometimes labeled as "Table of Contents - Issue X" or
+    #    "Table of Contents--Issue X" (no set format)
+    # 2. The Table of Contents section for the Issue is directly
+    #    below its header (see "71 Stan. L. Rev. 1") sometimes
+    #    labeled as "Table of Contents" or "Table of Contents -
+    #    Issue 1" (no set format)
+    # 3. Maybe other ways I haven't seen, but those won't be handled
+    # ==================================================================
+    def _pull_journal(self, source, project):
+        page = self._new_page("hein")
+        try:
+            self._hein_search(page, source.short_cite)
+            # Create variables that will eventually keep track of
+            # the download paths, as well as the issue's Table of
+            # Contents format and where it was found
+            toc_method = ""  # one of: (top|under|global|'')
+            article_path = ""
+            toc1_path = ""
+            toc2_path = ""
+            toc1_li = None
+            toc2_li = None
+            # ------------------------------------------------------
+            # Get the issue information
+            # ------------------------------------------------------
+            with self.metrics.span("selector"):
                 try:
-                    page.wait_for_selector(
-                        ".atocpage.sectionhighlight", timeout=self.timeout(10)
-                    )
+                    page.wait_for_selector(HEIN_SECTION, timeout=self.timeout(10))
                 except Exception:
                     raise NotFoundError
-                issue_ul = page.evaluate_handle(
-                    """
-                    document
-                        .querySelector('.atocpage.sectionhighlight')
-                        .closest('ul.dropdown-submenu')
-                """
-                ).as_element()
-                issue_header_li = page.evaluate_handle(
-                    """
-                    document
-                        .querySelector('.atocpage.sectionhighlight')
-                        .closest('ul.dropdown-submenu')
-                        .parentElement
-                        .previousElementSibling
-                """
-                ).as_element()
-                issue_header_li_text = issue_header_li.inner_text()
-                match = re.search("Issue ([0-9]+)", issue_header_li_text)
-                issue_number = match.group(1)
-                # ------------------------------------------------------
-                # Get the article
-                # ------------------------------------------------------
-                article_li = page.query_selector(".atocpage.sectionhighlight")
-                article_print_a = article_li.query_selector("a.contents_print")
-                article_path = self._hein_download(
-                    article_print_a,
-                    project,
-                    source,
-                    "{}-article".format(source.filename),
-                )
-                if not article_path:
-                    raise Exception("Error while downloading journal article")
-                # ------------------------------------------------------
-                # Get the first Table of Contents
-                # ------------------------------------------------------
-                # Check if Table of Contents is right below the issue
-                # in the sidebar (e.g., "71 Stan. L. Rev. 1")
-                toc1_li = issue_ul.query_selector('li:has-text("Table of Contents")')
+            issue_ul = page.evaluate_handle(ISSUE_LIST_SCRIPT).as_element()
+            issue_header_li = page.evaluate_handle(ISSUE_HEADER_SCRIPT).as_element()
+            issue = issue_number(issue_header_li.inner_text())
+            article_filename, toc1_filename, toc2_filename = journal_filenames(source)
+            # ------------------------------------------------------
+            # Get the article
+            # ------------------------------------------------------
+            article_li = page.query_selector(HEIN_SECTION)
+            article_print_a = article_li.query_selector(HEIN_PRINT_LINK)
+            # ------------------------------------------------------
+            # Get the first Table of Contents
+            # ------------------------------------------------------
+            # Check if Table of Contents is right below the issue
+            # in the sidebar (e.g., "71 Stan. L. Rev. 1")
+            toc1_li = issue_ul.query_selector(TOC_ITEM)
+            if toc1_li:
+                toc_method = "under"
+            # Check if the Table of Contents for the issue is at
+            # the top of the sidebar (e.g., "119 Harv. L. Rev. 32")
+            if not toc1_li:
+                for li in page.query_selector_all(issue_items(issue)):
+                    if TOC_TEXT in li.inner_text():
+                        toc1_li = li
+                        toc_method = "top"
+                        break
+            # Check if there is only one global Table of Contents
+            if not toc1_li:
+                toc1_li = page.query_selector(GLOBAL_TOC_ITEM)
                 if toc1_li:
-                    toc_method = "under"
-                # Check if the Table of Contents for the issue is at
-                # the top of the sidebar (e.g., "119 Harv. L. Rev. 32")
-                if not toc1_li:
-                    matching_issue_lis = page.query_selector_all(
-                        '#contents-show li:has-text("Issue {}")'.format(issue_number)
-                    )
-                    for li in matching_issue_lis:
-                        if "Table of Contents" in li.inner_text():
-                            toc1_li = li
-                            toc_method = "top"
-                            break
-                # Check if there is only one global Table of Contents
-                if not toc1_li:
-                    toc1_li = page.query_selector(
-                        '#contents-show li:has-text("Table of Contents")'
-                    )
-                    if toc1_li:
-                        toc_method = "global"
-                toc1_print_a = toc1_li.query_selector("a.contents_print")
-                toc1_path = self._hein_download(
-                    toc1_print_a, project, source, "{}-toc1".format(source.filename)
-                )
-                # ------------------------------------------------------
-                # Get the second Table of Contents (if needed)
-                # ------------------------------------------------------
-                if issue_number == "1":
-                    if toc_method == "under":
-                        issue2_ul = page.evaluate_handle(
-                            """
-                            document
-                                .querySelector('.atocpage.sectionhighlight')
-                                .closest('ul.dropdown-submenu')
-                                .parentElement
-                                .nextElementSibling
-                                .nextElementSibling
-                        """
-                        ).as_element()
-                        toc2_li = issue2_ul.query_selector(
-                            'li:has-text("Table of Contents")'
-                        )
-                    elif toc_method == "top":
-                        matching_issue_lis = page.query_selector_all(
-                            '#contents-show li:has-text("Issue 2")'
-                        )
-                        for li in matching_issue_lis:
-                            if "Table of Contents" in li.inner_text():
-                                toc2_li = li
-                    elif toc_method == "global":
-                        pass  # do nothing because there was only one TOC
-                    toc2_print_a = toc2_li.query_selector("a.contents_print")
-                    toc2_path = self._hein_download(
-                        toc2_print_a, project, source, "{}-toc2".format(source.filename)
-                    )
-                # ------------------------------------------------------
-                # Merge and save the PDFs
-                # ------------------------------------------------------
-                pdfs = []
-                if toc1_path:
-                    pdfs.append(toc1_path)
-                if toc2_path:
-                    pdfs.append(toc2_path)
-                if article_path:
-                    pdfs.append(article_path)
-                utils.merge(pdfs, project.save_pull_path(source.filename, "pdf"))
-                for pdf in pdfs:
-                    os.remove(pdf)
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
+                    toc_method = "global"
+            tocs = [(toc1_li, issue, toc1_filename)]
+            # ------------------------------------------------------
+            # Get the second Table of Contents (if needed)
+            # ------------------------------------------------------
+            if issue == "1":
+                if toc_method == "under":
+                    issue2_ul = page.evaluate_handle(
+                        NEXT_ISSUE_LIST_SCRIPT
+                    ).as_element()
+                    toc2_li = issue2_ul.query_selector(TOC_ITEM)
+                elif toc_method == "top":
+                    for li in page.query_selector_all(issue_items("2")):
+                        if TOC_TEXT in li.inner_text():
+                            toc2_li = li
+                elif toc_method == "global":
+                    pass  # do nothing because there was only one TOC
+                if toc2_li:
+                    tocs.append((toc2_li, "2", toc2_filename))
+            # ------------------------------------------------------
+            # Download the article and any Tables of Contents that
+            # aren't cached, all at the same time
+            # ------------------------------------------------------
+            downloads = [(article_print_a, article_filename)]
+            toc_paths = []
+            for toc_li, toc_issue, toc_filename in tocs:
+                toc_path = project.save_pull_path(toc_filename, "pdf")
+                if self.tocs.get(source, toc_issue, toc_path):
+                    toc_paths.append(toc_path)
+                else:
+                    toc_print_a = toc_li.query_selector(HEIN_PRINT_LINK)
+                    downloads.append((toc_print_a, toc_filename))
+                    toc_paths.append(None)
+            paths = iter(self._hein_download_all(downloads, project, source))
+            article_path = next(paths)
+            if not article_path:
+                raise Exception("Error while downloading journal article")
+            for i, (_, toc_issue, _) in enumerate(tocs):
+                if not toc_paths[i]:
+                    toc_paths[i] = next(paths)
+                    if toc_paths[i]:
+                        self.tocs.put(source, toc_issue, toc_paths[i])
+            toc1_path = toc_paths[0]
+            toc2_path = toc_paths[1] if len(toc_paths) > 1 else ""
+            # ------------------------------------------------------
+            # Merge and save the PDFs
+            # ------------------------------------------------------
+            pdfs = []
+            if toc1_path:
+                pdfs.append(toc1_path)
+            if toc2_path:
+                pdfs.append(toc2_path)
+            if article_path:
+                pdfs.append(article_path)
+            self.defer(
+                "merge",
+                merge_pdfs,
+                pdfs,
+                project.save_pull_path(source.filename, "pdf"),
+            )
+        finally:
+            page.close()
 
-        # ==============================================================
-        # STATE
-        # ==============================================================
-        # State statutes should get pulled from Westlaw. Usually these
-        # do not have an Original Image, but the search function
-        # handles that for us.
-        # ==============================================================
-        if source.kind == Kind.STATE:
-            page = self.firefox.new_page()
-            try:
-                self._westlaw_search(
-                    page, self.URLS["WESTLAW_STATUTES_URL"], source.short_cite
-                )
-                download_path = self._westlaw_download(
-                    page, project, source, source.filename
-                )
-                if not download_path:
-                    raise Exception("No download path returned")
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
+    # ==================================================================
+    # STATE and NON_SCOTUS
+    # ==================================================================
+    # State statutes and Non-SCOTUS cases should get pulled from
+    # Westlaw, using the search page for their type (url). State
+    # statutes usually do not have an Original Image, and cases
+    # usually do, but the search function handles that for us.
+    # ==================================================================
+    def _pull_westlaw(self, source, project, url):
+        page = self._new_page("westlaw")
+        try:
+            self._westlaw_search(page, url, source.short_cite)
+            download_path = self._westlaw_download(
+                page, project, source, source.filename
+            )
+            if not download_path:
+                raise Exception("No download path returned")
+        finally:
+            page.close()
 
-        # ==============================================================
-        # FEDERAL
-        # ==============================================================
-        # Federal statutes should get downloaded from Hein using the
-        # 2018 U.S. Code edition.
-        # ==============================================================
-        if source.kind == Kind.FEDERAL:
-            page = self.firefox.new_page()
-            try:
-                self._hein_search(page, source.short_cite)
+    # ==================================================================
+    # FEDERAL
+    # ==================================================================
+    # Federal statutes should get downloaded from Hein using the
+    # 2018 U.S. Code edition.
+    # ==================================================================
+    def _pull_federal(self, source, project):
+        page = self._new_page("hein")
+        try:
+            self._hein_search(page, source.short_cite)
+            with self.metrics.span("selector"):
                 try:
-                    page.wait_for_selector(
-                        '#page_content:has-text("U.S. Code Citation")',
-                        timeout=self.timeout(10),
-                    )
+                    page.wait_for_selector(FEDERAL_FOUND, timeout=self.timeout(10))
                 except Exception as e:
                     print(str(e))
                     raise NotFoundError
-                chosen_edition = None
-                # Try to find the 2018 Edition
-                chosen_edition = page.query_selector(
-                    '#page_content a:has-text("2018 Edition")'
-                )
-                # If there isn't 2018, try to find the 2012 Edition
-                if not chosen_edition:
-                    chosen_edition = page.query_selector(
-                        '#page_content a:has-text("2012 Edition")'
-                    )
-                # If there isn't 2018 or 2012, use the top match
-                if not chosen_edition:
-                    chosen_edition = page.query_selector(
-                        '#page_content a:has-text("Edition")'
-                    )
-                # Open the chosen edition in the current tab and download
-                chosen_edition_href = chosen_edition.get_attribute("href")
-                chosen_edition_url = self.URLS["HEIN_BASE_URL"] + chosen_edition_href
-                page.goto(chosen_edition_url)
-                page.wait_for_selector(".atocpage.sectionhighlight")
-                section_print_a = page.query_selector(
-                    ".atocpage.sectionhighlight a.contents_print"
-                )
-                download_path = self._hein_download(
-                    section_print_a, project, source, source.filename
-                )
-                if not download_path:
-                    raise Exception("No download path returned")
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
+            # Use the 2018 Edition, then the 2012 Edition, then the top match
+            chosen_edition = None
+            for edition in FEDERAL_EDITIONS:
+                chosen_edition = page.query_selector(edition)
+                if chosen_edition:
+                    break
+            # Open the chosen edition in the current tab and download
+            chosen_edition_href = chosen_edition.get_attribute("href")
+            self.limiter.wait("hein", "requests")
+            page.goto(hein_url(self.URLS, chosen_edition_href))
+            with self.metrics.span("selector"):
+                page.wait_for_selector(HEIN_SECTION)
+            section_print_a = page.query_selector(HEIN_SECTION_PRINT_LINK)
+            download_path = self._hein_download(
+                section_print_a, project, source, source.filename
+            )
+            if not download_path:
+                raise Exception("No download path returned")
+        finally:
+            page.close()
 
-        # ==============================================================
-        # SCOTUS
-        # ==============================================================
-        # SCOTUS cases should get downloaded from Hein, but if they
-        # aren't found on Hein (i.e. it's not yet available) then
-        # attempt Westlaw. Some SCOTUS cases, e.g. "76 S. Ct. 212",
-        # won't be found on Hein because it's in a different reporter.
-        # ==============================================================
-        short_cite_no_space = source.short_cite.replace(" ", "").lower()
-        in_other_reporters = "s.ct" in short_cite_no_space
-        if source.kind == Kind.SCOTUS and not in_other_reporters:
-            page = self.firefox.new_page()
-            try:
-                self._hein_search(page, source.short_cite)
+    # ==================================================================
+    # SCOTUS
+    # ==================================================================
+    # SCOTUS cases should get downloaded from Hein (see providers.CHAINS
+    # for when they fall back to Westlaw).
+    # ==================================================================
+    def _pull_scotus(self, source, project):
+        page = self._new_page("hein")
+        try:
+            self._hein_search(page, source.short_cite)
+            with self.metrics.span("selector"):
                 try:
-                    page.wait_for_selector(
-                        'a:has-text("HeinOnline (PDF version)")',
-                        timeout=self.timeout(10),
-                    )
+                    page.wait_for_selector(SCOTUS_PDF_LINK, timeout=self.timeout(10))
                 except Exception as e:
                     print(str(e))
                     raise NotFoundError
-                page.click('a:has-text("HeinOnline (PDF version)")')
-                page.wait_for_selector(".atocpage.sectionhighlight")
-                section_print_a = page.query_selector(
-                    ".atocpage.sectionhighlight a.contents_print"
-                )
-                download_path = self._hein_download(
-                    section_print_a, project, source, source.filename
-                )
-                if not download_path:
-                    raise Exception("No download path returned")
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
-
-        # SCOTUS but found in different reporters, e.g.,
-        # "76 S. Ct. 212"; fallback to Westlaw for these or any errors
-        if source.kind == Kind.SCOTUS and (
-            in_other_reporters or result != Result.SUCCESS
-        ):
-            page = self.firefox.new_page()
-            try:
-                self._westlaw_search(
-                    page, self.URLS["WESTLAW_CASES_URL"], source.short_cite
-                )
-                download_path = self._westlaw_download(
-                    page, project, source, source.filename
-                )
-                if not download_path:
-                    raise Exception("No download path returned")
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
-
-        # ==============================================================
-        # NON_SCOTUS
-        # ==============================================================
-        # Non-SCOTUS cases should get downloaded from Westlaw. Usually
-        # these have an Original Image, but the search function handles
-        # that for us.
-        # ==============================================================
-        if source.kind == Kind.NON_SCOTUS:
-            page = self.firefox.new_page()
-            try:
-                self._westlaw_search(
-                    page, self.URLS["WESTLAW_CASES_URL"], source.short_cite
-                )
-                download_path = self._westlaw_download(
-                    page, project, source, source.filename
-                )
-                if not download_path:
-                    raise Exception("No download path returned")
-            except NotFoundError:
-                result = Result.NOT_FOUND
-            except NoAttemptError:
-                result = Result.NO_ATTEMPT
-            except Exception as e:
-                print(str(e))
-                result = Result.FAILURE
-            else:
-                result = Result.SUCCESS
-            finally:
-                page.close()
-
-        return result
-
-
-class NotFoundError(Exception):
-    pass
-
-
-class NoAttemptError(Exception):
-    pass
+            self.limiter.wait("hein", "requests")
+            page.click(SCOTUS_PDF_LINK)
+            with self.metrics.span("selector"):
+                page.wait_for_selector(HEIN_SECTION)
+            section_print_a = page.query_selector(HEIN_SECTION_PRINT_LINK)
+            download_path = self._hein_download(
+                section_print_a, project, source, source.filename
+            )
+            if not download_path:
+                raise Exception("No download path returned")
+        finally:
+            page.close()
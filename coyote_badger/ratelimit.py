@@ -0,0 +1,118 @@
+import threading
+import time
+
+from coyote_badger.config import RATE_LIMITS, RATE_RECOVERY
+
+
+class TokenBucket(object):
+    def __init__(self, per_minute, burst):
+        """Creates a bucket that paces actions to a rate.
+
+        The bucket holds up to burst tokens and refills at per_minute
+        tokens a minute. Each action takes a token, and only has to
+        wait when the bucket is empty, so actions run at full speed
+        until the rate is used up.
+        :param per_minute: How many actions are allowed a minute
+        :type per_minute: float
+        :param burst: How many actions can run back to back
+        :type burst: int
+        """
+        self.base_rate = per_minute / 60
+        self.rate = self.base_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.throttled_at = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Speed back up once the provider hasn't complained for a while
+        if self.throttled_at and now - self.throttled_at > RATE_RECOVERY:
+            self.rate = min(self.base_rate, self.rate * 2)
+            self.throttled_at = now if self.rate < self.base_rate else None
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self):
+        """Takes a token, and says how long to wait before acting.
+
+        The token is taken right away (even if it hasn't refilled yet)
+        so that callers waiting at the same time are spaced out.
+        :returns: The seconds to wait
+        :rtype: {float}
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def backoff(self):
+        """Slows down after the provider says we're going too fast.
+
+        Halves the rate (down to one action a minute) and empties the
+        bucket. The rate doubles back up every RATE_RECOVERY seconds
+        that the provider doesn't complain again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(1 / 60, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            self.throttled_at = now
+
+
+class RateLimiter(object):
+    def __init__(self, limits=RATE_LIMITS):
+        """Creates a token bucket for each provider and kind of action.
+
+        :param limits: The per_minute and burst of each kind of action
+            (e.g., "requests" or "downloads") for each provider,
+            defaults to RATE_LIMITS
+        :type limits: dict(str -> dict(str -> (float, int)))
+        """
+        self.buckets = {
+            provider: {
+                kind: TokenBucket(per_minute, burst)
+                for kind, (per_minute, burst) in kinds.items()
+            }
+            for provider, kinds in limits.items()
+        }
+
+    def delay(self, provider, kind):
+        """Takes a token for an action, and says how long to wait.
+
+        Useful from async code (see AsyncPuller), which should sleep
+        without blocking the loop.
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param kind: The kind of action (e.g., "downloads")
+        :type kind: str
+        :returns: The seconds to wait
+        :rtype: {float}
+        """
+        bucket = self.buckets.get(provider, {}).get(kind)
+        return bucket.delay() if bucket else 0
+
+    def wait(self, provider, kind):
+        """Waits until an action is allowed.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param kind: The kind of action (e.g., "downloads")
+        :type kind: str
+        """
+        delay = self.delay(provider, kind)
+        if delay:
+            time.sleep(delay)
+
+    def backoff(self, provider):
+        """Slows down every kind of action against a provider.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        for bucket in self.buckets.get(provider, {}).values():
+            bucket.backoff()
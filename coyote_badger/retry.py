@@ -0,0 +1,223 @@
+import asyncio
+import random
+import time
+
+from coyote_badger.config import RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from coyote_badger.errors import NoAttemptError, NotAuthenticatedError, NotFoundError
+from coyote_badger.source import Result
+
+# The failures that are worth trying again
+TRANSIENT_FAILURES = set(["timeout", "closed", "network", "throttled"])
+
+
+class Attempt(object):
+    def __init__(self, number, provider):
+        """Keeps track of one attempt at pulling a source.
+
+        :param number: Which attempt this is (starting at 1)
+        :type number: int
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        self.number = number
+        self.provider = provider
+        self.started_at = time.time()
+        self.duration = None
+        self.result = None
+        self.failure = None
+        self.message = ""
+
+    def finish(self, result, failure=None, message=""):
+        self.duration = time.time() - self.started_at
+        self.result = result
+        self.failure = failure
+        self.message = message
+
+    def to_json(self):
+        """Creates the json representation of the attempt.
+
+        :returns: A json-serializable representation of the attempt
+        :rtype: {dict}
+        """
+        return {
+            "number": self.number,
+            "provider": self.provider,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "result": self.result.value if self.result else None,
+            "failure": self.failure,
+            "message": self.message,
+        }
+
+
+class RetryPolicy(object):
+    # Parts of error messages that say what kind of failure it was, for
+    # every provider ("*") and for each provider
+    FAILURES = {
+        "*": [
+            ("timeout", ["timeout", "timed out"]),
+            ("closed", ["target closed", "has been closed", "browser closed"]),
+            # Playwright's Chromium and Firefox network errors, and the
+            # ones requests raises when a connection drops
+            (
+                "network",
+                [
+                    "net::err_",
+                    "ns_error_net",
+                    "ns_error_connection",
+                    "ns_error_unknown_host",
+                    "connection aborted",
+                    "connection refused",
+                    "connection reset",
+                    "remote end closed connection",
+                    "max retries exceeded",
+                ],
+            ),
+        ],
+        "hein": [("throttled", ["verify_human", "too many downloads"])],
+        "westlaw": [("throttled", ["too many requests"])],
+        "ssrn": [("throttled", ["too many requests"])],
+    }
+
+    def __init__(
+        self,
+        attempts=RETRY_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+    ):
+        """Creates a policy for trying pulls again when they fail.
+
+        Failures are classified from their errors, and only transient
+        ones (timeouts, closed pages, network errors, and throttling)
+        are tried again, after an exponential backoff with jitter. A
+        source that's not found or shouldn't be attempted is never
+        tried again.
+        :param attempts: The most times to try a pull, defaults to
+            RETRY_ATTEMPTS
+        :type attempts: int, optional
+        :param base_delay: The seconds to wait before the first retry,
+            defaults to RETRY_BASE_DELAY
+        :type base_delay: float, optional
+        :param max_delay: The most seconds to wait before a retry,
+            defaults to RETRY_MAX_DELAY
+        :type max_delay: float, optional
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def classify(self, error, provider):
+        """Classifies the error a pull failed with.
+
+        :param error: The error
+        :type error: Exception
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: The kind of failure (e.g., "timeout"), or "error" if
+            it's not known
+        :rtype: {str}
+        """
+        if isinstance(error, NotAuthenticatedError):
+            return "auth"
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return "timeout"
+        if isinstance(error, ConnectionError):
+            return "network"
+        message = "{} {}".format(type(error).__name__, error).lower()
+        for failure, patterns in self.FAILURES.get(provider, []) + self.FAILURES["*"]:
+            if any(pattern in message for pattern in patterns):
+                return failure
+        return "error"
+
+    def delay(self, attempt):
+        """How long to wait before trying again.
+
+        :param attempt: The attempt that just failed (starting at 1)
+        :type attempt: int
+        :returns: The seconds to wait
+        :rtype: {float}
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _finish(self, attempt, error, history):
+        history.append(attempt)
+        if error is None:
+            attempt.finish(Result.SUCCESS)
+            return Result.SUCCESS, False
+        if isinstance(error, NotFoundError):
+            attempt.finish(Result.NOT_FOUND)
+            return Result.NOT_FOUND, False
+        if isinstance(error, NoAttemptError):
+            attempt.finish(Result.NO_ATTEMPT)
+            return Result.NO_ATTEMPT, False
+        failure = self.classify(error, attempt.provider)
+        message = str(error) or type(error).__name__
+        print(message)
+        attempt.finish(Result.FAILURE, failure, message)
+        retry = failure in TRANSIENT_FAILURES and attempt.number < self.attempts
+        return Result.FAILURE, retry
+
+    def run(self, pull, provider, history, on_failure=None):
+        """Runs a pull, trying it again if it fails for a transient reason.
+
+        :param pull: Pulls the source, raising if it couldn't
+        :type pull: function
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param history: The list to add each Attempt to
+        :type history: [Attempt]
+        :param on_failure: Called with the Attempt before retrying,
+            defaults to None
+        :type on_failure: function, optional
+        :returns: The result of the last attempt
+        :rtype: {Result}
+        """
+        for number in range(1, self.attempts + 1):
+            attempt = Attempt(number, provider)
+            try:
+                pull()
+            except Exception as e:
+                result, retry = self._finish(attempt, e, history)
+            else:
+                result, retry = self._finish(attempt, None, history)
+            if not retry:
+                return result
+            if on_failure:
+                on_failure(attempt)
+            time.sleep(self.delay(number))
+        return result
+
+    async def run_async(self, pull, provider, history, timeout, on_failure=None):
+        """Runs an async pull, trying it again if it fails for a
+        transient reason.
+
+        See run.
+        :param pull: Creates the coroutine that pulls the source
+        :type pull: function
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param history: The list to add each Attempt to
+        :type history: [Attempt]
+        :param timeout: The most seconds an attempt can take
+        :type timeout: int
+        :param on_failure: Called with the Attempt before retrying,
+            defaults to None
+        :type on_failure: function, optional
+        :returns: The result of the last attempt
+        :rtype: {Result}
+        """
+        for number in range(1, self.attempts + 1):
+            attempt = Attempt(number, provider)
+            try:
+                await asyncio.wait_for(pull(), timeout)
+            except Exception as e:
+                result, retry = self._finish(attempt, e, history)
+            else:
+                result, retry = self._finish(attempt, None, history)
+            if not retry:
+                return result
+            if on_failure:
+                on_failure(attempt)
+            await asyncio.sleep(self.delay(number))
+        return result
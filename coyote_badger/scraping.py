@@ -0,0 +1,193 @@
+import re
+from urllib.parse import quote, urljoin
+
+from coyote_badger.source import Kind
+
+# What the Puller and AsyncPuller look for on Hein, Westlaw, SSRN, and
+# websites. Both of them use these, so if one of the sites changes, this is
+# where to start
+
+# ======================================================================
+# HEIN
+# ======================================================================
+HEIN_RESULTS = "#page_content"
+# Any of these on the search results means the source wasn't found
+HEIN_NOT_FOUND = [
+    '#page_content:has-text("No matching results")',
+    '#page_content:has-text("Citation Not Found")',
+    '#page_content:has-text("could not be found.")',
+]
+# The section of the Contents sidebar that was searched for, and the link
+# that prints a section (the download)
+HEIN_SECTION = ".atocpage.sectionhighlight"
+HEIN_PRINT_LINK = "a.contents_print"
+HEIN_SECTION_PRINT_LINK = "{} {}".format(HEIN_SECTION, HEIN_PRINT_LINK)
+# The "I understand, please proceed" button on the warning about too many
+# downloads recently on this user session
+HEIN_VERIFY_HUMAN = "#verify_human"
+# The error when the download still doesn't start after proceeding past
+# that warning (RetryPolicy classifies it as throttled)
+HEIN_THROTTLED = "Hein asked to verify_human after too many downloads: {}"
+
+# The Contents sidebar of a journal (see the JOURNAL section of Puller for
+# the ways it can be structured). These scripts get the list of the
+# searched for article's issue, its header (e.g., "Issue 1"), and the list
+# of the issue after it
+ISSUE_LIST_SCRIPT = """
+    document
+        .querySelector('.atocpage.sectionhighlight')
+        .closest('ul.dropdown-submenu')
+"""
+ISSUE_HEADER_SCRIPT = """
+    document
+        .querySelector('.atocpage.sectionhighlight')
+        .closest('ul.dropdown-submenu')
+        .parentElement
+        .previousElementSibling
+"""
+NEXT_ISSUE_LIST_SCRIPT = """
+    document
+        .querySelector('.atocpage.sectionhighlight')
+        .closest('ul.dropdown-submenu')
+        .parentElement
+        .nextElementSibling
+        .nextElementSibling
+"""
+TOC_TEXT = "Table of Contents"
+TOC_ITEM = 'li:has-text("{}")'.format(TOC_TEXT)
+GLOBAL_TOC_ITEM = '#contents-show li:has-text("{}")'.format(TOC_TEXT)
+
+# The U.S. Code editions to pull federal statutes from, in order of
+# preference (the last one is the top match)
+FEDERAL_FOUND = '#page_content:has-text("U.S. Code Citation")'
+FEDERAL_EDITIONS = [
+    '#page_content a:has-text("2018 Edition")',
+    '#page_content a:has-text("2012 Edition")',
+    '#page_content a:has-text("Edition")',
+]
+SCOTUS_PDF_LINK = 'a:has-text("HeinOnline (PDF version)")'
+
+
+def hein_search_url(urls, search_term):
+    """The URL of a Hein search.
+
+    :param urls: The puller's URLS
+    :type urls: dict(str -> str)
+    :param search_term: The search_term to search for
+    :type search_term: str
+    :returns: The URL
+    :rtype: {str}
+    """
+    return urls["HEIN_SEARCH_URL"].format(quote(search_term, safe=""))
+
+
+def hein_url(urls, href):
+    """The URL of a link on Hein (e.g., a print link).
+
+    :param urls: The puller's URLS
+    :type urls: dict(str -> str)
+    :param href: The link's href
+    :type href: str
+    :returns: The URL
+    :rtype: {str}
+    """
+    return urls["HEIN_BASE_URL"] + href
+
+
+def issue_items(issue):
+    """The selector for the items of the Contents sidebar that mention
+    an issue (e.g., "Table of Contents - Issue 2").
+
+    :param issue: The issue number
+    :type issue: str
+    :returns: The selector
+    :rtype: {str}
+    """
+    return '#contents-show li:has-text("Issue {}")'.format(issue)
+
+
+def issue_number(header_text):
+    """Gets the issue number from the header of an issue in the
+    Contents sidebar.
+
+    :param header_text: The header's text (e.g., "Issue 1")
+    :type header_text: str
+    :returns: The issue number
+    :rtype: {str}
+    """
+    return re.search("Issue ([0-9]+)", header_text).group(1)
+
+
+def journal_filenames(source):
+    """The filenames that a journal article and the Tables of Contents
+    of its issue (and the next issue, if it's in the first one) are
+    downloaded as, before they're merged.
+
+    :param source: The journal article
+    :type source: Source
+    :returns: The article's filename, and the Tables of Contents'
+    :rtype: {(str, str, str)}
+    """
+    return (
+        "{}-article".format(source.filename),
+        "{}-toc1".format(source.filename),
+        "{}-toc2".format(source.filename),
+    )
+
+
+# ======================================================================
+# WESTLAW
+# ======================================================================
+WESTLAW_SEARCH_INPUT = "#searchInputId"
+WESTLAW_SEARCH_BUTTON = "#searchButton"
+WESTLAW_DOCUMENT = "#co_docHeader #title"
+WESTLAW_ORIGINAL_IMAGE = 'a:has-text("original image")'
+# Makes the Original Image link download instead of opening the PDF
+WESTLAW_ORIGINAL_IMAGE_SCRIPT = 'link => link.setAttribute("download", "download")'
+# The steps to download a document with the delivery options, as the page
+# method to call and its arguments: open the download dialog, set the
+# download preferences, then start it. The download itself comes from
+# clicking WESTLAW_DELIVERY_DOWNLOAD
+WESTLAW_DELIVERY = [
+    ("click", ("#deliveryDropButton1",), {}),
+    ("click", ("#deliveryRow1Download",), {}),
+    ("click", ("#co_deliveryOptionsTab1",), {}),
+    ("select_option", ("#co_delivery_format_fulltext",), {"value": "Pdf"}),
+    ("click", ("#co_deliveryOptionsTab2",), {}),
+    ("uncheck", ("#coid_chkDdcLayoutCoverPage",), {}),
+    ("click", ("#co_deliveryDownloadButton",), {}),
+]
+WESTLAW_DELIVERY_DOWNLOAD = "#coid_deliveryWaitMessage_downloadButton"
+
+
+def westlaw_delivers(source):
+    """Whether a source without an Original Image can be downloaded
+    with Westlaw's delivery options (state statutes and Westlaw
+    Reporter cases).
+
+    :param source: The source
+    :type source: Source
+    :rtype: {bool}
+    """
+    return source.kind == Kind.STATE or source._is_westlaw_reporter
+
+
+# ======================================================================
+# SSRN and WEBSITES
+# ======================================================================
+SSRN_DOWNLOAD = "text=Download This Paper"
+# The browser's PDF viewer, when a website is a PDF
+PDF_VIEWER = 'embed[type="application/pdf"]'
+
+
+def ssrn_download_url(page_url, href):
+    """The URL of a paper's Download This Paper link.
+
+    :param page_url: The URL of the paper's page
+    :type page_url: str
+    :param href: The link's href
+    :type href: str
+    :returns: The URL
+    :rtype: {str}
+    """
+    return urljoin(page_url, href)
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+from coyote_badger.config import AUTH_CHECK_TTL, SESSIONS_FOLDER
+
+
+class SessionStore(object):
+    def __init__(self, domains, folder=SESSIONS_FOLDER):
+        """Creates a store for the logged in sessions of each provider.
+
+        Saves the Playwright storage_state (cookies and local storage)
+        of each provider after logging in, so new browsers (after a
+        restart, or in a new worker) can pick up the session without
+        logging in again. Only the cookies and origins for a provider's
+        own domains are kept in its session.
+        :param domains: The domains that belong to each provider, e.g.
+            {"hein": ["heinonline.org"]}
+        :type domains: dict(str -> [str])
+        :param folder: The folder to save sessions in, defaults to
+            SESSIONS_FOLDER
+        :type folder: str, optional
+        """
+        self.domains = domains
+        self.folder = folder
+
+    def path(self, provider):
+        return os.path.join(self.folder, "{}.json".format(provider))
+
+    def _matches(self, provider, host):
+        host = host.lstrip(".").lower()
+        for domain in self.domains.get(provider, []):
+            if host == domain or host.endswith("." + domain):
+                return True
+        return False
+
+    def save(self, provider, storage_state, **metadata):
+        """Saves a provider's session.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param storage_state: The browser context's storage_state()
+        :type storage_state: dict
+        :param metadata: Anything else to remember about the session
+        """
+        state = {
+            "cookies": [
+                cookie
+                for cookie in storage_state.get("cookies", [])
+                if self._matches(provider, cookie["domain"])
+            ],
+            "origins": [
+                origin
+                for origin in storage_state.get("origins", [])
+                if self._matches(provider, origin["origin"].split("://")[-1])
+            ],
+            "saved_at": time.time(),
+            "metadata": metadata,
+        }
+        os.makedirs(self.folder, exist_ok=True)
+        # The session is as good as a password, so only the owner can
+        # read it, and it's written in one go so it's never half saved
+        temp_path = self.path(provider) + ".tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path(provider))
+
+    def load(self, provider):
+        """Loads a provider's session, without any expired cookies.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: The session, or None if there isn't a usable one
+        :rtype: {dict}
+        """
+        try:
+            with open(self.path(provider)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        state["cookies"] = [
+            cookie
+            for cookie in state.get("cookies", [])
+            if cookie.get("expires", -1) == -1 or cookie["expires"] > now
+        ]
+        if not state["cookies"]:
+            return None
+        return state
+
+    def invalidate(self, provider):
+        """Forgets a provider's session (e.g., after it's been logged out).
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        """
+        try:
+            os.remove(self.path(provider))
+        except OSError:
+            pass
+
+    def sessions(self):
+        """Loads the usable sessions of every provider.
+
+        :returns: A mapping of provider name to session
+        :rtype: {dict(str -> dict)}
+        """
+        sessions = {}
+        for provider in self.domains:
+            state = self.load(provider)
+            if state:
+                sessions[provider] = state
+        return sessions
+
+
+class AuthCache(object):
+    def __init__(self, ttl=AUTH_CHECK_TTL):
+        """Creates a cache of whether or not each provider is logged in.
+
+        Checking whether a provider is logged in means loading one of
+        its pages, so the answer is kept for a while instead. It's
+        shared between threads, so a worker that finds out it's been
+        logged out can let everyone else know.
+        :param ttl: How many seconds an answer is kept, defaults to
+            AUTH_CHECK_TTL
+        :type ttl: int, optional
+        """
+        self.ttl = ttl
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider):
+        """Gets whether or not a provider was logged in.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :returns: Whether or not it was logged in, or None if it hasn't
+            been checked recently
+        :rtype: {bool}
+        """
+        with self._lock:
+            if provider not in self._checks:
+                return None
+            authenticated, checked_at = self._checks[provider]
+            if time.time() - checked_at > self.ttl:
+                return None
+            return authenticated
+
+    def set(self, provider, authenticated):
+        """Remembers whether or not a provider is logged in.
+
+        :param provider: The name of the provider (e.g., "hein")
+        :type provider: str
+        :param authenticated: Whether or not it's logged in
+        :type authenticated: bool
+        """
+        with self._lock:
+            self._checks[provider] = (authenticated, time.time())
@@ -1,4 +1,6 @@
+import json
 import re
+import zlib
 from enum import Enum
 
 from urlextract import URLExtract
@@ -63,6 +65,7 @@ class Source(object):
         self.result = result
         # Hidden properties that are not shown in the Source sheet
         self._is_westlaw_reporter = self.infer_westlaw_reporter()
+        self._attempts = []  # each Attempt at pulling it (see RetryPolicy)
 
     @property
     def kind(self):
@@ -189,6 +192,23 @@ class Source(object):
         if re.search("[0-9]{4} WL [0-9]+", short_cite_no_periods):
             return True
 
+    @property
+    def version(self):
+        """A number that changes whenever the values that can be edited
+        on the sources page change.
+
+        Results aren't included, so a row that finishes pulling while
+        it's being edited can still be saved. It's a checksum of the
+        values rather than a counter, so it only says whether they're
+        the same: a row that's changed and then changed back has its
+        old version again, and an edit made from before both changes
+        is still saved (over values that are the ones it was made from).
+        :returns: The version of the source
+        :rtype: {int}
+        """
+        values = [self.long_cite, self.short_cite, self.filename, self.kind.value]
+        return zlib.crc32(json.dumps(values).encode("utf-8"))
+
     @staticmethod
     def from_json(data):
         """Creates a source from front-end json.
@@ -223,4 +243,5 @@ class Source(object):
         data[Header.filename.name] = self.filename
         data[Header.kind.name] = self.kind.value
         data[Header.result.name] = self.result.value
+        data["version"] = self.version
         return data
@@ -1,27 +1,233 @@
+import io
 import os
+import struct
+import zlib
 from string import printable
 
 from PIL import Image
-from PyPDF2 import PdfFileMerger, PdfFileReader, PdfFileWriter
 from sanitize_filename import sanitize
 
+from coyote_badger import pdf
+from coyote_badger.pdf import PdfOutput
 
-def img2pdf(in_path, out_path=None):
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# The channels in each pixel of a PNG, by its color type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Images are converted to pages the size of Letter paper (in points)
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+# The most compressed image data read from a file at once
+READ_SIZE = 64 * 1024
+
+
+def img2pdf(in_path, out_path=None, quality=None):
     """Converts an image to a pdf.
 
+    The image is scaled to the width of a Letter page and sliced into
+    as many pages as it takes, so that tall images (e.g., full page
+    screenshots) print well. Non-interlaced 8-bit PNGs are decoded a
+    page at a time and each page is written as soon as it's decoded,
+    so the memory used doesn't depend on the height of the image. The
+    pdf is written next to the output and moved into place when done.
     :param in_path: The path to the input image
     :type in_path: str
     :param out_path: The path to the output pdf, defaults to None
     :type out_path: str, optional
+    :param quality: The JPEG quality (1-95) to compress the pages with,
+        defaults to None (lossless)
+    :type quality: int, optional
     :returns: The path to the output pdf
     :rtype: {str}
     """
     out_path = out_path or "{}.pdf".format(os.path.splitext(in_path)[0])
-    img = Image.open(in_path).convert("RGB")
-    img.save(out_path)
+    part_path = out_path + ".part"
+    try:
+        with open(in_path, "rb") as img, open(part_path, "wb") as f:
+            if img.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE:
+                tiles = _png_tiles(img)
+            else:
+                tiles = _image_tiles(in_path)
+            _write_image_pdf(f, tiles, quality)
+        os.replace(part_path, out_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
     return out_path
 
 
+def _tile_height(width):
+    return max(1, round(width * PAGE_HEIGHT / PAGE_WIDTH))
+
+
+def _image_tiles(path):
+    """Slices an image into page-sized tiles, loading it all at once.
+
+    :param path: The path to the image
+    :type path: str
+    :yields: The tiles, from top to bottom
+    :ytype: {Image}
+    """
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        width, height = img.size
+        step = _tile_height(width)
+        for top in range(0, height, step):
+            yield img.crop((0, top, width, min(top + step, height)))
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def _png_tiles(f):
+    """Slices a PNG into page-sized tiles, decoding one tile at a time.
+
+    A PNG's pixels are a zlib stream of rows, each filtered against the
+    row above it. The stream is inflated a tile at a time, and each
+    tile's rows are decoded by Pillow as a PNG of their own, led by the
+    last decoded row of the tile before so the filters still work.
+    Interlaced and 16-bit PNGs can't be split like this, so they're
+    loaded all at once instead.
+    :param f: The PNG, read just past its signature
+    :type f: file
+    :yields: The tiles, from top to bottom
+    :ytype: {Image}
+    """
+    ihdr = palette = b""
+    inflater = zlib.decompressobj()
+    rows = bytearray()
+    previous = None
+    while True:
+        length, kind = struct.unpack(">I4s", f.read(8))
+        if kind == b"IHDR":
+            ihdr = f.read(length)
+            width, _, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+            if depth != 8 or interlace or color not in PNG_CHANNELS:
+                yield from _image_tiles(f.name)
+                return
+            row_size = 1 + width * PNG_CHANNELS[color]
+            tile_size = _tile_height(width) * row_size
+        elif kind == b"IDAT":
+            remaining = length
+            while remaining:
+                data = f.read(min(remaining, READ_SIZE))
+                remaining -= len(data)
+                # Inflate at most a tile at a time, since a screenshot's
+                # blank space compresses very well
+                while data:
+                    rows += inflater.decompress(data, tile_size)
+                    data = inflater.unconsumed_tail
+                    while len(rows) >= tile_size:
+                        tile, previous = _decode_png_rows(
+                            ihdr, palette, previous, rows[:tile_size]
+                        )
+                        del rows[:tile_size]
+                        yield tile
+        elif kind == b"IEND":
+            break
+        elif kind == b"PLTE":
+            palette = f.read(length)
+        else:
+            f.seek(length, os.SEEK_CUR)
+        f.seek(4, os.SEEK_CUR)  # CRC
+    rows += inflater.flush()
+    rows = rows[: len(rows) - len(rows) % row_size]
+    if rows:
+        tile, _ = _decode_png_rows(ihdr, palette, previous, rows)
+        yield tile
+
+
+def _decode_png_rows(ihdr, palette, previous, rows):
+    """Decodes some of the filtered rows of a PNG.
+
+    :param ihdr: The PNG's header
+    :type ihdr: bytes
+    :param palette: The PNG's palette, if it has one
+    :type palette: bytes
+    :param previous: The decoded row above the rows, if there is one
+    :type previous: bytes
+    :param rows: The filtered rows
+    :type rows: bytes
+    :returns: The rows, and the last of them decoded (to decode the
+        rows after them against)
+    :rtype: {(Image, bytes)}
+    """
+    width, _, depth, color, _, _, _ = struct.unpack(">IIBBBBB", ihdr)
+    row_size = 1 + width * PNG_CHANNELS[color]
+    height = len(rows) // row_size
+    if previous is not None:
+        # An unfiltered copy of the row above leads the rows
+        rows = b"\x00" + previous + rows
+        height += 1
+    png = (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", struct.pack(">II", width, height) + ihdr[8:])
+        + (_png_chunk(b"PLTE", palette) if palette else b"")
+        # The rows only need to be a valid zlib stream, not a small one
+        + _png_chunk(b"IDAT", zlib.compress(bytes(rows), 0))
+        + _png_chunk(b"IEND", b"")
+    )
+    with Image.open(io.BytesIO(png)) as img:
+        img.load()
+        last = img.crop((0, height - 1, width, height)).tobytes()
+        top = 1 if previous is not None else 0
+        tile = img.crop((0, top, width, height)).convert("RGB")
+    return tile, last
+
+
+def _write_image_pdf(f, tiles, quality=None):
+    """Writes images to a pdf, one page per image, as they come.
+
+    Each image is scaled to the width of the page and placed at the
+    top of it.
+    :param f: The file to write the pdf to
+    :type f: file
+    :param tiles: The images
+    :type tiles: iterable(Image)
+    :param quality: The JPEG quality to compress the images with,
+        defaults to None (lossless)
+    :type quality: int, optional
+    """
+    output = PdfOutput(f)
+    for tile in tiles:
+        width, height = tile.size
+        if quality:
+            buffer = io.BytesIO()
+            tile.save(buffer, "JPEG", quality=quality)
+            data, compression = buffer.getvalue(), b"/DCTDecode"
+        else:
+            data, compression = zlib.compress(tile.tobytes()), b"/FlateDecode"
+        tile.close()
+        image, content, page = output.reserve(), output.reserve(), output.reserve()
+        output.write(
+            image,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter %s "
+            b"/Length %d >>" % (width, height, compression, len(data)),
+            data,
+        )
+        scaled_height = height * PAGE_WIDTH / width
+        stream = b"q %d 0 0 %.4f 0 %.4f cm /Im0 Do Q" % (
+            PAGE_WIDTH,
+            scaled_height,
+            PAGE_HEIGHT - scaled_height,
+        )
+        output.write(content, b"<< /Length %d >>" % len(stream), stream)
+        output.write(
+            page,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, image, content),
+        )
+        output.pages.append(page)
+    output.finish()
+
+
 def merge(paths, save_as_path):
     """Merges multiple PDFs.
 
@@ -30,11 +236,7 @@ def merge(paths, save_as_path):
     :param save_as_path: The filename to save the result as
     :type save_as_path: str
     """
-    merger = PdfFileMerger()
-    for path in paths:
-        merger.append(path)
-    merger.write(save_as_path)
-    merger.close()
+    pdf.merge(paths, save_as_path)
 
 
 def remove_first_page(path):
@@ -43,13 +245,7 @@ def remove_first_page(path):
     :param path: The filepath of the PDF
     :type path: str
     """
-    infile = PdfFileReader(path, "rb")
-    output = PdfFileWriter()
-    for i in range(1, infile.getNumPages()):
-        p = infile.getPage(i)
-        output.addPage(p)
-    with open(path, "wb") as f:
-        output.write(f)
+    pdf.remove_pages(path, range(1))
 
 
 def clean_string(string):